@@ -0,0 +1,240 @@
+#-----------------------------------------------------------------------------
+# benchmark_app_inventory.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Python script to benchmark the application inventory of
+# manage_applications.py against a synthetic in-memory registry, so it runs
+# on any platform.  Each mode is measured for applications per second and
+# for the number of winreg calls it makes per Uninstall subkey.  A latency
+# per call can be added to stand in for a slow or remote registry.
+#
+# The single-pass mode enumerates every value of a subkey, so it makes about
+# one more call per subkey than the legacy queries of the six fields.  It is
+# only faster while the calls are cheap, since it raises no exceptions for
+# the missing values; with latency, the legacy queries win by about that one
+# call, and the cached mode is the one that cuts the calls.
+#
+# The threaded-users mode reads the users on a thread pool, which pays off
+# when the registry calls are slow.  The cached mode reads through an
+# inventory cache saved by an untimed run, the same as a periodic compliance
+# sweep, and --changed rewrites a share of the subkeys between the runs.
+#
+# Example:
+#
+#     python benchmark_app_inventory.py --apps 5000 --users 50 --latency 0.00005
+#     python benchmark_app_inventory.py --users 500 --latency 0.0001 --workers 16
+#-----------------------------------------------------------------------------
+"""benchmark_app_inventory.py""" # for pylint
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Windows'))
+# pylint: disable=wrong-import-position
+import manage_applications
+import registry_backend
+
+PUBLISHERS = ['Microsoft Corporation', 'Mozilla', 'Python Software Foundation', 'Contoso',
+              'Fabrikam', 'Northwind Traders', 'Adventure Works', 'Litware']
+
+MODES = ('legacy-query', 'single-pass', 'threaded-users', 'cached')
+
+
+#-----------------------------------------------------------------------------
+# add_apps()
+#
+# Adds count synthetic Uninstall subkeys under the key path.  Most use an
+# MsiExec command line and some use an unquoted Program Files pathname, and
+# a few have no display name, the same mix as a typical machine.
+#-----------------------------------------------------------------------------
+def add_apps(registry, key_path, count, rng):
+    """Adds synthetic applications under an Uninstall key"""
+
+    registry.add_key(key_path)
+    for i in range(count):
+        guid = f"{{{rng.getrandbits(128):032X}}}"
+        publisher = rng.choice(PUBLISHERS)
+        values = {'Publisher': publisher, 'DisplayVersion': f"{rng.randint(1, 20)}.{i % 100}",
+                  'InstallDate': f"2024{rng.randint(1, 12):02d}{rng.randint(1, 28):02d}",
+                  'EstimatedSize': rng.randint(100, 100000)}
+        if rng.random() < 0.7:
+            values['UninstallString'] = f"MsiExec.exe /X{guid}"
+        else:
+            values['UninstallString'] = (f"C:\\Program Files\\{publisher}\\App {i}\\uninstall.exe "
+                                         f"/remove /log C:\\Temp\\app{i}.log")
+            values['QuietUninstallString'] = values['UninstallString'] + " /S"
+        if rng.random() < 0.95:
+            values['DisplayName'] = f"{publisher} Application {i}"
+        registry.add_key(f"{key_path}\\{guid}", values)
+
+
+#-----------------------------------------------------------------------------
+# build_registry()
+#-----------------------------------------------------------------------------
+def build_registry(apps, users, user_apps, latency, seed):
+    """Builds a synthetic registry with machine and per-user applications"""
+
+    rng = random.Random(seed)
+    registry = registry_backend.MemoryRegistry()
+    add_apps(registry, f"HKEY_LOCAL_MACHINE\\{manage_applications.APPKEY1}", apps, rng)
+    add_apps(registry, f"HKEY_LOCAL_MACHINE\\{manage_applications.APPKEY2}", apps // 2, rng)
+    for i in range(users):
+        sid = f"S-1-5-21-1004336348-1177238915-682003330-{1001 + i}"
+        add_apps(registry, f"HKEY_USERS\\{sid}\\{manage_applications.APPKEY1}", user_apps, rng)
+
+    registry.latency = latency
+    return registry
+
+
+#-----------------------------------------------------------------------------
+# legacy_read_apps()
+#
+# The original enumeration, which queries each value separately, extended
+# to the same fields as the single-pass read.
+#-----------------------------------------------------------------------------
+def legacy_read_apps(key, backend):
+    """Reads applications with one query per value"""
+
+    apps = []
+    for subkey_name in backend.subkey_names(key):
+        with backend.open_key(key, subkey_name) as subkey_key:
+            app = {field: manage_applications.reg_query_value(subkey_key, value_name, backend)
+                   for field, value_name in manage_applications.APP_VALUES.items()}
+        if app['Name'] != "" and app['Uninstall'] != "":
+            app['Uninstall'] = manage_applications.validate_command_pathname(app['Uninstall'])
+            app['QuietUninstall'] = manage_applications.validate_command_pathname(app['QuietUninstall'])
+            apps.append(app)
+    return apps
+
+
+#-----------------------------------------------------------------------------
+# run_inventory()
+#
+# Runs a full inventory (both machine keys and every user) with a mode and
+# returns the number of applications found, before removing the duplicates
+# so that every mode reports the same number.
+#-----------------------------------------------------------------------------
+def run_inventory(mode, registry, workers, cache_pathname=None):
+    """Inventories the registry with a mode"""
+
+    if mode == 'cached':
+        cache = manage_applications.InventoryCache(cache_pathname).load()
+        apps = []
+        machine_key = registry.root('HKEY_LOCAL_MACHINE')
+        for sub_key in (manage_applications.APPKEY1, manage_applications.APPKEY2):
+            with registry.open_key(machine_key, sub_key) as key:
+                apps.extend(manage_applications.read_uninstall_key(
+                    key, f"HKEY_LOCAL_MACHINE\\{sub_key}", registry, cache))
+        apps.extend(manage_applications.read_apps_from_users(registry, workers, cache))
+        cache.save()
+        return len(apps)
+
+    read_apps = legacy_read_apps if mode == 'legacy-query' else manage_applications.read_apps_from_regkey
+
+    apps = []
+    machine_key = registry.root('HKEY_LOCAL_MACHINE')
+    for sub_key in (manage_applications.APPKEY1, manage_applications.APPKEY2):
+        with registry.open_key(machine_key, sub_key) as key:
+            apps.extend(read_apps(key, registry))
+
+    if mode == 'threaded-users':
+        apps.extend(manage_applications.read_apps_from_users(registry, workers))
+        return len(apps)
+
+    users_key = registry.root('HKEY_USERS')
+    for user_sid in registry.subkey_names(users_key):
+        for sub_key in (manage_applications.APPKEY1, manage_applications.APPKEY2):
+            try:
+                with registry.open_key(users_key, f"{user_sid}\\{sub_key}") as key:
+                    apps.extend(read_apps(key, registry))
+            except OSError:
+                pass
+
+    return len(apps)
+
+
+#-----------------------------------------------------------------------------
+# touch_subkeys()
+#
+# Gives a share of the Uninstall subkeys a new last write time, as if the
+# applications had been updated.
+#-----------------------------------------------------------------------------
+def touch_subkeys(registry, share, rng):
+    """Updates the last write time of some of the subkeys"""
+
+    keys = [registry.hives['HKEY_LOCAL_MACHINE']]
+    while keys:
+        key = keys.pop()
+        keys.extend(key.subkeys.values())
+        if 'uninstallstring' in key.values and rng.random() < share:
+            key.last_write += 1
+
+
+#-----------------------------------------------------------------------------
+# benchmark()
+#-----------------------------------------------------------------------------
+def benchmark(registry, modes, repeat, subkeys, workers, changed=0.0):
+    """Benchmarks each mode and prints the results"""
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_pathname = os.path.join(cache_dir, 'inventory.json')
+        for mode in modes:
+            best = None
+            for _ in range(repeat):
+                if mode == 'cached':
+                    run_inventory(mode, registry, workers, cache_pathname)
+                    touch_subkeys(registry, changed, rng)
+                registry.calls.clear()
+                start = time.perf_counter()
+                apps = run_inventory(mode, registry, workers, cache_pathname)
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+
+            calls = sum(registry.calls.values())
+            print(f"{mode:16} {apps:>8} apps {apps / best:>12.0f} apps/s "
+                  f"{calls / subkeys:>6.2f} winreg calls/subkey")
+
+
+#-----------------------------------------------------------------------------
+# main()
+#-----------------------------------------------------------------------------
+def main():
+    """Main function"""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the application inventory on a synthetic registry.")
+    parser.add_argument('--apps', type=int, default=2000,
+                        help="applications under the machine Uninstall key (default: 2000)")
+    parser.add_argument('--users', type=int, default=20, help="loaded user profiles (default: 20)")
+    parser.add_argument('--user-apps', type=int, default=20,
+                        help="applications per user (default: 20)")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds added to each registry call (default: 0)")
+    parser.add_argument('--seed', type=int, default=1, help="random seed (default: 1)")
+    parser.add_argument('--modes', nargs='+', choices=MODES, help="modes to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per mode (default: 3)")
+    parser.add_argument('--workers', type=int, default=manage_applications.USER_WORKERS,
+                        help="threads of the threaded-users mode (default: %(default)s)")
+    parser.add_argument('--changed', type=float, default=0.0,
+                        help="share of the machine subkeys changed before each cached run "
+                             "(default: 0)")
+    args = parser.parse_args()
+
+    registry = build_registry(args.apps, args.users, args.user_apps, args.latency, args.seed)
+    subkeys = args.apps + args.apps // 2 + args.users * args.user_apps
+    print(f"Registry: {subkeys} Uninstall subkeys, {args.users} users")
+
+    benchmark(registry, args.modes or MODES, args.repeat, subkeys, args.workers, args.changed)
+
+
+if __name__ == "__main__":
+    main()
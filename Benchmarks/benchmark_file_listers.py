@@ -0,0 +1,486 @@
+#-----------------------------------------------------------------------------
+# benchmark_file_listers.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Python script to benchmark the Linux and Windows file listers against
+# synthetic directory trees.  Each traversal mode runs in its own process
+# and is measured for files per second, peak RSS and stat syscalls per
+# file.  The results are saved as JSON and can be compared with a previous
+# run to spot regressions.
+#
+# Example:
+#
+#     python benchmark_file_listers.py --depth 4 --fanout 6 --files 40 \
+#         --output results.json --baseline previous.json
+#-----------------------------------------------------------------------------
+"""benchmark_file_listers.py""" # for pylint
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Linux'))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Windows'))
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from filescan import walker
+
+# Marker file recording the parameters a synthetic tree was generated with
+TREE_MARKER = '.benchmark_tree.json'
+
+# Syscalls counted as stat calls when strace is available
+STAT_SYSCALLS = ('stat', 'lstat', 'fstat', 'newfstatat', 'fstatat64', 'statx',
+                 'stat64', 'lstat64', 'fstat64')
+
+# Modes that need the POSIX-only Linux lister
+LINUX_MODES = ('linux-os-walk', 'linux-scandir', 'linux-parallel', 'linux-parallel-ordered',
+               'linux-fd-relative', 'linux-records', 'linux-collect')
+ALL_MODES = LINUX_MODES + ('windows-list',)
+
+
+#-----------------------------------------------------------------------------
+# generate_tree()
+#
+# Builds a synthetic tree under root.  Every directory down to the given
+# depth has fanout subdirectories and files regular files or symbolic
+# links.  symlink_ratio is the fraction of entries created as symbolic
+# links, pointing either at a sibling file or at a sibling directory.  The
+# layout is deterministic for a given seed.
+#-----------------------------------------------------------------------------
+def generate_tree(root, depth, fanout, files, symlink_ratio, file_size, seed):
+    """Generates a synthetic directory tree"""
+
+    params = {'depth': depth, 'fanout': fanout, 'files': files,
+              'symlink_ratio': symlink_ratio, 'file_size': file_size, 'seed': seed}
+
+    # Reuse an existing tree built with the same parameters
+    marker = os.path.join(root, TREE_MARKER)
+    if os.path.isfile(marker):
+        with open(marker, encoding='utf-8') as file:
+            info = json.load(file)
+        if info['params'] == params:
+            return info
+        shutil.rmtree(root)
+
+    rng = random.Random(seed)
+    payload = b'x' * file_size
+    counts = {'dirs': 0, 'files': 0, 'symlinks': 0}
+
+    pending_dirs = [(root, 0)]
+    while pending_dirs:
+        dirpath, level = pending_dirs.pop()
+        os.makedirs(dirpath, exist_ok=True)
+        counts['dirs'] += 1
+
+        subdirs = []
+        if level < depth:
+            for i in range(fanout):
+                subdirs.append(f"dir{i:03d}")
+                pending_dirs.append((os.path.join(dirpath, subdirs[-1]), level + 1))
+
+        for i in range(files):
+            pathname = os.path.join(dirpath, f"file{i:05d}.dat")
+            if i > 0 and rng.random() < symlink_ratio:
+                target = rng.choice(subdirs) if subdirs and rng.random() < 0.5 else "file00000.dat"
+                os.symlink(target, pathname)
+                counts['symlinks'] += 1
+            else:
+                with open(pathname, 'wb') as file:
+                    file.write(payload)
+                counts['files'] += 1
+
+    info = {'params': params, 'counts': counts}
+    with open(marker, 'w', encoding='utf-8') as file:
+        json.dump(info, file)
+    return info
+
+
+#-----------------------------------------------------------------------------
+# NullSink
+#-----------------------------------------------------------------------------
+class NullSink:
+    """Sink that counts and discards every record"""
+
+    def __init__(self):
+        self.count = 0
+
+    def write(self, record):
+        """Discards a record"""
+        self.count += 1
+
+
+#-----------------------------------------------------------------------------
+# install_stat_counter()
+#
+# Used when strace is not available.  Wraps os.stat, os.lstat and
+# os.scandir so the stat calls made by the listers are counted in Python.
+# DirEntry objects only stat once per mode and cache the result, so the
+# wrapper counts the first call of each kind.  This is an estimate: it does
+# not see stat calls made inside C code other than DirEntry.
+#-----------------------------------------------------------------------------
+def install_stat_counter():
+    """Installs Python-level stat counting and returns the counter"""
+
+    counter = {'calls': 0}
+    real_stat = os.stat
+    real_lstat = os.lstat
+    real_scandir = os.scandir
+
+    class CountingEntry:
+        """DirEntry wrapper that counts the stat calls it causes"""
+
+        __slots__ = ('entry', 'seen')
+
+        def __init__(self, entry):
+            self.entry = entry
+            self.seen = set()
+
+        def count(self, kind):
+            """Counts the first stat call of a kind"""
+            if kind not in self.seen:
+                self.seen.add(kind)
+                counter['calls'] += 1
+
+        @property
+        def name(self):
+            """Entry name"""
+            return self.entry.name
+
+        @property
+        def path(self):
+            """Entry path"""
+            return self.entry.path
+
+        def inode(self):
+            """Entry inode"""
+            return self.entry.inode()
+
+        def is_symlink(self):
+            """True for symbolic links"""
+            return self.entry.is_symlink()
+
+        def is_dir(self, follow_symlinks=True):
+            """True for directories"""
+            if follow_symlinks and self.entry.is_symlink():
+                self.count('stat')
+            return self.entry.is_dir(follow_symlinks=follow_symlinks)
+
+        def is_file(self, follow_symlinks=True):
+            """True for regular files"""
+            if follow_symlinks and self.entry.is_symlink():
+                self.count('stat')
+            return self.entry.is_file(follow_symlinks=follow_symlinks)
+
+        def stat(self, follow_symlinks=True):
+            """Stat result of the entry"""
+            if follow_symlinks and self.entry.is_symlink():
+                self.count('stat')
+            else:
+                self.count('lstat')
+            return self.entry.stat(follow_symlinks=follow_symlinks)
+
+    class CountingScandir:
+        """os.scandir() wrapper yielding counting entries"""
+
+        def __init__(self, path='.'):
+            self.iterator = real_scandir(path)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self.iterator.close()
+
+        def __iter__(self):
+            return self
+
+        def __next__(self):
+            return CountingEntry(next(self.iterator))
+
+        def close(self):
+            """Closes the directory"""
+            self.iterator.close()
+
+    def counting_stat(*args, **kwargs):
+        counter['calls'] += 1
+        return real_stat(*args, **kwargs)
+
+    def counting_lstat(*args, **kwargs):
+        counter['calls'] += 1
+        return real_lstat(*args, **kwargs)
+
+    os.stat = counting_stat
+    os.lstat = counting_lstat
+    os.scandir = CountingScandir
+    return counter
+
+
+#-----------------------------------------------------------------------------
+# run_mode()
+#
+# Runs a single traversal mode over root and returns the number of files
+# and the elapsed time.  This runs in the child process.
+#-----------------------------------------------------------------------------
+def run_mode(mode, root, workers):
+    """Runs one traversal mode and returns (files, seconds)"""
+
+    # pylint: disable=import-outside-toplevel
+    if mode in LINUX_MODES:
+        import list_linux_files
+    else:
+        import list_windows_files
+
+    files = 0
+    start = time.perf_counter()
+
+    if mode == 'linux-os-walk':
+        # The original os.walk() and os.lstat() implementation, for reference
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                os.lstat(os.path.join(dirpath, filename))
+                files += 1
+    elif mode == 'linux-scandir':
+        for _ in walker.scan_files(root):
+            files += 1
+    elif mode == 'linux-parallel':
+        for _ in walker.scan_files_parallel(root, workers):
+            files += 1
+    elif mode == 'linux-parallel-ordered':
+        for _ in walker.scan_files_parallel(root, workers, ordered=True):
+            files += 1
+    elif mode == 'linux-fd-relative':
+        for _ in walker.scan_files_fd(root):
+            files += 1
+    elif mode == 'linux-records':
+        for _ in list_linux_files.iter_files(root):
+            files += 1
+    elif mode == 'linux-collect':
+        files = len(list_linux_files.collect_files(root))
+    elif mode == 'windows-list':
+        sink = NullSink()
+        list_windows_files.list_files(root, sink=sink)
+        files = sink.count
+    else:
+        raise ValueError(f"Unknown mode: {mode}")
+
+    return files, time.perf_counter() - start
+
+
+#-----------------------------------------------------------------------------
+# child_main()
+#
+# Entry point of the child process.  Prints a single JSON object.
+#-----------------------------------------------------------------------------
+def child_main(mode, root, workers, count_stats):
+    """Runs a mode in this process and prints the result as JSON"""
+
+    counter = install_stat_counter() if count_stats else None
+    files, seconds = run_mode(mode, root, workers)
+
+    result = {'files': files, 'seconds': seconds}
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result['peak_rss_kb'] = peak_rss // 1024 if sys.platform == 'darwin' else peak_rss
+    if counter is not None:
+        result['stat_calls'] = counter['calls']
+
+    print(json.dumps(result))
+
+
+#-----------------------------------------------------------------------------
+# run_child()
+#-----------------------------------------------------------------------------
+def run_child(mode, root, workers, count_stats=False, strace_output=None):
+    """Runs a mode in a child process and returns its JSON result"""
+
+    command = [sys.executable, os.path.abspath(__file__), '--run-mode', mode,
+               '--root', root, '--workers', str(workers)]
+    if count_stats:
+        command.append('--count-stats')
+    if strace_output is not None:
+        command = ['strace', '-f', '-c', '-o', strace_output] + command
+
+    completed = subprocess.run(command, check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+#-----------------------------------------------------------------------------
+# parse_strace_summary()
+#-----------------------------------------------------------------------------
+def parse_strace_summary(pathname):
+    """Returns the number of stat-family syscalls in an strace -c summary"""
+
+    total = 0
+    with open(pathname, encoding='utf-8') as file:
+        for line in file:
+            fields = line.split()
+            if len(fields) >= 5 and fields[-1] in STAT_SYSCALLS and re.fullmatch(r'\d+', fields[3]):
+                total += int(fields[3])
+    return total
+
+
+#-----------------------------------------------------------------------------
+# count_stat_calls()
+#
+# Counts the stat syscalls of a mode with strace when it is available, or
+# with the Python-level counter otherwise.  Returns (count, method).
+#-----------------------------------------------------------------------------
+def count_stat_calls(mode, root, workers):
+    """Counts the stat calls made by a mode"""
+
+    if shutil.which('strace'):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            summary = os.path.join(tmpdir, 'strace.txt')
+            run_child(mode, root, workers, strace_output=summary)
+            return parse_strace_summary(summary), 'strace'
+
+    return run_child(mode, root, workers, count_stats=True)['stat_calls'], 'python'
+
+
+#-----------------------------------------------------------------------------
+# benchmark()
+#-----------------------------------------------------------------------------
+def benchmark(root, modes, workers, repeat):
+    """Benchmarks each mode and returns the list of results"""
+
+    results = []
+    for mode in modes:
+        # Warm the page and dentry caches so every mode starts the same way
+        run_child(mode, root, workers)
+
+        runs = [run_child(mode, root, workers) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['seconds'])
+        stat_calls, method = count_stat_calls(mode, root, workers)
+
+        files = best['files']
+        result = {
+            'mode': mode,
+            'workers': workers if mode.startswith('linux-parallel') else 1,
+            'files': files,
+            'seconds': best['seconds'],
+            'files_per_second': files / best['seconds'] if best['seconds'] else None,
+            'peak_rss_kb': max((run.get('peak_rss_kb') or 0) for run in runs) or None,
+            'stat_calls': stat_calls,
+            'stat_calls_per_file': stat_calls / files if files else None,
+            'stat_count_method': method,
+        }
+        results.append(result)
+        print(f"{mode:24} {files:>9} files {result['files_per_second'] or 0:>12.0f} files/s "
+              f"{result['peak_rss_kb'] or 0:>8} KB {result['stat_calls_per_file'] or 0:>6.2f} stat/file")
+
+    return results
+
+
+#-----------------------------------------------------------------------------
+# compare_results()
+#
+# Prints the change in files per second and stat calls per file against a
+# previous results file.
+#-----------------------------------------------------------------------------
+def compare_results(results, baseline_pathname):
+    """Prints a comparison against a previous run"""
+
+    with open(baseline_pathname, encoding='utf-8') as file:
+        baseline = {result['mode']: result for result in json.load(file)['results']}
+
+    print(f"\nCompared with {baseline_pathname}:")
+    for result in results:
+        previous = baseline.get(result['mode'])
+        if previous is None or not previous.get('files_per_second'):
+            continue
+        speed = result['files_per_second'] / previous['files_per_second'] - 1
+        stats = (result['stat_calls_per_file'] or 0) - (previous.get('stat_calls_per_file') or 0)
+        print(f"{result['mode']:24} {speed:+8.1%} files/s {stats:+6.2f} stat/file")
+
+
+#-----------------------------------------------------------------------------
+# main()
+#-----------------------------------------------------------------------------
+def main():
+    """Main function"""
+
+    parser = argparse.ArgumentParser(description="Benchmarks the file listers on a synthetic tree.")
+    parser.add_argument('--tree', metavar='DIR',
+                        help="where to generate (or reuse) the tree; defaults to a temporary directory")
+    parser.add_argument('--depth', type=int, default=3, help="directory depth (default: 3)")
+    parser.add_argument('--fanout', type=int, default=6, help="subdirectories per directory (default: 6)")
+    parser.add_argument('--files', type=int, default=40, help="files per directory (default: 40)")
+    parser.add_argument('--symlink-ratio', type=float, default=0.05,
+                        help="fraction of files created as symbolic links (default: 0.05)")
+    parser.add_argument('--file-size', type=int, default=0, help="bytes per file (default: 0)")
+    parser.add_argument('--seed', type=int, default=1, help="random seed (default: 1)")
+    parser.add_argument('--modes', nargs='+', choices=ALL_MODES, help="modes to run (default: all)")
+    parser.add_argument('--workers', type=int, default=8, help="workers for the parallel modes (default: 8)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per mode (default: 3)")
+    parser.add_argument('--output', metavar='FILE', help="save the results as JSON")
+    parser.add_argument('--baseline', metavar='FILE', help="compare with a previous results file")
+
+    # Internal options used by the child processes
+    parser.add_argument('--run-mode', help=argparse.SUPPRESS)
+    parser.add_argument('--root', help=argparse.SUPPRESS)
+    parser.add_argument('--count-stats', action='store_true', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.run_mode:
+        child_main(args.run_mode, args.root, args.workers, args.count_stats)
+        return
+
+    modes = args.modes or [mode for mode in ALL_MODES
+                           if os.name == 'posix' or mode not in LINUX_MODES]
+
+    tmpdir = None
+    root = args.tree
+    if root is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        root = os.path.join(tmpdir.name, 'tree')
+
+    try:
+        tree = generate_tree(root, args.depth, args.fanout, args.files, args.symlink_ratio,
+                             args.file_size, args.seed)
+        print(f"Tree: {tree['counts']['dirs']} dirs, {tree['counts']['files']} files, "
+              f"{tree['counts']['symlinks']} symlinks")
+
+        results = benchmark(root, modes, args.workers, args.repeat)
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    report = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'tree': tree,
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline:
+        compare_results(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
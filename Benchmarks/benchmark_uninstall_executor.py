@@ -0,0 +1,90 @@
+#-----------------------------------------------------------------------------
+# benchmark_uninstall_executor.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Python script to benchmark the non-interactive uninstall executor of
+# manage_applications.py with a fake command runner, so it runs on any
+# platform.  The synthetic uninstallers take a random time, some fail and
+# some hang until they are killed, and a share of them are MsiExec
+# commands, which run one at a time.
+#
+# Example:
+#
+#     python benchmark_uninstall_executor.py --apps 100 --hung 2 --timeout 2
+#-----------------------------------------------------------------------------
+"""benchmark_uninstall_executor.py""" # for pylint
+
+import argparse
+import os
+import random
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Windows'))
+# pylint: disable=wrong-import-position
+import uninstall_executor
+
+
+#-----------------------------------------------------------------------------
+# build_jobs()
+#
+# Returns the (name, command) jobs and the outcomes of the fake runner.
+#-----------------------------------------------------------------------------
+def build_jobs(apps, hung, msiexec_share, seconds, seed):
+    """Builds synthetic uninstall jobs"""
+
+    rng = random.Random(seed)
+    jobs = []
+    outcomes = {}
+    for i in range(apps):
+        if rng.random() < msiexec_share:
+            command = f"MsiExec.exe /X{{{rng.getrandbits(128):032X}}} /qn /norestart"
+        else:
+            command = f'"C:\\Program Files\\App {i}\\uninstall.exe" /S'
+        returncode = None if i < hung else rng.choice((0, 0, 0, 0, 3010, 1603))
+        outcomes[command] = (rng.uniform(0.5, 1.5) * seconds, returncode)
+        jobs.append((f"App {i}", command))
+
+    rng.shuffle(jobs)
+    return jobs, outcomes
+
+
+#-----------------------------------------------------------------------------
+# main()
+#-----------------------------------------------------------------------------
+def main():
+    """Main function"""
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the uninstall executor with a fake command runner.")
+    parser.add_argument('--apps', type=int, default=60, help="uninstallers to run (default: 60)")
+    parser.add_argument('--hung', type=int, default=2,
+                        help="uninstallers that never finish (default: 2)")
+    parser.add_argument('--msiexec-share', type=float, default=0.3,
+                        help="share of MsiExec uninstallers (default: 0.3)")
+    parser.add_argument('--seconds', type=float, default=0.1,
+                        help="average seconds per uninstaller (default: 0.1)")
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help="seconds before an uninstaller is killed (default: 1)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8],
+                        help="concurrency limits to run (default: 1 4 8)")
+    parser.add_argument('--seed', type=int, default=1, help="random seed (default: 1)")
+    args = parser.parse_args()
+
+    jobs, outcomes = build_jobs(args.apps, args.hung, args.msiexec_share, args.seconds, args.seed)
+    for concurrency in args.concurrency:
+        runner = uninstall_executor.FakeRunner(outcomes)
+        start = time.perf_counter()
+        results = uninstall_executor.run_uninstalls(jobs, runner, concurrency, args.timeout)
+        seconds = time.perf_counter() - start
+        print(f"concurrency {concurrency:>3}: {seconds:>7.2f} s, at most {runner.max_running} "
+              f"running and {runner.max_msiexec_running} MsiExec")
+        print("    " + uninstall_executor.format_summary(results)[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -10,44 +10,329 @@
 """list_linux_files.py""" # for pylint
 # pylint: disable=unused-variable
 
+import argparse
+import hashlib
 import os
-import pwd
-import grp
 import stat
+import sys
+
+# The shared filescan package lives at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from filescan import (checkpoint, enrich, filters, hashing, index, mounts, scanner, sinks,
+                      stattable)
+from filescan.throttle import Throttle, lower_priority
+# The name caches moved to filescan.enrich and stay importable from here
+from filescan.enrich import get_group_name, get_user_name, load_name_tables # pylint: disable=unused-import
+
+# Names of the fields in each file record
+FIELDS = enrich.PosixEnricher.fields
+CHANGE_FIELDS = ('change',) + FIELDS
+HASH_FIELDS = enrich.PosixEnricher.hashed_fields
+
+# Records yielded by iter_files(), with and without a content digest
+FileRecord = enrich.PosixEnricher.record_type
+HashedFileRecord = enrich.PosixEnricher.hashed_record_type
+
+
+#-----------------------------------------------------------------------------
+# make_record()
+#-----------------------------------------------------------------------------
+def make_record(pathname, file_stat, digest=None):
+    """Builds the file record for the provided pathname and stat result"""
+    return enrich.PosixEnricher().record(pathname, file_stat, digest)
 
 
 #-----------------------------------------------------------------------------
 # get_file_info()
 #-----------------------------------------------------------------------------
-def get_file_info(pathname):
+def get_file_info(pathname, file_stat=None, sink=None, digest=None):
     """Gets file information for the provided pathname"""
 
-    file_stat = os.lstat(pathname)
+    # Only stat the file if the caller did not already provide the result
+    if file_stat is None:
+        file_stat = os.lstat(pathname)
+
+    # Write the record to the sink, or print it when no sink is provided
+    scanner.write_records([make_record(pathname, file_stat, digest)], sink)
 
-    permissions = stat.filemode(file_stat.st_mode)
 
-    owner_uid = file_stat.st_uid
-    group_gid = file_stat.st_gid
-    owner_name = pwd.getpwuid(owner_uid).pw_name
-    group_name = grp.getgrgid(group_gid).gr_name
+#-----------------------------------------------------------------------------
+# iter_files()
+#
+# Generator API for using the scanner in-process.  Yields a FileRecord for
+# every file, or a HashedFileRecord when a hasher is provided.  The walk
+# options are described in filescan/walker.py, and throttle in
+# filescan/throttle.py.
+#-----------------------------------------------------------------------------
+def iter_files(dirname, preload_names=False, workers=1, ordered=False, hasher=None,
+               file_filter=None, exclude=None, fd_relative=False, one_filesystem=False,
+               exclude_fstypes=(), dedup=False, throttle=None):
+    """Yields a record for every file under the specified pathname"""
+
+    return scanner.iter_records(dirname, enrich.PosixEnricher(preload_names), hasher,
+                                file_filter, workers=workers, ordered=ordered,
+                                exclude=exclude, fd_relative=fd_relative,
+                                one_filesystem=one_filesystem,
+                                exclude_fstypes=exclude_fstypes, dedup=dedup,
+                                throttle=throttle)
+
+
+#-----------------------------------------------------------------------------
+# collect_files()
+#
+# Scans the tree into a columnar collector that holds the raw stat values in
+# typed arrays.  Owner and group names are not resolved, which keeps large
+# scans compact; use get_user_name() and get_group_name() on the uid and gid
+# columns as needed.
+#-----------------------------------------------------------------------------
+def collect_files(dirname, workers=1, ordered=False, file_filter=None, exclude=None,
+                  fd_relative=False, one_filesystem=False, exclude_fstypes=(), dedup=False,
+                  throttle=None):
+    """Scans the tree into a ColumnarCollector"""
 
-    print(f"{pathname} {permissions} {owner_name} {group_name} {file_stat.st_size}")
+    return scanner.collect_files(dirname, None, file_filter, workers=workers, ordered=ordered,
+                                 exclude=exclude, fd_relative=fd_relative,
+                                 one_filesystem=one_filesystem,
+                                 exclude_fstypes=exclude_fstypes, dedup=dedup,
+                                 throttle=throttle)
 
 
 #-----------------------------------------------------------------------------
 # list_files()
 #-----------------------------------------------------------------------------
-def list_files(dirname):
+def list_files(dirname, preload_names=False, workers=1, ordered=False, sink=None,
+               hasher=None, file_filter=None, exclude=None, fd_relative=False,
+               one_filesystem=False, exclude_fstypes=(), dedup=False, throttle=None):
     """Recursively ists all files from the specified pathname"""
 
-    for dirpath, dirnames, filenames in os.walk(dirname):
-        for filename in filenames:
-            pathname = os.path.join(dirpath, filename)
-            get_file_info(pathname)
+    scanner.write_records(iter_files(dirname, preload_names, workers, ordered, hasher,
+                                     file_filter, exclude, fd_relative, one_filesystem,
+                                     exclude_fstypes, dedup, throttle), sink)
+
+
+#-----------------------------------------------------------------------------
+# list_files_resumable()
+#
+# Lists the files into output_pathname, saving a checkpoint every interval
+# seconds.  When the checkpoint file exists, the scan resumes from it and
+# continues the existing output.  Uses the serial walker.  options holds
+# the settings that must match for a checkpoint to be resumed, such as the
+# filter expression the file_filter was compiled from.
+#-----------------------------------------------------------------------------
+def list_files_resumable(dirname, output_pathname, checkpoint_pathname, output_format='text',
+                         interval=checkpoint.DEFAULT_INTERVAL, preload_names=False,
+                         hasher=None, file_filter=None, exclude=None, one_filesystem=False,
+                         exclude_fstypes=(), options=None, throttle=None):
+    """Lists all files into a file, resuming from a checkpoint"""
+
+    return checkpoint.checkpointed_scan(
+        dirname, enrich.PosixEnricher(preload_names),
+        checkpoint.ScanCheckpoint(checkpoint_pathname, interval), output_format,
+        HASH_FIELDS if hasher else FIELDS, output_pathname, hasher, file_filter, exclude,
+        one_filesystem, exclude_fstypes, options, throttle)
+
+
+#-----------------------------------------------------------------------------
+# save_stat_table()
+#
+# Scans the tree into a columnar collector and saves it as a NumPy stat
+# table, to an .npz file or to a directory of memory-mappable .npy files.
+#-----------------------------------------------------------------------------
+def save_stat_table(dirname, table_pathname, workers=1, ordered=False, file_filter=None,
+                    exclude=None, fd_relative=False, one_filesystem=False,
+                    exclude_fstypes=(), dedup=False, throttle=None):
+    """Scans the tree into a saved StatTable"""
+
+    collector = collect_files(dirname, workers, ordered, file_filter, exclude, fd_relative,
+                              one_filesystem, exclude_fstypes, dedup, throttle)
+    stattable.StatTable.from_collector(collector, dirname).save(table_pathname)
+
+
+#-----------------------------------------------------------------------------
+# list_changes()
+#
+# Rescans the tree against the index of the previous scan and lists only the
+# files that were added, removed or modified.  The index is created on the
+# first run, which lists every file as added.  The index holds absolute
+# paths, which are listed under dirname the same as the other modes.
+#-----------------------------------------------------------------------------
+def list_changes(dirname, index_pathname, quick=False, sink=None):
+    """Lists the files that changed since the last indexed scan"""
+
+    prefix_length = len(os.path.join(os.path.abspath(dirname), ''))
+    with index.ScanIndex(index_pathname) as scan_index:
+        records = ((change, os.path.join(dirname, entry.path[prefix_length:]),
+                    stat.filemode(entry.mode), get_user_name(entry.uid),
+                    get_group_name(entry.gid), entry.size)
+                   for change, entry in scan_index.rescan(dirname, quick))
+        scanner.write_records(records, sink)
+
+
+#-----------------------------------------------------------------------------
+# parse_args()
+#-----------------------------------------------------------------------------
+def parse_args(argv=None):
+    """Parses the command line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description="Recursively lists the files under a directory.",
+        epilog="Filter terms: setuid, setgid, world-writable, owner=NAME, group=NAME, "
+               "size>10M, size=1K..1M, mtime>2024-01-01, age<7d, name=*.so, path=GLOB; "
+               "combine them with and, or, not and parentheses.")
+    parser.add_argument('pathname', help="directory to list")
+    parser.add_argument('-f', '--filter', metavar='EXPR',
+                        help="only list files matching the filter expression")
+    parser.add_argument('-x', '--exclude', metavar='GLOB', action='append', default=[],
+                        help="skip entries whose name (or path, if the glob contains a '/') matches; "
+                             "excluded directories are not descended into (repeatable)")
+    parser.add_argument('--one-file-system', action='store_true',
+                        help="do not descend into directories on other filesystems")
+    parser.add_argument('--skip-pseudo-fs', action='store_true',
+                        help="skip kernel pseudo filesystems such as proc and sysfs")
+    parser.add_argument('--exclude-fstype', metavar='TYPE', action='append', default=[],
+                        help="skip filesystems of this type from the mount table, such as nfs4 (repeatable)")
+    parser.add_argument('--dedup', action='store_true',
+                        help="list hard-linked files once and walk bind-mounted directories once")
+    parser.add_argument('--format', choices=sorted(sinks.SINK_FORMATS), default='text',
+                        help="output format (default: text)")
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help="write the listing to FILE instead of stdout")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="number of threads reading directories (default: 1)")
+    parser.add_argument('--ordered', action='store_true',
+                        help="keep the serial output order when using several workers")
+    parser.add_argument('--fd-relative', action='store_true',
+                        help="stat entries relative to open directory descriptors (single worker only)")
+    parser.add_argument('--preload-names', action='store_true',
+                        help="load the whole passwd and group databases up front")
+    parser.add_argument('--hash', metavar='ALGORITHM',
+                        help="append a content digest, such as sha256, to each file")
+    parser.add_argument('--hash-cache', metavar='FILE',
+                        help="persistent digest cache used with --hash")
+    parser.add_argument('--max-rate', metavar='OPS', type=float,
+                        help="limit the scan to about OPS stat operations per second")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="slow the scan down while stat latency is rising")
+    parser.add_argument('--low-priority', action='store_true',
+                        help="run at the lowest CPU priority and the idle I/O class")
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help="periodically save the scan state to FILE and resume from it if "
+                             "it exists (requires --output)")
+    parser.add_argument('--checkpoint-interval', metavar='SECONDS', type=float,
+                        default=checkpoint.DEFAULT_INTERVAL,
+                        help="seconds between checkpoints (default: %(default)s)")
+    parser.add_argument('--save-table', metavar='FILE',
+                        help="save a NumPy stat table to FILE (.npz, or a directory of .npy files) "
+                             "instead of listing")
+    parser.add_argument('--index', metavar='FILE',
+                        help="list only the changes since the scan recorded in the index FILE")
+    parser.add_argument('--quick', action='store_true',
+                        help="with --index, assume files in unchanged directories are unchanged")
+
+    args = parser.parse_args(argv)
+
+    if args.hash_cache and not args.hash:
+        parser.error("--hash-cache requires --hash")
+    if args.fd_relative and args.workers > 1:
+        parser.error("--fd-relative cannot be combined with more than one worker")
+    if args.quick and not args.index:
+        parser.error("--quick requires --index")
+    if args.index and (args.filter or args.exclude or args.hash or args.one_file_system or
+                       args.skip_pseudo_fs or args.exclude_fstype or args.dedup):
+        parser.error("--index cannot be combined with filtering, hashing or filesystem options")
+
+    if args.max_rate is not None and args.max_rate <= 0:
+        parser.error("--max-rate must be positive")
+    if args.index and (args.max_rate or args.adaptive):
+        parser.error("--index cannot be combined with --max-rate or --adaptive")
+
+    if args.checkpoint and (args.output is None or args.output == '-'):
+        parser.error("--checkpoint requires --output")
+    if args.checkpoint and (args.workers > 1 or args.fd_relative or args.dedup or
+                            args.index or args.save_table):
+        parser.error("--checkpoint cannot be combined with --workers, --fd-relative, "
+                     "--dedup, --index or --save-table")
+
+    if args.save_table and (args.index or args.hash):
+        parser.error("--save-table cannot be combined with --index or --hash")
+    if args.save_table and stattable.numpy is None:
+        parser.error("--save-table requires NumPy")
+
+    if args.hash and args.hash.lower() not in hashlib.algorithms_available:
+        parser.error(f"Unknown hash algorithm: {args.hash}")
+
+    try:
+        args.file_filter = filters.compile_filter(args.filter)
+    except ValueError as e:
+        parser.error(str(e))
+    args.exclude_patterns = args.exclude
+    args.exclude = filters.compile_excludes(args.exclude)
+
+    args.exclude_fstypes = set(args.exclude_fstype)
+    if args.skip_pseudo_fs:
+        args.exclude_fstypes |= mounts.PSEUDO_FSTYPES
+
+    return args
+
+
+#-----------------------------------------------------------------------------
+# main()
+#-----------------------------------------------------------------------------
+def main(argv=None):
+    """Main function"""
+
+    args = parse_args(argv)
+
+    # Lower the priority before any worker threads are started, so they inherit it
+    if args.low_priority and not lower_priority():
+        print("Could not lower the I/O priority", file=sys.stderr)
+
+    scan_throttle = None
+    if args.max_rate or args.adaptive:
+        scan_throttle = Throttle(args.max_rate, args.adaptive)
+
+    if args.index:
+        with sinks.open_sink(args.format, CHANGE_FIELDS, args.output) as sink:
+            list_changes(args.pathname, args.index, args.quick, sink)
+        return
+
+    if args.save_table:
+        save_stat_table(args.pathname, args.save_table, args.workers, args.ordered,
+                        args.file_filter, args.exclude, args.fd_relative,
+                        args.one_file_system, args.exclude_fstypes, args.dedup, scan_throttle)
+        return
+
+    # Open the digest cache when hashing
+    hash_cache = None
+    hasher = None
+    if args.hash:
+        if args.hash_cache:
+            hash_cache = hashing.HashCache(args.hash_cache)
+        hasher = hashing.FileHasher(args.hash, hash_cache, max(args.workers, 4))
+
+    try:
+        if args.checkpoint:
+            options = {'filter': args.filter, 'exclude': args.exclude_patterns,
+                       'one_file_system': args.one_file_system,
+                       'exclude_fstypes': sorted(args.exclude_fstypes), 'hash': args.hash}
+            try:
+                list_files_resumable(args.pathname, args.output, args.checkpoint, args.format,
+                                     args.checkpoint_interval, args.preload_names, hasher,
+                                     args.file_filter, args.exclude, args.one_file_system,
+                                     args.exclude_fstypes, options, scan_throttle)
+            except ValueError as e:
+                sys.exit(str(e))
+            return
 
+        with sinks.open_sink(args.format, HASH_FIELDS if hasher else FIELDS, args.output) as sink:
+            list_files(args.pathname, args.preload_names, args.workers, args.ordered,
+                       sink, hasher, args.file_filter, args.exclude, args.fd_relative,
+                       args.one_file_system, args.exclude_fstypes, args.dedup, scan_throttle)
+    finally:
+        if hash_cache is not None:
+            hash_cache.close()
 
-# Prompt the user to enter a pathname
-PATHNAME_ARG = input("Enter the pathname: ")
 
-# List the files
-list_files(PATHNAME_ARG)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#-----------------------------------------------------------------------------
+# diff_file_lists.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Python script to compare two outputs of the Linux or Windows file
+# listers, such as the listings of two hosts or of two days.  The outputs
+# may be in any of the listers' formats and larger than memory; they are
+# sorted externally and merged, and each added, removed or modified entry
+# is written as it is found.  The format of each listing is detected unless
+# given with --old-format or --new-format.
+#
+# Example:
+#
+#     python diff_file_lists.py monday.bin tuesday.bin --format csv -o changes.csv
+#-----------------------------------------------------------------------------
+"""diff_file_lists.py""" # for pylint
+
+import argparse
+import os
+import sys
+
+# The shared filescan package lives at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from filescan import diff, scanner, sinks
+
+
+#-----------------------------------------------------------------------------
+# diff_file_lists()
+#-----------------------------------------------------------------------------
+def diff_file_lists(old_pathname, new_pathname, output_format='text', output_pathname=None,
+                    chunk_size=diff.CHUNK_SIZE, temp_dir=None, old_format=None, new_format=None):
+    """Writes the differences between two file listings"""
+
+    fields, entries = diff.compare_scans(old_pathname, new_pathname, chunk_size, temp_dir,
+                                         old_format, new_format)
+    with sinks.open_sink(output_format, fields, output_pathname) as sink:
+        scanner.write_records(entries, sink)
+
+
+#-----------------------------------------------------------------------------
+# main()
+#-----------------------------------------------------------------------------
+def main(argv=None):
+    """Main function"""
+
+    parser = argparse.ArgumentParser(
+        description="Compares two file listings and reports the added, removed and "
+                    "modified entries.")
+    parser.add_argument('old', help="earlier listing (text, ndjson, csv or binary)")
+    parser.add_argument('new', help="later listing (text, ndjson, csv or binary)")
+    parser.add_argument('--format', choices=sorted(sinks.SINK_FORMATS), default='text',
+                        help="output format (default: text)")
+    parser.add_argument('--old-format', choices=sorted(sinks.SINK_FORMATS),
+                        help="format of the earlier listing (default: detected)")
+    parser.add_argument('--new-format', choices=sorted(sinks.SINK_FORMATS),
+                        help="format of the later listing (default: detected)")
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help="write the differences to FILE instead of stdout")
+    parser.add_argument('--chunk-records', type=int, default=diff.CHUNK_SIZE,
+                        help="records sorted in memory at a time (default: %(default)s)")
+    parser.add_argument('--temp-dir', metavar='DIR',
+                        help="directory for the temporary sort runs")
+    args = parser.parse_args(argv)
+
+    if args.chunk_records < 1:
+        parser.error("--chunk-records must be at least 1")
+
+    try:
+        diff_file_lists(args.old, args.new, args.format, args.output, args.chunk_records,
+                        args.temp_dir, args.old_format, args.new_format)
+    except (OSError, ValueError) as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
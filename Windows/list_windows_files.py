@@ -10,37 +10,127 @@
 """list_windows_files.py""" # for pylint
 # pylint: disable=unused-variable
 
+import argparse
+import hashlib
 import os
-import stat
+import sys
+
+# The shared filescan package lives at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# pylint: disable=wrong-import-position
+from filescan import enrich, hashing, scanner, sinks
+
+# Names of the fields in each file record
+FIELDS = enrich.WindowsEnricher.base_fields
+ATTRIBUTE_FIELDS = enrich.WindowsEnricher.attribute_fields
+HASH_FIELDS = FIELDS + ('digest',)
 
 
 #-----------------------------------------------------------------------------
 # get_file_info()
 #-----------------------------------------------------------------------------
-def get_file_info(pathname):
+def get_file_info(pathname, sink=None, digest=None):
     """Gets file information for the provided pathname"""
 
-    if os.path.isfile(pathname):
+    try:
         file_stat = os.lstat(pathname)
-        permissions = stat.filemode(file_stat.st_mode)
+    except OSError:
+        return
+
+    if enrich.is_windows_file(pathname, os.path.basename(pathname), file_stat):
 
-        print(f"{pathname} {permissions} {file_stat.st_size}")
+        # Write the record to the sink, or print it when no sink is provided
+        record = enrich.WindowsEnricher().record(pathname, file_stat, digest)
+        scanner.write_records([record], sink)
 
 
 #-----------------------------------------------------------------------------
 # list_files()
+#
+# Lists the files with the shared filescan walkers.  The file attributes are
+# appended when attributes is set, and the walk options (workers, ordered,
+# file_filter, exclude, one_filesystem, exclude_fstypes and dedup) are
+# passed through to filescan/walker.py.
 #-----------------------------------------------------------------------------
-def list_files(dirname):
+def list_files(dirname, sink=None, hasher=None, attributes=False, **walk_options):
     """Recursively ists all files from the specified pathname"""
 
-    for dirpath, dirnames, filenames in os.walk(dirname):
-        for filename in filenames:
-            pathname = os.path.join(dirpath, filename)
-            get_file_info(pathname)
+    records = scanner.iter_records(dirname, enrich.WindowsEnricher(attributes), hasher,
+                                   **walk_options)
+    scanner.write_records(records, sink)
+
+
+#-----------------------------------------------------------------------------
+# parse_args()
+#
+# Takes the same output options as list_linux_files.py.  The pathname is
+# prompted for when it is not on the command line.
+#-----------------------------------------------------------------------------
+def parse_args(argv=None):
+    """Parses the command line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description="Recursively lists the files under a directory.")
+    parser.add_argument('pathname', nargs='?',
+                        help="directory to list (prompted for when omitted)")
+    parser.add_argument('--format', choices=sorted(sinks.SINK_FORMATS), default='text',
+                        help="output format (default: text)")
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help="write the listing to FILE instead of stdout")
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help="number of threads reading directories (default: 1)")
+    parser.add_argument('--ordered', action='store_true',
+                        help="keep the serial output order when using several workers")
+    parser.add_argument('--attributes', action='store_true',
+                        help="append the Windows file attributes, such as hidden and system")
+    parser.add_argument('--hash', metavar='ALGORITHM',
+                        help="append a content digest, such as sha256, to each file")
+    parser.add_argument('--hash-cache', metavar='FILE',
+                        help="persistent digest cache used with --hash")
+
+    args = parser.parse_args(argv)
+
+    if args.hash_cache and not args.hash:
+        parser.error("--hash-cache requires --hash")
+    if args.hash and args.hash.lower() not in hashlib.algorithms_available:
+        parser.error(f"Unknown hash algorithm: {args.hash}")
+
+    return args
+
+
+#-----------------------------------------------------------------------------
+# main()
+#-----------------------------------------------------------------------------
+def main(argv=None):
+    """Main function"""
+
+    args = parse_args(argv)
+
+    # Prompt the user to enter a pathname
+    pathname = args.pathname
+    if pathname is None:
+        pathname = input("Enter the pathname: ")
+
+    fields = ATTRIBUTE_FIELDS if args.attributes else FIELDS
+
+    # Open the digest cache when hashing
+    hash_cache = None
+    hasher = None
+    if args.hash:
+        if args.hash_cache:
+            hash_cache = hashing.HashCache(args.hash_cache)
+        hasher = hashing.FileHasher(args.hash, hash_cache, max(args.workers, 4))
+        fields += ('digest',)
 
+    try:
+        # List the files through a buffered sink
+        with sinks.open_sink(args.format, fields, args.output) as sink:
+            list_files(pathname, sink, hasher, args.attributes,
+                       workers=args.workers, ordered=args.ordered)
+    finally:
+        if hash_cache is not None:
+            hash_cache.close()
 
-# Prompt the user to enter a pathname
-PATHNAME_ARG = input("Enter the pathname: ")
 
-# List the files
-list_files(PATHNAME_ARG)
+if __name__ == "__main__":
+    main()
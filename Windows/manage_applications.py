@@ -10,22 +10,73 @@
 """manage_applications.py""" # for pylint
 # pylint: disable=line-too-long
 
+import argparse
+import concurrent.futures
 import ctypes
+import json
 import os
 import re
 import subprocess
-import winreg
+import threading
+import time
+
+import registry_backend
+import uninstall_executor
 
 
 ALLOW_APPS = ['microsoft', 'python', 'mozilla', 'notepad++', 'vmware', 'java', '7-zip',
                'gimp', 'inkscape']
 INSTALLED_APPS = []
 
+# Allowlist read by default, one entry per line; see AppAllowList.from_file()
+ALLOWLIST_PATHNAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'allowed_apps.txt')
+
+# Prefix of the allowlist entries that are regular expressions
+ALLOWLIST_REGEX_PREFIX = 're:'
+
+# Deepest nesting of groups in the allowlist trie; the re module compiles
+# nested groups recursively, so deeper tries fall back to an alternation
+ALLOWLIST_TRIE_MAX_NESTING = 100
+
 # Windows registry keys for managing installed applications in HKEY_LOCAL_MACHINE
 APPKEY1 = r'SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall'
 APPKEY2 = r'SOFTWARE\WOW6432Node\Microsoft\Windows\CurrentVersion\Uninstall'
 
-SHELL32 = ctypes.windll.shell32
+# Registry values read for each application, by the key used in its record
+APP_VALUES = {
+    'Name': 'DisplayName',
+    'Uninstall': 'UninstallString',
+    'QuietUninstall': 'QuietUninstallString',
+    'Version': 'DisplayVersion',
+    'Publisher': 'Publisher',
+    'InstallDate': 'InstallDate',
+}
+
+# Commands whose executable pathname may need quoting
+PROGRAM_FILES_RE = re.compile(r'C:\\Program Files', flags=re.IGNORECASE)
+
+# A command line token: a run of non-white space that may contain
+# double-quoted sections with white space in them
+COMMAND_TOKEN_RE = re.compile(r'(?:[^\s"]|"[^"]*"?)+')
+
+# Characters that cannot appear in a Windows pathname
+INVALID_PATH_RE = re.compile(r'["*?<>|]')
+
+# Threads reading the applications of the users
+USER_WORKERS = 8
+
+# An MsiExec command line for a product, which can be made quiet
+MSIEXEC_PRODUCT_RE = re.compile(r'"?(?:[^"]*\\)?msiexec(?:\.exe)?"?\s+/[IX]\s*(\{[0-9A-F-]{36}\})',
+                                flags=re.IGNORECASE)
+
+# Cache of os.path.isfile() results, by normalized pathname
+PATH_IS_FILE = {}
+
+# The shell and registry are only available on Windows.  The registry
+# backend can be replaced, such as with a registry_backend.MemoryRegistry
+# for testing on other platforms.
+SHELL32 = ctypes.windll.shell32 if hasattr(ctypes, 'windll') else None
+BACKEND = registry_backend.default_backend()
 
 
 #-----------------------------------------------------------------------------
@@ -33,6 +84,8 @@ SHELL32 = ctypes.windll.shell32
 #-----------------------------------------------------------------------------
 def is_admin():
     """Returns TRUE if user is an admin"""
+    if SHELL32 is None:
+        return False
     result = SHELL32.IsUserAnAdmin() != 0
     return result
 
@@ -40,15 +93,59 @@ def is_admin():
 #-----------------------------------------------------------------------------
 # reg_query_value()
 #-----------------------------------------------------------------------------
-def reg_query_value(key, name):
+def reg_query_value(key, name, backend=None):
     """Query the value for the provided key"""
     try:
-        value = winreg.QueryValueEx(key, name)
-        return value[0]
-    except WindowsError:
+        return (backend or BACKEND).query_value(key, name)[0]
+    except OSError:
         return ""
 
 
+#-----------------------------------------------------------------------------
+# path_is_file()
+#
+# os.path.isfile() with the results cached for the whole run, since the
+# same pathnames are probed for the uninstall and quiet uninstall commands
+# and for applications installed under the same directories.
+#-----------------------------------------------------------------------------
+def path_is_file(pathname):
+    """Returns True if the pathname is an existing file"""
+
+    key = os.path.normcase(pathname)
+    result = PATH_IS_FILE.get(key)
+    if result is None:
+        result = PATH_IS_FILE[key] = os.path.isfile(pathname)
+    return result
+
+
+#-----------------------------------------------------------------------------
+# candidate_pathname_ends()
+#
+# Returns the offsets in the command where the executable pathname could
+# end, in the order to probe them.  Offsets are the ends of the command
+# line tokens, where a token is a run of non-white space that may contain
+# double-quoted sections.  Prefixes ending in '.exe' are probed first,
+# longest first, and then the remaining ones shortest first, the same as
+# before.  Prefixes that cannot be a Windows pathname are never probed.
+#-----------------------------------------------------------------------------
+def candidate_pathname_ends(command):
+    """Returns the possible ends of the executable pathname in a command"""
+
+    exe_ends = []
+    other_ends = []
+    for match in COMMAND_TOKEN_RE.finditer(command):
+        candidate = command[:match.end()]
+        if INVALID_PATH_RE.search(candidate) or ':' in candidate[2:]:
+            # Every longer prefix contains the same character
+            break
+        if candidate.lower().endswith('.exe'):
+            exe_ends.append(match.end())
+        else:
+            other_ends.append(match.end())
+
+    return exe_ends[::-1] + other_ends
+
+
 #-----------------------------------------------------------------------------
 # validate_command_pathname()
 #
@@ -64,74 +161,255 @@ def reg_query_value(key, name):
 #     "C:\Program Files(x86)\Test Application\Test.exe" arg1 arg2 arg3
 #
 # However, it will only work if the file exists on the local filesystem.
+# The arguments are kept exactly as they are, including their white space,
+# and the command is returned unchanged when no pathname is found.
 #-----------------------------------------------------------------------------
 def validate_command_pathname(command):
     """Validates pathname in a command"""
 
-    # Search for 'C:\Program Files' and 'C:\Program Files (x86)' by checking
-    # if the string starts with 'C:\Program Files' at the very start.  The
-    # \A option forces a match at the start of the string to skip over a
-    # '"' at the beginning
-    if re.search(r'\AC:\\Program Files', command, flags=re.IGNORECASE):
+    # Only unquoted commands starting with 'C:\Program Files' (which also
+    # matches 'C:\Program Files (x86)') need quoting
+    if not PROGRAM_FILES_RE.match(command):
+        return command
 
-        # The string does not start with a '"' so split it into
-        # components separated by white space
-        split_command = command.split()
+    for end in candidate_pathname_ends(command):
+        if path_is_file(command[:end]):
+            return f'"{command[:end]}"{command[end:]}'
 
-        # Incrementally add each component to a string to see if the path exists
-        new_command = ''
-        path_found = False
-        for path_component in split_command:
+    # Default is to return the unmodified command
+    return command
+
+
+#-----------------------------------------------------------------------------
+# make_app_record()
+#
+# Builds the application record from the values of its Uninstall subkey, or
+# returns None if the subkey has no display name or uninstall command.
+# Values that are missing or are not strings are left empty.
+#-----------------------------------------------------------------------------
+def make_app_record(values):
+    """Builds an application record from the values of a registry key"""
 
-            new_command += f"{path_component}"
+    app = {}
+    for field, value_name in APP_VALUES.items():
+        data = values.get(value_name.lower(), ("", None))[0]
+        app[field] = data if isinstance(data, str) else ""
 
-            # Check if the new command is the complete executable
-            if path_found is False:
-                if os.path.isfile(new_command) is True:
-                    path_found = True
-                    new_command = '"' + new_command + '"'
+    if app['Name'] == "" or app['Uninstall'] == "":
+        return None
 
-            # Add on the space
-            new_command += r" "
+    app['Uninstall'] = validate_command_pathname(app['Uninstall'])
+    app['QuietUninstall'] = validate_command_pathname(app['QuietUninstall'])
+    return app
 
-        # Return the new command string with the quoted executable pathname
-        return new_command
 
-    # Default is to return the unmodified command
-    return command
+#-----------------------------------------------------------------------------
+# read_apps_from_regkey()
+#
+# Reads the applications from the subkeys of an Uninstall key.  All of the
+# values of each subkey are read in a single pass, instead of querying each
+# value separately and failing on the ones that are missing.
+#
+# The pass is not fewer registry calls: it costs a QueryInfoKey and one
+# EnumValue per value of the subkey, against one QueryValueEx per field of
+# APP_VALUES, and Uninstall subkeys usually hold more values than that.
+# It is faster while the calls are cheap, since no exception is raised for
+# the missing values; when they are slow, the InventoryCache is what cuts
+# the calls, by not opening the unchanged subkeys at all.
+#-----------------------------------------------------------------------------
+def read_apps_from_regkey(key, backend=None):
+    """Returns the applications from a registry key"""
+
+    backend = backend or BACKEND
+    apps = []
+    for subkey_name in backend.subkey_names(key):
+        try:
+            with backend.open_key(key, subkey_name) as subkey_key:
+                values = backend.read_values(subkey_key)
+        except OSError:
+            continue
+
+        app = make_app_record(values)
+        if app is not None:
+            apps.append(app)
+
+    return apps
+
+
+#-----------------------------------------------------------------------------
+# InventoryCache
+#
+# Applications read from the Uninstall keys on earlier runs, along with the
+# last write time of each subkey, so that only the subkeys written since
+# then are read again.  Writing a value of a key changes its last write
+# time, and the times of all of the subkeys are returned by a single
+# enumeration of the Uninstall key.  Subkeys that are not applications are
+# cached too.
+#
+# The cache is kept in a JSON file as:
+#
+#     {"version": 1, "keys": {Uninstall key path: {subkey name: [last write, app]}}}
+#
+# Only the keys read on the current run are saved, so the entries of users
+# and applications that are gone are dropped.  A cache that cannot be read
+# is ignored and rebuilt.
+#-----------------------------------------------------------------------------
+class InventoryCache:
+    """Cache of the applications read from the registry"""
+
+    VERSION = 1
+
+    def __init__(self, pathname):
+        self.pathname = pathname
+        self.previous = {}
+        self.current = {}
+        self.lock = threading.Lock()
+        self.reused = 0
+        self.read = 0
+
+    def load(self):
+        """Reads the cache file, if there is a valid one"""
+
+        try:
+            with open(self.pathname, encoding='utf-8') as cache_file:
+                state = json.load(cache_file)
+            if state['version'] == self.VERSION and isinstance(state['keys'], dict):
+                self.previous = state['keys']
+        except (OSError, ValueError, KeyError, TypeError):
+            self.previous = {}
+        return self
+
+    def lookup(self, path):
+        """Returns the cached subkeys of an Uninstall key"""
+        return self.previous.get(path, {})
+
+    def store(self, path, subkeys, reused, read):
+        """Records the subkeys of an Uninstall key read on this run"""
+        with self.lock:
+            self.current[path] = subkeys
+            self.reused += reused
+            self.read += read
+
+    def save(self):
+        """Writes the cache file with the keys read on this run"""
+
+        temp_pathname = self.pathname + '.tmp'
+        with open(temp_pathname, 'w', encoding='utf-8') as cache_file:
+            json.dump({'version': self.VERSION, 'keys': self.current}, cache_file,
+                      separators=(',', ':'))
+        os.replace(temp_pathname, self.pathname)
+
+
+#-----------------------------------------------------------------------------
+# read_apps_from_regkey_cached()
+#
+# Reads the applications from the subkeys of an Uninstall key like
+# read_apps_from_regkey(), except that subkeys with the same last write time
+# as in the cache are taken from the cache instead of being opened.  The
+# path of the key identifies it in the cache.
+#-----------------------------------------------------------------------------
+def read_apps_from_regkey_cached(key, path, cache, backend=None):
+    """Returns the applications from a registry key, using the cache"""
+
+    backend = backend or BACKEND
+    cached = cache.lookup(path)
+    subkeys = {}
+    apps = []
+    reused = 0
+    for subkey_name, last_write in backend.subkey_info(key):
+        entry = cached.get(subkey_name)
+        if entry is not None and entry[0] == last_write:
+            reused += 1
+        else:
+            try:
+                with backend.open_key(key, subkey_name) as subkey_key:
+                    values = backend.read_values(subkey_key)
+            except OSError:
+                continue
+            entry = [last_write, make_app_record(values)]
+
+        subkeys[subkey_name] = entry
+        if entry[1] is not None:
+            apps.append(entry[1])
+
+    cache.store(path, subkeys, reused, len(subkeys) - reused)
+    return apps
+
+
+#-----------------------------------------------------------------------------
+# read_uninstall_key()
+#-----------------------------------------------------------------------------
+def read_uninstall_key(key, path, backend=None, cache=None):
+    """Returns the applications from an Uninstall key, using the cache if there is one"""
+
+    if cache is None:
+        return read_apps_from_regkey(key, backend)
+    return read_apps_from_regkey_cached(key, path, cache, backend)
 
 
 #-----------------------------------------------------------------------------
 # enumerate_apps_from_regkey()
 #-----------------------------------------------------------------------------
-def enumerate_apps_from_regkey(key):
+def enumerate_apps_from_regkey(key, backend=None):
     """Enumerates the applications from a registry key"""
-    i = 0
-    while True:
-        try:
-            # Get the next subkey name
-            subkey_name = winreg.EnumKey(key, i)
+    INSTALLED_APPS.extend(read_apps_from_regkey(key, backend))
+
+
+#-----------------------------------------------------------------------------
+# read_apps_from_user()
+#
+# Reads the applications installed for one user, from the Uninstall key and
+# the WOW64 Uninstall key under the user's SID.  Keys that do not exist are
+# skipped.
+#-----------------------------------------------------------------------------
+def read_apps_from_user(users_key, user_sid, backend=None, cache=None):
+    """Returns the applications installed for a user"""
 
-            # Open the subkey
-            subkey_key = winreg.OpenKey(key, subkey_name)
+    backend = backend or BACKEND
+    apps = []
+    try:
+        with backend.open_key(users_key, user_sid) as user_sid_key:
+            for sub_key in (APPKEY1, APPKEY2):
+                try:
+                    with backend.open_key(user_sid_key, sub_key) as registry_key:
+                        apps.extend(read_uninstall_key(registry_key,
+                                                       f"HKEY_USERS\\{user_sid}\\{sub_key}",
+                                                       backend, cache))
+                except OSError:
+                    pass
+
+    except OSError:
+        pass
 
-            # See if the values exist for the subkey
-            name = reg_query_value(subkey_key, r'DisplayName')
-            uninstall = validate_command_pathname(reg_query_value(subkey_key, r'UninstallString'))
-            quiet_uninstall = validate_command_pathname(reg_query_value(subkey_key, r'QuietUninstallString'))
+    return apps
 
-            # Close the subkey
-            winreg.CloseKey(subkey_key)
 
-            # If the subkey has a display name and an uninstall command, then append it to the list of applications
-            if name != "" and uninstall != "":
-                INSTALLED_APPS.append({'Name':name, 'Uninstall':uninstall, 'QuietUninstall':quiet_uninstall})
+#-----------------------------------------------------------------------------
+# read_apps_from_users()
+#
+# Applications can be installed for just a user and not system wide.  Scan
+# the HKEY_USERS key to enumerate the SIDs of all users and read the
+# applications of each user.  With more than one worker the users are read
+# on a thread pool, since the registry calls release the GIL, and the
+# applications are returned in the order of the SIDs either way.
+#-----------------------------------------------------------------------------
+def read_apps_from_users(backend=None, workers=1, cache=None):
+    """Returns the applications installed for users"""
 
-            # Advance to the next subkey
-            i += 1
+    backend = backend or BACKEND
+    users_key = backend.root('HKEY_USERS')
+    user_sids = backend.subkey_names(users_key)
 
-        except WindowsError:
-            break
+    if workers <= 1 or len(user_sids) <= 1:
+        user_apps = [read_apps_from_user(users_key, user_sid, backend, cache)
+                     for user_sid in user_sids]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(read_apps_from_user, users_key, user_sid, backend, cache)
+                       for user_sid in user_sids]
+            user_apps = [future.result() for future in futures]
+
+    return [app for apps in user_apps for app in apps]
 
 
 #-----------------------------------------------------------------------------
@@ -140,50 +418,194 @@ def enumerate_apps_from_regkey(key):
 # Attempt to open the specified subkey for the user.  If it exists, then
 # enumerate the applications from it.
 #-----------------------------------------------------------------------------
-def enumerate_app_from_user(user_key, sub_key):
+def enumerate_app_from_user(user_key, sub_key, backend=None):
     """Enumerates applications from the specified user key"""
 
+    backend = backend or BACKEND
     try:
-        registry_key = winreg.OpenKey(user_key, sub_key)
-        enumerate_apps_from_regkey(registry_key)
-        winreg.CloseKey(registry_key)
+        with backend.open_key(user_key, sub_key) as registry_key:
+            enumerate_apps_from_regkey(registry_key, backend)
 
-    except WindowsError:
+    except OSError:
         pass
 
 
 #-----------------------------------------------------------------------------
 # enumerate_apps_from_users()
-#
-# Applications can be installed for just a user and not system wide.  Scan
-# the HKEY_USERS key to enumerate the SIDs of all users and attempt to
-# enumerate applications per user.
 #-----------------------------------------------------------------------------
-def enumerate_apps_from_users():
+def enumerate_apps_from_users(backend=None, workers=1):
     """Enumerates the applications installed for users"""
-    i = 0
-    while True:
-        try:
-            # Get the next subkey name
-            user_sid = winreg.EnumKey(winreg.HKEY_USERS, i)
+    INSTALLED_APPS.extend(read_apps_from_users(backend, workers))
+
+
+#-----------------------------------------------------------------------------
+# merge_inventory()
+#
+# Merges lists of applications into one inventory.  An application listed
+# more than once, such as under both Uninstall keys or for several users,
+# is kept once, identified by its name and uninstall command.
+#-----------------------------------------------------------------------------
+def merge_inventory(*app_lists):
+    """Returns the deduplicated applications of several lists"""
 
-            # Open the subkey
-            user_sid_key = winreg.OpenKey(winreg.HKEY_USERS, user_sid)
+    inventory = {}
+    for apps in app_lists:
+        for app in apps:
+            inventory.setdefault((app['Name'].lower(), app['Uninstall'].lower()), app)
+    return list(inventory.values())
 
-            # Enumerate all of the applications for the user
-            enumerate_app_from_user(user_sid_key, APPKEY1)
 
-            # Enumerate all of the WOW64 applications for the user
-            enumerate_app_from_user(user_sid_key, APPKEY2)
+#-----------------------------------------------------------------------------
+# read_inventory()
+#
+# Reads the applications installed for the machine and for every user.  With
+# a cache, only the subkeys written since the cache was saved are read.
+#-----------------------------------------------------------------------------
+def read_inventory(backend=None, workers=USER_WORKERS, cache=None):
+    """Returns the deduplicated inventory of the installed applications"""
 
-            # Close the subkey
-            winreg.CloseKey(user_sid_key)
+    backend = backend or BACKEND
+    machine_apps = []
+    machine_key = backend.root('HKEY_LOCAL_MACHINE')
+    for sub_key in (APPKEY1, APPKEY2):
+        with backend.open_key(machine_key, sub_key) as registry_key:
+            machine_apps.extend(read_uninstall_key(registry_key, f"HKEY_LOCAL_MACHINE\\{sub_key}",
+                                                   backend, cache))
 
-            # Advance to the next subkey
-            i += 1
+    return merge_inventory(machine_apps, read_apps_from_users(backend, workers, cache))
 
-        except WindowsError:
-            break
+
+#-----------------------------------------------------------------------------
+# literal_trie_pattern()
+#
+# Builds a regular expression matching any of the literal strings, with the
+# strings merged into a trie so that the regular expression engine follows
+# one branch per character instead of trying every string at each position.
+# Only whether a string occurs matters, so a string that extends another
+# one is dropped.
+#
+# The trie is walked with an explicit stack, so long strings do not exceed
+# the recursion limit, and runs of characters without a branch are escaped
+# as one piece.  If the strings branch too deeply to be compiled, they are
+# matched with a plain alternation instead.
+#-----------------------------------------------------------------------------
+def literal_trie_pattern(literals):
+    """Returns a regular expression matching any of the literal strings"""
+
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def branch(char, node):
+        chars = [char]
+        while len(node) == 1 and '' not in node:
+            (char, node), = node.items()
+            chars.append(char)
+        return re.escape(''.join(chars)), node
+
+    # Patterns and group nesting of the finished nodes, by id()
+    built = {}
+    stack = [(trie, None)]
+    while stack:
+        node, branches = stack.pop()
+        if '' in node:
+            built[id(node)] = ('', 0)
+        elif branches is None:
+            branches = [branch(char, child) for char, child in sorted(node.items())]
+            stack.append((node, branches))
+            stack.extend((child, None) for _, child in branches)
+        else:
+            parts = [(prefix + built[id(child)][0], built[id(child)][1])
+                     for prefix, child in branches]
+            nesting = max((depth for _, depth in parts), default=0)
+            if len(parts) == 1:
+                built[id(node)] = parts[0]
+            else:
+                built[id(node)] = ('(?:' + '|'.join(part for part, _ in parts) + ')', nesting + 1)
+
+    pattern, nesting = built[id(trie)]
+    if nesting > ALLOWLIST_TRIE_MAX_NESTING:
+        return '|'.join(re.escape(literal) for literal in sorted(literals))
+    return pattern
+
+
+#-----------------------------------------------------------------------------
+# AppAllowList
+#
+# Matches application names against the allowed applications.  Entries are
+# case-insensitive substrings of the name, or regular expressions searched
+# in the name.  All of the entries are compiled into a single regular
+# expression when the allowlist is built, and the result for each name is
+# cached, since the same applications are often installed for many users.
+#-----------------------------------------------------------------------------
+class AppAllowList:
+    """Compiled list of allowed applications"""
+
+    def __init__(self, literals=(), patterns=()):
+        literals = {literal.lower() for literal in literals if literal}
+        parts = [literal_trie_pattern(literals)] if literals else []
+        parts.extend(f"(?:{pattern})" for pattern in patterns)
+        self.regex = re.compile('|'.join(parts), flags=re.IGNORECASE) if parts else None
+        self.cache = {}
+
+    #-------------------------------------------------------------------------
+    # from_file()
+    #
+    # Reads an allowlist file with one entry per line.  Blank lines and lines
+    # starting with '#' are ignored, and entries starting with 're:' are
+    # regular expressions instead of substrings.
+    #-------------------------------------------------------------------------
+    @classmethod
+    def from_file(cls, pathname):
+        """Returns the allowlist read from a file"""
+
+        literals = []
+        patterns = []
+        with open(pathname, encoding='utf-8') as allowlist_file:
+            for line_number, line in enumerate(allowlist_file, 1):
+                entry = line.strip()
+                if entry == "" or entry.startswith('#'):
+                    continue
+                if not entry.startswith(ALLOWLIST_REGEX_PREFIX):
+                    literals.append(entry)
+                    continue
+                pattern = entry[len(ALLOWLIST_REGEX_PREFIX):]
+                try:
+                    re.compile(pattern)
+                except (re.error, RecursionError) as e:
+                    raise ValueError(f"{pathname}:{line_number}: Invalid regular expression "
+                                     f"{pattern}: {e}") from None
+                patterns.append(pattern)
+
+        return cls(literals, patterns)
+
+    def is_allowed(self, name):
+        """Returns True if the application name is allowed"""
+
+        result = self.cache.get(name)
+        if result is None:
+            result = self.cache[name] = (self.regex is not None
+                                         and self.regex.search(name) is not None)
+        return result
+
+
+#-----------------------------------------------------------------------------
+# load_allowlist()
+#
+# Reads the allowlist file, or uses ALLOW_APPS when the default allowlist
+# file does not exist.
+#-----------------------------------------------------------------------------
+def load_allowlist(pathname=None):
+    """Returns the allowlist of applications"""
+
+    if pathname is None:
+        if not os.path.isfile(ALLOWLIST_PATHNAME):
+            return AppAllowList(ALLOW_APPS)
+        pathname = ALLOWLIST_PATHNAME
+    return AppAllowList.from_file(pathname)
 
 
 #-----------------------------------------------------------------------------
@@ -216,52 +638,156 @@ def delete_app_query(name):
     return False
 
 
+#-----------------------------------------------------------------------------
+# unattended_uninstall_command()
+#
+# Returns the command to remove an application without prompting.  The
+# quiet uninstall command is used when there is one.  Otherwise an MsiExec
+# command, which may open the maintenance dialog with /I, is changed to
+# remove the product with no user interface and no reboot.  Other commands
+# are used as they are, and are stopped by the timeout if they wait for
+# the user.
+#-----------------------------------------------------------------------------
+def unattended_uninstall_command(app):
+    """Returns the command to uninstall an application without prompting"""
+
+    if app['QuietUninstall'] != "":
+        return app['QuietUninstall']
+
+    match = MSIEXEC_PRODUCT_RE.match(app['Uninstall'])
+    if match:
+        return f"MsiExec.exe /X{match.group(1)} /qn /norestart"
+
+    return app['Uninstall']
+
+
+#-----------------------------------------------------------------------------
+# remove_unallowed_apps()
+#
+# Non-interactive removal: every application that is not on the allowlist
+# is uninstalled, several at a time, and a summary is printed.  With
+# dry_run, the commands are printed instead of run.
+#-----------------------------------------------------------------------------
+def remove_unallowed_apps(apps, allowlist, runner=None, concurrency=uninstall_executor.CONCURRENCY,
+                          timeout=uninstall_executor.TIMEOUT, dry_run=False):
+    """Uninstalls the applications that are not allowed and returns the results"""
+
+    jobs = []
+    for app in apps:
+        if allowlist.is_allowed(app['Name']):
+            print(f"AllowApp: {app['Name']}")
+        else:
+            jobs.append((app['Name'], unattended_uninstall_command(app)))
+
+    if dry_run:
+        for name, command in jobs:
+            print(f"Would delete: {name}: {command}")
+        return []
+
+    def report(result):
+        print(f"Deleting: {result.name}: {result.status}")
+
+    start = time.monotonic()
+    results = uninstall_executor.run_uninstalls(jobs, runner, concurrency, timeout, report)
+    for line in uninstall_executor.format_summary(results, time.monotonic() - start):
+        print(line)
+    return results
+
+
+#-----------------------------------------------------------------------------
+# parse_args()
+#-----------------------------------------------------------------------------
+def parse_args(argv=None):
+    """Parses the command line arguments"""
+
+    parser = argparse.ArgumentParser(
+        description="Scans the installed applications and deletes the unauthorized ones.")
+    parser.add_argument('--allowlist', metavar='FILE',
+                        help="allowed applications, one per line (default: allowed_apps.txt "
+                             "next to this script)")
+    parser.add_argument('--non-interactive', action='store_true',
+                        help="delete every application that is not allowed without prompting")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="with --non-interactive, list the uninstall commands without running them")
+    parser.add_argument('--concurrency', type=int, default=uninstall_executor.CONCURRENCY,
+                        help="with --non-interactive, uninstallers run at the same time "
+                             "(default: %(default)s)")
+    parser.add_argument('--timeout', type=float, default=uninstall_executor.TIMEOUT,
+                        help="with --non-interactive, seconds before an uninstaller is killed "
+                             "(default: %(default)s)")
+    parser.add_argument('--cache', metavar='FILE',
+                        help="keep the inventory in FILE and only read the applications "
+                             "changed since the last run")
+    parser.add_argument('--workers', type=int, default=USER_WORKERS,
+                        help="threads reading the applications of the users (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.timeout <= 0:
+        parser.error("--timeout must be greater than 0")
+    if args.dry_run and not args.non_interactive:
+        parser.error("--dry-run requires --non-interactive")
+    return args
+
+
 #-----------------------------------------------------------------------------
 # main()
 #-----------------------------------------------------------------------------
-def main():
+def main(argv=None):
     """Main function"""
 
+    args = parse_args(argv)
+    try:
+        allowlist = load_allowlist(args.allowlist)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read the allowlist: {e}")
+        return
+
     # Check if we have admin privileges
     if is_admin() is False:
         print("Administrator privileges are not available")
         return
 
     # Enumerate the apps from the registry
-    registry_key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, APPKEY1)
-    enumerate_apps_from_regkey(registry_key)
-    winreg.CloseKey(registry_key)
-
-    registry_key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, APPKEY2)
-    enumerate_apps_from_regkey(registry_key)
-    winreg.CloseKey(registry_key)
+    cache = InventoryCache(args.cache).load() if args.cache else None
+    apps = read_inventory(BACKEND, args.workers, cache)
+    if cache is not None:
+        print(f"Inventory: {cache.read} subkeys read, {cache.reused} from the cache")
+        try:
+            cache.save()
+        except OSError as e:
+            print(f"Cannot save the inventory cache: {e}")
 
-    enumerate_apps_from_users()
+    if args.non_interactive:
+        remove_unallowed_apps(apps, allowlist, None, args.concurrency, args.timeout,
+                              args.dry_run)
+        return
 
     # Parse through the installed applications
-    for app in INSTALLED_APPS:
+    for app in apps:
 
-        good_app = False
         name = app['Name']
         uninstall = app['Uninstall']
         quiet_uninstall = app['QuietUninstall']
 
         # Skip the application if the name is listed in the allowed application list
-        for matchapp in ALLOW_APPS:
-            if re.search(matchapp, name, flags=re.IGNORECASE):
-                print(f"AllowApp: {name}")
-                good_app = True
+        if allowlist.is_allowed(name):
+            print(f"AllowApp: {name}")
+            continue
 
         # Delete the application if it is not good
-        if good_app is False:
-            if delete_app_query(name) is True:
-                print(f"Deleting: {name}")
-                if quiet_uninstall != "":
-                    run_command(quiet_uninstall)
-                else:
-                    run_command(uninstall)
+        if delete_app_query(name) is True:
+            print(f"Deleting: {name}")
+            if quiet_uninstall != "":
+                run_command(quiet_uninstall)
             else:
-                print(f"Skipping: {name}")
+                run_command(uninstall)
+        else:
+            print(f"Skipping: {name}")
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -10,10 +10,69 @@
 """manage_policy.py""" # for pylint
 # pylint: disable=line-too-long
 
+import argparse
 import ctypes
+import os
 import subprocess
+import sys
+import tempfile
 
-SHELL32 = ctypes.windll.shell32
+import policy_model
+import registry_backend
+
+# Ways of writing the registry policy: in-process through the registry
+# backend, with a single import of a generated .reg file, or with one
+# "reg add" command per setting
+ENGINES = ('winreg', 'reg-file', 'reg-add')
+
+# What main() does: write the whole policy (apply), report the settings that
+# differ from it (check), or write only the settings that differ (converge)
+MODES = ('apply', 'check', 'converge')
+
+# Password and lockout policy, by "net accounts" option; ages are in days
+# and lockout times in minutes
+PASSWORD_POLICY = {'uniquepw': 24, 'minpwlen': 12, 'maxpwage': 90, 'minpwage': 1,
+                   'lockoutthreshold': 10, 'lockoutduration': 30, 'lockoutwindow': 30}
+
+# Firewall profiles and the values "netsh advfirewall reset" sets, along
+# with the value a missing value stands for (None when it must be present)
+FIREWALL_KEY = r'SYSTEM\CurrentControlSet\Services\SharedAccess\Parameters\FirewallPolicy'
+FIREWALL_PROFILES = ('DomainProfile', 'StandardProfile', 'PublicProfile')
+FIREWALL_DEFAULTS = {'EnableFirewall': (1, None), 'DefaultInboundAction': (1, 1),
+                     'DefaultOutboundAction': (0, 0)}
+
+# Short names of the hives, for reg.exe
+HIVE_ABBREVIATIONS = {hive: abbreviation
+                      for abbreviation, hive in registry_backend.HIVE_ABBREVIATIONS.items()}
+
+# Password ages that never expire, from NetUserModalsGet()
+TIMEQ_FOREVER = 0xFFFFFFFF
+
+
+#-----------------------------------------------------------------------------
+# USER_MODALS_INFO_0 and USER_MODALS_INFO_3
+#
+# Password and lockout policy returned by NetUserModalsGet(), in seconds.
+#-----------------------------------------------------------------------------
+class USER_MODALS_INFO_0(ctypes.Structure): # pylint: disable=invalid-name,too-few-public-methods
+    """Password policy of NetUserModalsGet() level 0"""
+    _fields_ = [('min_passwd_len', ctypes.c_uint32), ('max_passwd_age', ctypes.c_uint32),
+                ('min_passwd_age', ctypes.c_uint32), ('force_logoff', ctypes.c_uint32),
+                ('password_hist_len', ctypes.c_uint32)]
+
+
+class USER_MODALS_INFO_3(ctypes.Structure): # pylint: disable=invalid-name,too-few-public-methods
+    """Lockout policy of NetUserModalsGet() level 3"""
+    _fields_ = [('lockout_duration', ctypes.c_uint32),
+                ('lockout_observation_window', ctypes.c_uint32),
+                ('lockout_threshold', ctypes.c_uint32)]
+
+# The shell and registry are only available on Windows.  The registry
+# backend can be replaced, such as with a registry_backend.MemoryRegistry
+# for testing on other platforms.
+SHELL32 = ctypes.windll.shell32 if hasattr(ctypes, 'windll') else None
+NETAPI32 = ctypes.windll.netapi32 if hasattr(ctypes, 'windll') else None
+BACKEND = registry_backend.default_backend()
 
 
 #-----------------------------------------------------------------------------
@@ -21,21 +80,25 @@ SHELL32 = ctypes.windll.shell32
 #-----------------------------------------------------------------------------
 def is_admin():
     """Returns TRUE if user is an admin"""
+    if SHELL32 is None:
+        return False
     result = SHELL32.IsUserAnAdmin() != 0
     return result
 
 
 #-----------------------------------------------------------------------------
 # set_password_policy()
+#
+# Sets the options of the password policy, by default all of
+# PASSWORD_POLICY.
 #-----------------------------------------------------------------------------
-def set_password_policy():
+def set_password_policy(options=None):
     """Sets the password policy"""
     try:
-        # Construct the command by setting the password policy
-        command = r"net accounts /uniquepw:24 /minpwlen:12 /maxpwage:90 /minpwage:1"
-
-        # Extend the command by adding lockout settings
-        command += r" /lockoutthreshold:10 /lockoutduration:30 /lockoutwindow:30"
+        # Construct the command by setting the password and lockout policy
+        options = PASSWORD_POLICY if options is None else options
+        command = "net accounts" + "".join(f" /{option}:{value}"
+                                           for option, value in options.items())
 
         # Execute the command
         subprocess.run(command,
@@ -49,6 +112,57 @@ def set_password_policy():
         print(f"Failed to set password policy. Error: {e}")
 
 
+#-----------------------------------------------------------------------------
+# read_password_policy()
+#
+# Reads the password and lockout policy with NetUserModalsGet(), in the
+# units of the "net accounts" options.  Returns None when the policy cannot
+# be read, such as on other platforms.
+#-----------------------------------------------------------------------------
+def read_password_policy():
+    """Returns the current password policy"""
+
+    if NETAPI32 is None:
+        return None
+
+    modals = {}
+    for level, structure in ((0, USER_MODALS_INFO_0), (3, USER_MODALS_INFO_3)):
+        buffer = ctypes.c_void_p()
+        if NETAPI32.NetUserModalsGet(None, level, ctypes.byref(buffer)) != 0:
+            return None
+        try:
+            info = ctypes.cast(buffer, ctypes.POINTER(structure)).contents
+            modals.update({name: getattr(info, name) for name, _ in structure._fields_})
+        finally:
+            NETAPI32.NetApiBufferFree(buffer)
+
+    def days(seconds):
+        return 'UNLIMITED' if seconds == TIMEQ_FOREVER else seconds // 86400
+
+    return {'uniquepw': modals['password_hist_len'],
+            'minpwlen': modals['min_passwd_len'],
+            'maxpwage': days(modals['max_passwd_age']),
+            'minpwage': days(modals['min_passwd_age']),
+            'lockoutthreshold': modals['lockout_threshold'],
+            'lockoutduration': modals['lockout_duration'] // 60,
+            'lockoutwindow': modals['lockout_observation_window'] // 60}
+
+
+#-----------------------------------------------------------------------------
+# find_password_drift()
+#
+# Returns the options of PASSWORD_POLICY that differ from the current
+# policy, as a dictionary of option to (current, desired) value.  Every
+# option differs when the current policy is not known.
+#-----------------------------------------------------------------------------
+def find_password_drift(current):
+    """Returns the password policy options that differ"""
+
+    current = current or {}
+    return {option: (current.get(option), desired)
+            for option, desired in PASSWORD_POLICY.items() if current.get(option) != desired}
+
+
 #-----------------------------------------------------------------------------
 # enable_firewall_defaults()
 #-----------------------------------------------------------------------------
@@ -70,6 +184,34 @@ def enable_firewall_defaults():
         print(f"Failed to reset the firewall. Error: {e}")
 
 
+#-----------------------------------------------------------------------------
+# find_firewall_drift()
+#
+# Compares the firewall profiles with the state after a reset, and returns
+# a list of (profile, value name, current, desired) for the values that
+# differ.  Only the profile state is compared, not the firewall rules.
+#-----------------------------------------------------------------------------
+def find_firewall_drift(backend=None):
+    """Returns the firewall profile values that differ from the defaults"""
+
+    backend = backend or BACKEND
+    drift = []
+    policy_key = backend.root('HKEY_LOCAL_MACHINE')
+    for profile in FIREWALL_PROFILES:
+        try:
+            with backend.open_key(policy_key, f"{FIREWALL_KEY}\\{profile}") as profile_key:
+                values = backend.read_values(profile_key)
+        except OSError:
+            values = {}
+
+        for name, (desired, missing) in FIREWALL_DEFAULTS.items():
+            current = values.get(name.lower(), (missing, None))[0]
+            if current != desired:
+                drift.append((profile, name, current, desired))
+
+    return drift
+
+
 #-----------------------------------------------------------------------------
 # Secure registry policy settings
 #-----------------------------------------------------------------------------
@@ -203,13 +345,274 @@ REG = [
       ]
 
 
+#-----------------------------------------------------------------------------
+# registry_policy_plan()
+#
+# Returns the plan of the registry policy: the REG settings, parsed once,
+# or the settings of the policy files.  Plans of policy files are reused
+# from the plan cache file while the files do not change.
+#-----------------------------------------------------------------------------
+def registry_policy_plan(policy_files=None, cache_pathname=None):
+    """Returns the registry policy plan"""
+
+    if policy_files:
+        return policy_model.load_policy_plan(policy_files, cache_pathname)
+
+    plan = policy_model.PLAN_CACHE.get('REG')
+    if plan is None:
+        plan = policy_model.PLAN_CACHE['REG'] = policy_model.PolicyPlan(
+            policy_model.parse_reg_command(reg_cmd) for reg_cmd in REG)
+    return plan
+
+
+#-----------------------------------------------------------------------------
+# apply_registry_settings()
+#
+# Writes the settings, or a plan, in-process through the registry backend,
+# opening each key once for all of its values.  Returns the number of settings that
+# could not be written.
+#-----------------------------------------------------------------------------
+def apply_registry_settings(settings, backend=None):
+    """Writes the registry settings through the registry backend"""
+
+    backend = backend or BACKEND
+    failures = 0
+    for group in policy_model.as_plan(settings).groups:
+        first = group[0]
+        try:
+            with backend.create_key(backend.root(first.hive), first.key) as key:
+                for setting in group:
+                    try:
+                        backend.set_value(key, setting.name, setting.type, setting.value)
+                        print(f"RegSuccess {format_setting(setting)}")
+                    except OSError as e:
+                        failures += 1
+                        print(f"RegFailure {format_setting(setting)} Error: {e}")
+
+        except OSError as e:
+            failures += len(group)
+            for setting in group:
+                print(f"RegFailure {format_setting(setting)} Error: {e}")
+
+    return failures
+
+
+#-----------------------------------------------------------------------------
+# registry_value_matches()
+#
+# Returns True if the current (data, type) of a value, or None when it is
+# missing, is the value of the setting.  DWORD and QWORD values are
+# compared as unsigned numbers, the same as winreg returns them.
+#-----------------------------------------------------------------------------
+def registry_value_matches(setting, current):
+    """Returns True if a registry value already has the value of a setting"""
+
+    if current is None or current[1] != setting.type:
+        return False
+    if setting.type == registry_backend.REG_DWORD:
+        return current[0] == setting.value & 0xFFFFFFFF
+    if setting.type == registry_backend.REG_QWORD:
+        return current[0] == setting.value & 0xFFFFFFFFFFFFFFFF
+    if setting.type == registry_backend.REG_MULTI_SZ:
+        return list(current[0] or []) == list(setting.value)
+    return current[0] == setting.value
+
+
+#-----------------------------------------------------------------------------
+# find_registry_drift()
+#
+# Reads the current values of the settings, one bulk read per key, and
+# returns a list of (setting, current) for the settings that differ, where
+# current is the (data, type) of the value or None when it is missing.
+#-----------------------------------------------------------------------------
+def find_registry_drift(settings, backend=None):
+    """Returns the registry settings that differ from their current values"""
+
+    backend = backend or BACKEND
+    drift = []
+    for group in policy_model.as_plan(settings).groups:
+        try:
+            with backend.open_key(backend.root(group[0].hive), group[0].key) as key:
+                values = backend.read_values(key)
+        except OSError:
+            values = {}
+
+        for setting in group:
+            current = values.get(setting.name.lower())
+            if not registry_value_matches(setting, current):
+                drift.append((setting, current))
+
+    return drift
+
+
+#-----------------------------------------------------------------------------
+# check_policy()
+#
+# Reads the current password policy, firewall profiles and registry values,
+# and reports the ones that differ from the policy.  With converge, only
+# what differs is written: the password options that differ, a firewall
+# reset when a profile differs, and the registry values that differ, with
+# one of the ENGINES.  A compliant system costs only reads.  Returns the
+# number of differences.
+#-----------------------------------------------------------------------------
+def check_policy(converge=False, backend=None, password_policy=None, plan=None,
+                 engine='winreg'):
+    """Reports and optionally corrects the differences from the policy"""
+
+    backend = backend or BACKEND
+    password_drift = find_password_drift(password_policy if password_policy is not None
+                                         else read_password_policy())
+    firewall_drift = find_firewall_drift(backend)
+    if plan is None:
+        plan = registry_policy_plan()
+    registry_drift = find_registry_drift(plan, backend)
+
+    for option, (current, desired) in password_drift.items():
+        current = "unknown" if current is None else current
+        print(f"Drift password policy {option}: {current} -> {desired}")
+    for profile, name, current, desired in firewall_drift:
+        current = "missing" if current is None else current
+        print(f"Drift firewall {profile} {name}: {current} -> {desired}")
+    for setting, current in registry_drift:
+        current = "missing" if current is None else repr(current[0])
+        print(f"Drift {setting.hive}\\{setting.key} {setting.name}: {current} -> {setting.value!r}")
+
+    drift_count = len(password_drift) + len(firewall_drift) + len(registry_drift)
+    print(f"{drift_count} settings differ from the policy" if drift_count
+          else "The system complies with the policy")
+
+    if converge:
+        if password_drift:
+            set_password_policy({option: desired
+                                 for option, (_, desired) in password_drift.items()})
+        if firewall_drift:
+            enable_firewall_defaults()
+        if registry_drift:
+            set_registry_policy_settings(engine, backend, policy_model.PolicyPlan(
+                setting for setting, _ in registry_drift))
+
+    return drift_count
+
+
+#-----------------------------------------------------------------------------
+# format_setting()
+#-----------------------------------------------------------------------------
+def format_setting(setting):
+    """Returns the printable form of a setting"""
+    return f"{setting.hive}\\{setting.key} {setting.name} = {setting.value!r}"
+
+
+#-----------------------------------------------------------------------------
+# reg_file_value()
+#
+# Returns the data of a value as written in a .reg file.  Types other than
+# REG_SZ and REG_DWORD are written as hexadecimal bytes, with the strings
+# in UTF-16 LE.
+#-----------------------------------------------------------------------------
+def reg_file_value(value_type, value):
+    """Returns a registry value in .reg file syntax"""
+
+    if value_type == registry_backend.REG_SZ:
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    if value_type == registry_backend.REG_DWORD:
+        return f"dword:{value:08x}"
+
+    if value_type == registry_backend.REG_QWORD:
+        data = value.to_bytes(8, 'little')
+    elif value_type == registry_backend.REG_EXPAND_SZ:
+        data = (value + '\0').encode('utf-16-le')
+    elif value_type == registry_backend.REG_MULTI_SZ:
+        data = ''.join(string + '\0' for string in value + ['']).encode('utf-16-le')
+    else:
+        data = bytes(value)
+    return f"hex({value_type:x}):" + ','.join(f"{byte:02x}" for byte in data)
+
+
+#-----------------------------------------------------------------------------
+# write_reg_file()
+#-----------------------------------------------------------------------------
+def write_reg_file(settings, pathname):
+    """Writes the settings as a .reg file for reg import"""
+
+    lines = ["Windows Registry Editor Version 5.00", ""]
+    for group in policy_model.as_plan(settings).groups:
+        lines.append(f"[{group[0].hive}\\{group[0].key}]")
+        for setting in group:
+            name = setting.name.replace('\\', '\\\\').replace('"', '\\"')
+            lines.append(f'"{name}"={reg_file_value(setting.type, setting.value)}')
+        lines.append("")
+
+    # regedit and reg import expect UTF-16 LE with a byte order mark and CR LF
+    with open(pathname, 'w', encoding='utf-16', newline='\r\n') as reg_file:
+        reg_file.write('\n'.join(lines) + '\n')
+
+
+#-----------------------------------------------------------------------------
+# import_registry_settings()
+#
+# Writes the settings to a temporary .reg file and applies it with a single
+# "reg import".  Returns the number of settings that could not be written,
+# which is all or none of them.
+#-----------------------------------------------------------------------------
+def import_registry_settings(settings):
+    """Writes the registry settings with reg import"""
+
+    descriptor, pathname = tempfile.mkstemp(suffix='.reg')
+    os.close(descriptor)
+    try:
+        write_reg_file(settings, pathname)
+        subprocess.run(['reg', 'import', pathname],
+                       check=True,
+                       stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL)
+        print(f"RegSuccess {len(settings)} settings imported")
+        return 0
+
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"RegFailure {len(settings)} settings not imported Error: {e}")
+        return len(settings)
+
+    finally:
+        os.remove(pathname)
+
+
+#-----------------------------------------------------------------------------
+# format_reg_command()
+#
+# Returns the arguments of the "reg add" command that writes a setting.
+#-----------------------------------------------------------------------------
+def format_reg_command(setting):
+    """Returns the reg add arguments of a setting"""
+
+    if setting.type == registry_backend.REG_MULTI_SZ:
+        data = '\\0'.join(setting.value)
+    elif setting.type == registry_backend.REG_BINARY:
+        data = setting.value.hex()
+    else:
+        data = str(setting.value)
+    return (f'"{HIVE_ABBREVIATIONS[setting.hive]}\\{setting.key}" /v "{setting.name}" '
+            f'/t {policy_model.REG_TYPE_NAMES[setting.type]} /d "{data}" /f')
+
+
 #-----------------------------------------------------------------------------
 # set_registry_policy_settings()
+#
+# Writes the registry policy, by default the REG settings, with one of the
+# ENGINES.  The reg-add engine runs reg.exe once per setting, as before.
 #-----------------------------------------------------------------------------
-def set_registry_policy_settings():
+def set_registry_policy_settings(engine='winreg', backend=None, plan=None):
     """Sets secure registry settings"""
 
-    for reg_cmd in REG:
+    if plan is None:
+        plan = registry_policy_plan()
+    if engine == 'winreg':
+        apply_registry_settings(plan, backend)
+        return
+    if engine == 'reg-file':
+        import_registry_settings(plan)
+        return
+
+    for reg_cmd in map(format_reg_command, plan):
         try:
             # Construct the command
             command = f"reg add {reg_cmd}"
@@ -226,17 +629,64 @@ def set_registry_policy_settings():
             print(f"RegFailure {reg_cmd} Error: {e}")
 
 
+#-----------------------------------------------------------------------------
+# parse_args()
+#-----------------------------------------------------------------------------
+def parse_args(argv=None):
+    """Parses the command line arguments"""
+
+    parser = argparse.ArgumentParser(description="Sets the system security policy.")
+    parser.add_argument('--engine', choices=ENGINES,
+                        help="how the registry settings are written by apply and converge: "
+                             "in-process (winreg), with one reg import (reg-file) or with "
+                             "reg add per setting (reg-add) (default: winreg)")
+    parser.add_argument('--mode', choices=MODES, default='apply',
+                        help="write the whole policy (apply), only report the settings that "
+                             "differ (check), or write only the settings that differ "
+                             "(converge) (default: %(default)s)")
+    parser.add_argument('--policy', metavar='FILE', action='append',
+                        help="registry policy file to use instead of the built-in settings, "
+                             "as reg add arguments per line or JSON; may be repeated, with "
+                             "later files overriding earlier ones")
+    parser.add_argument('--plan-cache', metavar='FILE',
+                        help="keep the parsed policy files in FILE, reused until they change")
+
+    args = parser.parse_args(argv)
+    if args.engine is not None and args.mode == 'check':
+        parser.error("--engine cannot be combined with --mode check, which writes nothing")
+    if args.engine is None:
+        args.engine = 'winreg'
+    return args
+
+
 #-----------------------------------------------------------------------------
 # main()
 #-----------------------------------------------------------------------------
-def main():
+def main(argv=None):
     """Main function"""
 
+    args = parse_args(argv)
+    try:
+        plan = registry_policy_plan(args.policy, args.plan_cache)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read the registry policy: {e}")
+        return
+
+    # Checking only reads, so it does not need administrator privileges
+    if args.mode == 'check':
+        if check_policy(plan=plan):
+            sys.exit(1)
+        return
+
     # Check if we have admin privileges
     if is_admin() is False:
         print("Administrator privileges are not available")
         return
 
+    if args.mode == 'converge':
+        check_policy(converge=True, plan=plan, engine=args.engine)
+        return
+
     # Set the password policy
     set_password_policy()
 
@@ -244,6 +694,8 @@ def main():
     enable_firewall_defaults()
 
     # Set the registry settings
-    set_registry_policy_settings()
+    set_registry_policy_settings(args.engine, plan=plan)
+
 
-main()
+if __name__ == "__main__":
+    main()
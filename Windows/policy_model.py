@@ -0,0 +1,353 @@
+#-----------------------------------------------------------------------------
+# policy_model.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Registry policy settings as typed records, for manage_policy.py.  Settings
+# are parsed from the arguments of "reg add" commands, such as the REG list
+# of manage_policy.py, or loaded from policy files, and are validated and
+# deduplicated into a PolicyPlan that groups them by key.
+#
+# Policy files are either text, with the arguments of one "reg add" command
+# per line:
+#
+#     # Turns on UAC
+#     "HKLM\SOFTWARE\Microsoft\Windows\CurrentVersion\Policies\System" /v EnableLUA /t REG_DWORD /d 1 /f
+#
+# or JSON (a .json file), with a list of settings:
+#
+#     [{"key": "HKLM\\SOFTWARE\\...\\System", "name": "EnableLUA", "type": "REG_DWORD", "value": 1}]
+#
+# Loaded plans are cached in memory, and optionally in a plan cache file
+# that is used for as long as the policy files have not changed.  The cache
+# file is JSON, since the policy is applied with administrator privileges.
+#-----------------------------------------------------------------------------
+"""policy_model.py""" # for pylint
+# pylint: disable=line-too-long
+
+import collections
+import json
+import os
+import re
+
+import registry_backend
+
+# A token of a "reg add" command line: a double-quoted string or a run of
+# non-white space
+REG_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+# Names of the value types, by type
+REG_TYPE_NAMES = {value_type: name for name, value_type in registry_backend.REG_TYPES.items()}
+
+# Largest DWORD and QWORD values
+DWORD_MAX = 0xFFFFFFFF
+QWORD_MAX = 0xFFFFFFFFFFFFFFFF
+
+PolicySetting = collections.namedtuple('PolicySetting', 'hive key name type value')
+
+# Plans already loaded, by the (pathname, mtime_ns, size) of their files, or
+# by name for the built-in settings of a script
+PLAN_CACHE = {}
+
+
+#-----------------------------------------------------------------------------
+# parse_reg_value()
+#
+# Converts the /d data of a "reg add" command to the value written for its
+# type, the same as reg.exe: numbers may be decimal or hexadecimal, multiple
+# strings are separated by \0, and binary data is hexadecimal digits.
+#-----------------------------------------------------------------------------
+def parse_reg_value(value_type, data):
+    """Returns the registry value for the data of a reg add command"""
+
+    if value_type in (registry_backend.REG_DWORD, registry_backend.REG_QWORD):
+        if data[:2].lower() == '0x':
+            return int(data[2:], 16)
+        return int(data, 10)
+    if value_type == registry_backend.REG_MULTI_SZ:
+        return data.split('\\0') if data else []
+    if value_type == registry_backend.REG_BINARY:
+        return bytes.fromhex(data)
+    return data
+
+
+#-----------------------------------------------------------------------------
+# split_key_path()
+#
+# Splits a key path such as 'HKLM\SOFTWARE\...' into the full name of its
+# hive and the key under it.
+#-----------------------------------------------------------------------------
+def split_key_path(path):
+    """Returns the hive and key of a registry key path"""
+
+    hive, _, key = path.partition('\\')
+    hive = registry_backend.HIVE_ABBREVIATIONS.get(hive.upper(), hive.upper())
+    key = key.strip('\\')
+    if hive not in registry_backend.HIVES or key == "":
+        raise ValueError(f"Invalid registry key {path}")
+    return hive, key
+
+
+#-----------------------------------------------------------------------------
+# parse_reg_command()
+#
+# Parses the arguments of a "reg add" command, such as the entries of REG in
+# manage_policy.py, into a PolicySetting.  The key path may be quoted or
+# not, and the type defaults to REG_SZ, the same as reg.exe.
+#-----------------------------------------------------------------------------
+def parse_reg_command(reg_cmd):
+    """Returns the policy setting of a reg add command"""
+
+    tokens = [match.group(1) if match.group(1) is not None else match.group(2)
+              for match in REG_TOKEN_RE.finditer(reg_cmd)]
+    if not tokens:
+        raise ValueError(f"Empty registry setting: {reg_cmd}")
+
+    try:
+        hive, key = split_key_path(tokens[0])
+    except ValueError as e:
+        raise ValueError(f"{e}: {reg_cmd}") from None
+
+    options = {}
+    position = 1
+    while position < len(tokens):
+        option = tokens[position].lower()
+        if option == '/f':
+            position += 1
+        elif option in ('/v', '/t', '/d') and position + 1 < len(tokens):
+            options[option] = tokens[position + 1]
+            position += 2
+        else:
+            raise ValueError(f"Unexpected {tokens[position]} in registry setting: {reg_cmd}")
+
+    if '/v' not in options:
+        raise ValueError(f"Registry setting has no value name: {reg_cmd}")
+    type_name = options.get('/t', 'REG_SZ').upper()
+    if type_name not in registry_backend.REG_TYPES:
+        raise ValueError(f"Unknown registry type {type_name}: {reg_cmd}")
+    value_type = registry_backend.REG_TYPES[type_name]
+
+    try:
+        value = parse_reg_value(value_type, options.get('/d', ''))
+    except ValueError:
+        raise ValueError(f"Invalid {type_name} data {options.get('/d', '')!r}: "
+                         f"{reg_cmd}") from None
+    return validate_setting(PolicySetting(hive, key, options['/v'], value_type, value))
+
+
+#-----------------------------------------------------------------------------
+# validate_setting()
+#
+# Checks that the setting names a key of a known hive and that its value can
+# be written with its type, and returns the setting.  Raises ValueError
+# otherwise.
+#-----------------------------------------------------------------------------
+def validate_setting(setting):
+    """Returns the setting if it is valid"""
+
+    value_type = setting.type
+    value = setting.value
+    if value_type in (registry_backend.REG_DWORD, registry_backend.REG_QWORD):
+        limit = DWORD_MAX if value_type == registry_backend.REG_DWORD else QWORD_MAX
+        valid = isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= limit
+    elif value_type == registry_backend.REG_MULTI_SZ:
+        valid = isinstance(value, list) and all(isinstance(string, str) for string in value)
+    elif value_type == registry_backend.REG_BINARY:
+        valid = isinstance(value, bytes)
+    else:
+        valid = value_type in REG_TYPE_NAMES and isinstance(value, str)
+
+    if (setting.hive not in registry_backend.HIVES or not isinstance(setting.key, str)
+            or setting.key.strip('\\') == ""):
+        raise ValueError(f"Invalid registry key {setting.hive}\\{setting.key}")
+    if not valid or not isinstance(setting.name, str):
+        raise ValueError(f"Invalid {REG_TYPE_NAMES.get(value_type, value_type)} value "
+                         f"{value!r} for {setting.hive}\\{setting.key} {setting.name}")
+    return setting
+
+
+#-----------------------------------------------------------------------------
+# group_by_key()
+#
+# Groups the settings by their key, in the order the keys first appear, so
+# that each key is opened once.  Key names are not case sensitive.
+#-----------------------------------------------------------------------------
+def group_by_key(settings):
+    """Returns the settings grouped by (hive, key)"""
+
+    groups = {}
+    for setting in settings:
+        group = groups.setdefault((setting.hive, setting.key.lower()), [])
+        group.append(setting)
+    return list(groups.values())
+
+
+#-----------------------------------------------------------------------------
+# PolicyPlan
+#
+# Settings ready to be applied or checked: deduplicated and grouped by key.
+# When a value is set more than once, the last setting wins, the same as
+# running the commands in order, and it keeps the position of the first.
+#-----------------------------------------------------------------------------
+class PolicyPlan:
+    """Registry policy settings grouped by key"""
+
+    def __init__(self, settings):
+        unique = {}
+        self.duplicates = 0
+        for setting in settings:
+            identity = (setting.hive, setting.key.lower(), setting.name.lower())
+            self.duplicates += identity in unique
+            unique[identity] = setting
+
+        self.settings = list(unique.values())
+        self.groups = group_by_key(self.settings)
+
+    def __len__(self):
+        return len(self.settings)
+
+    def __iter__(self):
+        return iter(self.settings)
+
+
+#-----------------------------------------------------------------------------
+# as_plan()
+#-----------------------------------------------------------------------------
+def as_plan(settings):
+    """Returns a PolicyPlan of the settings, which may already be a plan"""
+    return settings if isinstance(settings, PolicyPlan) else PolicyPlan(settings)
+
+
+#-----------------------------------------------------------------------------
+# setting_from_record()
+#
+# Builds a setting from a record of a JSON policy file, where the key
+# includes its hive and the type is a name such as 'REG_DWORD'.  Binary
+# values are hexadecimal strings.
+#-----------------------------------------------------------------------------
+def setting_from_record(record):
+    """Returns the policy setting of a JSON record"""
+
+    if not isinstance(record, dict):
+        raise ValueError(f"Policy setting is not an object: {record!r}")
+    try:
+        hive, key = split_key_path(record['key'])
+        type_name = record.get('type', 'REG_SZ').upper()
+        value_type = registry_backend.REG_TYPES[type_name]
+        value = record['value']
+        if value_type == registry_backend.REG_BINARY and isinstance(value, str):
+            value = bytes.fromhex(value)
+        return validate_setting(PolicySetting(hive, key, record['name'], value_type, value))
+    except KeyError as e:
+        raise ValueError(f"Policy setting has no {e.args[0]}: {record!r}") from None
+    except (AttributeError, TypeError):
+        raise ValueError(f"Invalid policy setting: {record!r}") from None
+
+
+#-----------------------------------------------------------------------------
+# read_policy_file()
+#
+# Reads the settings of a text or JSON policy file.  Errors are reported
+# with the pathname and, for text files, the line number.
+#-----------------------------------------------------------------------------
+def read_policy_file(pathname):
+    """Returns the settings of a policy file"""
+
+    with open(pathname, encoding='utf-8-sig') as policy_file:
+        if pathname.lower().endswith('.json'):
+            try:
+                records = json.load(policy_file)
+                if not isinstance(records, list):
+                    raise ValueError("A JSON policy file must hold a list of settings")
+                return [setting_from_record(record) for record in records]
+            except ValueError as e:
+                raise ValueError(f"{pathname}: {e}") from None
+
+        settings = []
+        for line_number, line in enumerate(policy_file, 1):
+            reg_cmd = line.strip()
+            if reg_cmd == "" or reg_cmd.startswith('#'):
+                continue
+            if reg_cmd[:8].lower() == 'reg add ':
+                reg_cmd = reg_cmd[8:]
+            try:
+                settings.append(parse_reg_command(reg_cmd))
+            except ValueError as e:
+                raise ValueError(f"{pathname}:{line_number}: {e}") from None
+        return settings
+
+
+#-----------------------------------------------------------------------------
+# encode_plan() and decode_plan()
+#
+# The form of a plan in the plan cache file: a list of [hive, key, name,
+# type, value] with binary values as hexadecimal strings.  The settings of
+# the cache file are validated again, the same as the policy files, since
+# the file could have been changed.
+#-----------------------------------------------------------------------------
+def encode_plan(plan):
+    """Returns the JSON form of a plan"""
+    return [[setting.hive, setting.key, setting.name, setting.type,
+             setting.value.hex() if setting.type == registry_backend.REG_BINARY else setting.value]
+            for setting in plan]
+
+
+def decode_plan(records):
+    """Returns the plan of its JSON form"""
+    return PolicyPlan(validate_setting(PolicySetting(hive, key, name, value_type,
+                                                     bytes.fromhex(value)
+                                                     if value_type == registry_backend.REG_BINARY
+                                                     else value))
+                      for hive, key, name, value_type, value in records)
+
+
+#-----------------------------------------------------------------------------
+# load_policy_plan()
+#
+# Loads the plan of one or more policy files, where the settings of later
+# files override the earlier ones.  The plan is reused from memory or from
+# the plan cache file when none of the files changed since it was built,
+# and otherwise the files are parsed and the cache file is rewritten.  A
+# cache file that cannot be read or written is ignored.
+#-----------------------------------------------------------------------------
+def load_policy_plan(pathnames, cache_pathname=None):
+    """Returns the plan of the policy files"""
+
+    sources = []
+    for pathname in pathnames:
+        status = os.stat(pathname)
+        sources.append([os.path.abspath(pathname), status.st_mtime_ns, status.st_size])
+    identity = tuple(map(tuple, sources))
+
+    plan = PLAN_CACHE.get(identity)
+    if plan is not None:
+        return plan
+
+    if cache_pathname is not None:
+        try:
+            with open(cache_pathname, encoding='utf-8') as cache_file:
+                state = json.load(cache_file)
+            if state['sources'] == sources:
+                plan = PLAN_CACHE[identity] = decode_plan(state['settings'])
+                return plan
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    settings = []
+    for pathname in pathnames:
+        settings.extend(read_policy_file(pathname))
+    plan = PLAN_CACHE[identity] = PolicyPlan(settings)
+
+    if cache_pathname is not None:
+        try:
+            temp_pathname = cache_pathname + '.tmp'
+            with open(temp_pathname, 'w', encoding='utf-8') as cache_file:
+                json.dump({'sources': sources, 'settings': encode_plan(plan)}, cache_file,
+                          separators=(',', ':'))
+            os.replace(temp_pathname, cache_pathname)
+        except OSError:
+            pass
+
+    return plan
@@ -0,0 +1,331 @@
+#-----------------------------------------------------------------------------
+# registry_backend.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Registry access for the Windows management scripts.  The scripts go
+# through a backend object instead of calling winreg directly, so the same
+# code runs against the real registry (WinregBackend) or against an
+# in-memory registry (MemoryRegistry) that works on any platform and counts
+# the winreg calls it stands in for.
+#
+# Keys are opened relative to a hive from root() or to another open key,
+# and opened keys are context managers.  Missing keys raise OSError, the
+# same as winreg.
+#-----------------------------------------------------------------------------
+"""registry_backend.py""" # for pylint
+
+import collections
+import ctypes
+import threading
+import time
+
+try:
+    import winreg
+except ImportError:
+    winreg = None
+
+if hasattr(ctypes, 'windll'):
+    from ctypes import wintypes
+    ADVAPI32 = ctypes.windll.advapi32
+    ADVAPI32.RegEnumKeyExW.restype = wintypes.LONG
+    ADVAPI32.RegEnumKeyExW.argtypes = (wintypes.HKEY, wintypes.DWORD, wintypes.LPWSTR,
+                                       ctypes.POINTER(wintypes.DWORD), ctypes.c_void_p,
+                                       ctypes.c_void_p, ctypes.c_void_p,
+                                       ctypes.POINTER(wintypes.FILETIME))
+else:
+    ADVAPI32 = None
+
+ERROR_SUCCESS = 0
+ERROR_NO_MORE_ITEMS = 259
+
+# Longest registry key name, plus the terminating null
+MAX_KEY_NAME = 256
+
+# Registry value types, the same values as the winreg constants
+REG_SZ = 1
+REG_EXPAND_SZ = 2
+REG_BINARY = 3
+REG_DWORD = 4
+REG_MULTI_SZ = 7
+REG_QWORD = 11
+
+# Registry value types by name, as used by reg.exe and in .reg files
+REG_TYPES = {'REG_SZ': REG_SZ, 'REG_EXPAND_SZ': REG_EXPAND_SZ, 'REG_BINARY': REG_BINARY,
+             'REG_DWORD': REG_DWORD, 'REG_MULTI_SZ': REG_MULTI_SZ, 'REG_QWORD': REG_QWORD}
+
+# Hives available from root()
+HIVES = ('HKEY_CLASSES_ROOT', 'HKEY_CURRENT_USER', 'HKEY_LOCAL_MACHINE', 'HKEY_USERS',
+         'HKEY_CURRENT_CONFIG')
+
+# Short names of the hives, as used by reg.exe
+HIVE_ABBREVIATIONS = {'HKCR': 'HKEY_CLASSES_ROOT', 'HKCU': 'HKEY_CURRENT_USER',
+                      'HKLM': 'HKEY_LOCAL_MACHINE', 'HKU': 'HKEY_USERS',
+                      'HKCC': 'HKEY_CURRENT_CONFIG'}
+
+
+#-----------------------------------------------------------------------------
+# RegistryBackend
+#
+# Interface of the registry backends.  read_values() returns every value of
+# a key in one pass, as a dictionary of the lower-case value name to a
+# (data, type) tuple, since value names are not case sensitive.
+# key_info() returns the (subkey count, value count, last write time) tuple
+# of winreg.QueryInfoKey(), where the time is in 100 ns units since 1601.
+# subkey_info() returns the (name, last write time) of each subkey, which
+# the registry enumerates together.  create_key() opens a key for reading
+# and writing, creating it and any missing parents, and set_value() writes
+# a value with one of the REG_* types.
+#-----------------------------------------------------------------------------
+class RegistryBackend:
+    """Base class for the registry backends"""
+
+    def root(self, hive):
+        """Returns the handle of a hive, such as 'HKEY_LOCAL_MACHINE'"""
+        raise NotImplementedError
+
+    def open_key(self, parent, sub_key):
+        """Opens a subkey for reading"""
+        raise NotImplementedError
+
+    def subkey_names(self, key):
+        """Returns the names of the subkeys of a key"""
+        raise NotImplementedError
+
+    def subkey_info(self, key):
+        """Returns the names and last write times of the subkeys of a key"""
+        raise NotImplementedError
+
+    def read_values(self, key):
+        """Returns all of the values of a key"""
+        raise NotImplementedError
+
+    def query_value(self, key, name):
+        """Returns the (data, type) of a single value"""
+        raise NotImplementedError
+
+    def key_info(self, key):
+        """Returns the subkey count, value count and last write time of a key"""
+        raise NotImplementedError
+
+    def create_key(self, parent, sub_key):
+        """Opens a subkey for writing, creating it if needed"""
+        raise NotImplementedError
+
+    def set_value(self, key, name, value_type, data):
+        """Writes a value"""
+        raise NotImplementedError
+
+
+#-----------------------------------------------------------------------------
+# WinregBackend
+#-----------------------------------------------------------------------------
+class WinregBackend(RegistryBackend):
+    """Registry backend using winreg"""
+
+    def root(self, hive):
+        if hive not in HIVES:
+            raise ValueError(f"Unknown registry hive: {hive}")
+        return getattr(winreg, hive)
+
+    def open_key(self, parent, sub_key):
+        return winreg.OpenKey(parent, sub_key)
+
+    def subkey_names(self, key):
+        names = []
+        for i in range(winreg.QueryInfoKey(key)[0]):
+            try:
+                names.append(winreg.EnumKey(key, i))
+            except OSError:
+                # The key changed while it was being enumerated
+                break
+        return names
+
+    # winreg.EnumKey() does not return the last write time, so the subkeys
+    # are enumerated with RegEnumKeyExW()
+    def subkey_info(self, key):
+        subkeys = []
+        name = ctypes.create_unicode_buffer(MAX_KEY_NAME)
+        last_write = wintypes.FILETIME()
+        for i in range(winreg.QueryInfoKey(key)[0]):
+            size = wintypes.DWORD(MAX_KEY_NAME)
+            result = ADVAPI32.RegEnumKeyExW(int(key), i, name, ctypes.byref(size), None, None,
+                                            None, ctypes.byref(last_write))
+            if result == ERROR_NO_MORE_ITEMS:
+                # The key changed while it was being enumerated
+                break
+            if result != ERROR_SUCCESS:
+                raise ctypes.WinError(result)
+            subkeys.append((name.value,
+                            last_write.dwHighDateTime << 32 | last_write.dwLowDateTime))
+        return subkeys
+
+    def read_values(self, key):
+        values = {}
+        for i in range(winreg.QueryInfoKey(key)[1]):
+            try:
+                name, data, value_type = winreg.EnumValue(key, i)
+            except OSError:
+                break
+            values[name.lower()] = (data, value_type)
+        return values
+
+    def query_value(self, key, name):
+        return winreg.QueryValueEx(key, name)
+
+    def key_info(self, key):
+        return winreg.QueryInfoKey(key)
+
+    def create_key(self, parent, sub_key):
+        return winreg.CreateKeyEx(parent, sub_key, 0, winreg.KEY_READ | winreg.KEY_SET_VALUE)
+
+    def set_value(self, key, name, value_type, data):
+        winreg.SetValueEx(key, name, 0, value_type, data)
+
+
+#-----------------------------------------------------------------------------
+# MemoryKey
+#
+# A key of the in-memory registry.  Subkeys and values are kept by their
+# lower-case names along with the names as they were created.
+#-----------------------------------------------------------------------------
+class MemoryKey:
+    """Key of the in-memory registry"""
+
+    def __init__(self, name, last_write=0):
+        self.name = name
+        self.subkeys = {}
+        self.values = {}
+        self.last_write = last_write
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+#-----------------------------------------------------------------------------
+# MemoryRegistry
+#
+# In-memory registry for tests and benchmarks on any platform.  Each method
+# counts the winreg calls it replaces in self.calls, and can sleep for
+# latency seconds per call to stand in for a slow or remote registry.
+# Sleeping releases the GIL, the same as the real winreg calls.
+#-----------------------------------------------------------------------------
+class MemoryRegistry(RegistryBackend):
+    """Registry backend holding the registry in memory"""
+
+    def __init__(self, latency=0.0):
+        self.hives = {hive: MemoryKey(hive) for hive in HIVES}
+        self.latency = latency
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+
+    def count(self, call, times=1):
+        """Records calls to a winreg function"""
+        with self.lock:
+            self.calls[call] += times
+        if self.latency:
+            for _ in range(times):
+                time.sleep(self.latency)
+
+    #-------------------------------------------------------------------------
+    # add_key()
+    #
+    # Creates a key from its full path, such as 'HKEY_USERS\S-1-5-18\...',
+    # and sets its values.  Values are a dictionary of name to data, or to a
+    # (data, type) tuple.  Without a type, strings are stored as REG_SZ,
+    # integers as REG_DWORD and lists as REG_MULTI_SZ.
+    #-------------------------------------------------------------------------
+    def add_key(self, path, values=None, last_write=0):
+        """Creates a key and sets its values"""
+
+        hive, _, sub_key = path.partition('\\')
+        key = self.hives[hive]
+        for name in filter(None, sub_key.split('\\')):
+            key = key.subkeys.setdefault(name.lower(), MemoryKey(name, last_write))
+
+        for name, data in (values or {}).items():
+            if isinstance(data, tuple):
+                data, value_type = data
+            elif isinstance(data, int):
+                value_type = REG_DWORD
+            elif isinstance(data, list):
+                value_type = REG_MULTI_SZ
+            else:
+                value_type = REG_SZ
+            key.values[name.lower()] = (name, data, value_type)
+        key.last_write = last_write
+        return key
+
+    #-------------------------------------------------------------------------
+    # RegistryBackend interface
+    #-------------------------------------------------------------------------
+    def root(self, hive):
+        if hive not in self.hives:
+            raise ValueError(f"Unknown registry hive: {hive}")
+        return self.hives[hive]
+
+    def open_key(self, parent, sub_key):
+        self.count('OpenKey')
+        key = parent
+        for name in filter(None, sub_key.split('\\')):
+            key = key.subkeys.get(name.lower())
+            if key is None:
+                raise FileNotFoundError(2, "The system cannot find the file specified")
+        return key
+
+    def subkey_names(self, key):
+        names = [subkey.name for subkey in list(key.subkeys.values())]
+        self.count('QueryInfoKey')
+        self.count('EnumKey', len(names))
+        return names
+
+    def subkey_info(self, key):
+        subkeys = [(subkey.name, subkey.last_write) for subkey in list(key.subkeys.values())]
+        self.count('QueryInfoKey')
+        self.count('EnumKey', len(subkeys))
+        return subkeys
+
+    def read_values(self, key):
+        values = {name.lower(): (data, value_type)
+                  for name, data, value_type in list(key.values.values())}
+        self.count('QueryInfoKey')
+        self.count('EnumValue', len(values))
+        return values
+
+    def query_value(self, key, name):
+        self.count('QueryValueEx')
+        try:
+            _, data, value_type = key.values[name.lower()]
+        except KeyError:
+            raise FileNotFoundError(2, "The system cannot find the file specified") from None
+        return data, value_type
+
+    def key_info(self, key):
+        self.count('QueryInfoKey')
+        return len(key.subkeys), len(key.values), key.last_write
+
+    def create_key(self, parent, sub_key):
+        self.count('CreateKeyEx')
+        key = parent
+        for name in filter(None, sub_key.split('\\')):
+            key = key.subkeys.setdefault(name.lower(), MemoryKey(name))
+        return key
+
+    def set_value(self, key, name, value_type, data):
+        self.count('SetValueEx')
+        key.values[name.lower()] = (name, data, value_type)
+
+
+#-----------------------------------------------------------------------------
+# default_backend()
+#-----------------------------------------------------------------------------
+def default_backend():
+    """Returns the winreg backend, or None when winreg is not available"""
+    if winreg is None:
+        return None
+    return WinregBackend()
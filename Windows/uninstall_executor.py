@@ -0,0 +1,248 @@
+#-----------------------------------------------------------------------------
+# uninstall_executor.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Runs uninstall commands without prompting, several at a time on a bounded
+# asyncio subprocess pool.  Each command has a timeout, after which it and
+# the processes it started are killed, so one hung uninstaller cannot stop
+# the run.  Windows Installer only runs one installation at a time, so the
+# MsiExec commands take turns while the other uninstallers run alongside.
+#
+# Commands are started through a runner object, so the executor can run
+# with a FakeRunner that works on any platform instead of starting real
+# processes.
+#-----------------------------------------------------------------------------
+"""uninstall_executor.py""" # for pylint
+
+import asyncio
+import collections
+import os
+import re
+import signal
+import subprocess
+import time
+
+# Default number of uninstallers run at the same time
+CONCURRENCY = 4
+
+# Default seconds an uninstaller may run before it is killed
+TIMEOUT = 600
+
+# Exit codes of a successful uninstall: success, and success with a reboot
+# required (ERROR_SUCCESS_REBOOT_REQUIRED) or started (ERROR_SUCCESS_REBOOT_INITIATED)
+SUCCESS_CODES = (0, 3010, 1641)
+
+# Result status of an uninstall
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+TIMED_OUT = 'timed out'
+NOT_STARTED = 'not started'
+STATUSES = (SUCCEEDED, FAILED, TIMED_OUT, NOT_STARTED)
+
+# Commands run by Windows Installer, which serializes them
+MSIEXEC_RE = re.compile(r'"?(?:[^"]*\\)?msiexec(?:\.exe)?"?(?:\s|$)', flags=re.IGNORECASE)
+
+UninstallResult = collections.namedtuple('UninstallResult', 'name command status returncode seconds')
+
+
+#-----------------------------------------------------------------------------
+# CommandRunner
+#
+# Interface of the command runners.  run() runs a command to completion and
+# returns its exit code, or raises asyncio.TimeoutError after timeout
+# seconds, once the command has been stopped.  OSError means the command
+# could not be started.
+#-----------------------------------------------------------------------------
+class CommandRunner:
+    """Base class for the command runners"""
+
+    async def run(self, command, timeout):
+        """Runs a command and returns its exit code"""
+        raise NotImplementedError
+
+
+#-----------------------------------------------------------------------------
+# SubprocessRunner
+#
+# Runs the commands through the shell, the same as run_command() in
+# manage_applications.py, with their output discarded.
+#-----------------------------------------------------------------------------
+class SubprocessRunner(CommandRunner):
+    """Command runner starting shell subprocesses"""
+
+    async def run(self, command, timeout):
+        process = await asyncio.create_subprocess_shell(
+            command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL, start_new_session=os.name != 'nt')
+
+        try:
+            return await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            await kill_process_tree(process)
+            raise
+
+
+#-----------------------------------------------------------------------------
+# kill_process_tree()
+#
+# Killing the shell would leave the uninstaller it started running, so the
+# whole tree is killed: with taskkill on Windows, and through the process
+# group of the new session elsewhere.
+#-----------------------------------------------------------------------------
+async def kill_process_tree(process):
+    """Kills a subprocess and the processes it started"""
+
+    try:
+        if os.name == 'nt':
+            killer = await asyncio.create_subprocess_exec(
+                'taskkill', '/F', '/T', '/PID', str(process.pid),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            await killer.wait()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+    await process.wait()
+
+
+#-----------------------------------------------------------------------------
+# FakeRunner
+#
+# Command runner for tests and benchmarks on any platform.  Outcomes map a
+# command to the (seconds, exit code) it takes, where an exit code of None
+# never finishes and an OSError instance is raised instead of starting.
+# Commands without an outcome take default seconds and succeed.  The
+# commands are recorded in the order they start, along with the highest
+# number that ran at the same time.
+#-----------------------------------------------------------------------------
+class FakeRunner(CommandRunner):
+    """Command runner that pretends to run the commands"""
+
+    def __init__(self, outcomes=None, default=0.0):
+        self.outcomes = outcomes or {}
+        self.default = default
+        self.commands = []
+        self.running = 0
+        self.max_running = 0
+        self.msiexec_running = 0
+        self.max_msiexec_running = 0
+
+    async def run(self, command, timeout):
+        seconds, returncode = self.outcomes.get(command, (self.default, 0))
+        if isinstance(returncode, OSError):
+            raise returncode
+
+        self.commands.append(command)
+        msiexec = is_msiexec_command(command)
+        self.running += 1
+        self.msiexec_running += msiexec
+        self.max_running = max(self.max_running, self.running)
+        self.max_msiexec_running = max(self.max_msiexec_running, self.msiexec_running)
+        try:
+            return await asyncio.wait_for(self.finish(seconds, returncode), timeout)
+        finally:
+            self.running -= 1
+            self.msiexec_running -= msiexec
+
+    @staticmethod
+    async def finish(seconds, returncode):
+        """Waits for the command to finish"""
+        if returncode is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(seconds)
+        return returncode
+
+
+#-----------------------------------------------------------------------------
+# is_msiexec_command()
+#-----------------------------------------------------------------------------
+def is_msiexec_command(command):
+    """Returns True if the command runs Windows Installer"""
+    return MSIEXEC_RE.match(command.lstrip()) is not None
+
+
+#-----------------------------------------------------------------------------
+# run_uninstalls_async()
+#
+# Runs the (name, command) jobs with at most concurrency commands at a time
+# and returns their results in the order of the jobs.
+#-----------------------------------------------------------------------------
+async def run_uninstalls_async(jobs, runner, concurrency=CONCURRENCY, timeout=TIMEOUT,
+                               report=None):
+    """Runs uninstall commands concurrently"""
+
+    slots = asyncio.Semaphore(concurrency)
+    msiexec_lock = asyncio.Lock()
+
+    # MsiExec commands wait for their turn before taking a slot, so they
+    # do not hold slots the other uninstallers could use
+    async def run_job(name, command):
+        if is_msiexec_command(command):
+            async with msiexec_lock, slots:
+                result = await run_one(name, command)
+        else:
+            async with slots:
+                result = await run_one(name, command)
+        if report is not None:
+            report(result)
+        return result
+
+    async def run_one(name, command):
+        start = time.monotonic()
+        returncode = None
+        try:
+            returncode = await runner.run(command, timeout)
+            status = SUCCEEDED if returncode in SUCCESS_CODES else FAILED
+        except asyncio.TimeoutError:
+            status = TIMED_OUT
+        except OSError:
+            status = NOT_STARTED
+        return UninstallResult(name, command, status, returncode, time.monotonic() - start)
+
+    return await asyncio.gather(*(run_job(name, command) for name, command in jobs))
+
+
+#-----------------------------------------------------------------------------
+# run_uninstalls()
+#
+# Runs the jobs from synchronous code.  Jobs with the same command, such as
+# an application installed for several users, run once.
+#-----------------------------------------------------------------------------
+def run_uninstalls(jobs, runner=None, concurrency=CONCURRENCY, timeout=TIMEOUT, report=None):
+    """Runs uninstall commands concurrently and returns their results"""
+
+    if concurrency < 1:
+        raise ValueError("Concurrency must be at least 1")
+
+    unique_jobs = {}
+    for name, command in jobs:
+        unique_jobs.setdefault(command.strip().lower(), (name, command))
+
+    return asyncio.run(run_uninstalls_async(list(unique_jobs.values()), runner or SubprocessRunner(),
+                                            concurrency, timeout, report))
+
+
+#-----------------------------------------------------------------------------
+# format_summary()
+#-----------------------------------------------------------------------------
+def format_summary(results, seconds=None):
+    """Returns the summary lines of the uninstall results"""
+
+    counts = collections.Counter(result.status for result in results)
+    summary = ", ".join(f"{counts[status]} {status}" for status in STATUSES)
+    lines = [f"Uninstalled {counts[SUCCEEDED]} of {len(results)} applications: {summary}"
+             + (f" in {seconds:.1f} seconds" if seconds is not None else "")]
+    for result in results:
+        if result.status != SUCCEEDED:
+            code = "" if result.returncode is None else f" (exit code {result.returncode})"
+            lines.append(f"  {result.status}{code}: {result.name}")
+    return lines
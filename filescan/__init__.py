@@ -0,0 +1,22 @@
+#-----------------------------------------------------------------------------
+# filescan/__init__.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Shared scanning code for the Linux and Windows file listers.
+#-----------------------------------------------------------------------------
+"""filescan""" # for pylint
+
+from filescan.checkpoint import ScanCheckpoint, checkpointed_scan
+from filescan.columns import ColumnarCollector, StatRecord
+from filescan.enrich import PosixEnricher, WindowsEnricher
+from filescan.hashing import FileHasher, HashCache, hash_file
+from filescan.index import ADDED, MODIFIED, REMOVED, IndexEntry, ScanIndex
+from filescan.scanner import collect_files, iter_records, write_records
+from filescan.sinks import (BinarySink, CsvSink, NdjsonSink, TextSink,
+                            SINK_FORMATS, open_sink, read_binary_records)
+from filescan.stattable import StatTable
+from filescan.throttle import Throttle, lower_priority
+from filescan.walker import ScanLimits, walk_files
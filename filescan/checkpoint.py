@@ -0,0 +1,160 @@
+#-----------------------------------------------------------------------------
+# checkpoint.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Resumable scans.  A checkpointed scan periodically saves the traversal
+# frontier (the stack of directories not read yet) together with the offset
+# of the output file, so a scan that is killed or crashes can continue from
+# its last checkpoint instead of starting over.
+#
+# A checkpoint is only taken between two directories, after the output has
+# been flushed and synced, so the saved offset always covers exactly the
+# files of the directories that are no longer on the frontier.  On resume,
+# anything written after the offset is truncated and those directories are
+# read again, so no record is duplicated or lost.
+#
+# The checkpoint itself is a small JSON file that is replaced atomically.
+# It is removed when the scan completes.
+#-----------------------------------------------------------------------------
+"""checkpoint.py""" # for pylint
+
+import json
+import os
+import time
+
+from filescan import filters, sinks, walker
+
+CHECKPOINT_VERSION = 1
+
+# Default number of seconds between checkpoints
+DEFAULT_INTERVAL = 60.0
+
+
+#-----------------------------------------------------------------------------
+# ScanCheckpoint
+#
+# Loads, saves and removes the checkpoint file.  The state saved with it is
+# a dictionary of the root, the scan options, the pending directories, the
+# output offset and the number of files written.  Options must be JSON
+# values; a checkpoint is only resumed by a scan with the same root and
+# options.
+#-----------------------------------------------------------------------------
+class ScanCheckpoint:
+    """Checkpoint file of a resumable scan"""
+
+    def __init__(self, pathname, interval=DEFAULT_INTERVAL):
+        self.pathname = pathname
+        self.interval = interval
+        self.last_save = time.monotonic()
+
+    def load(self):
+        """Returns the saved state, or None when there is no checkpoint"""
+
+        try:
+            with open(self.pathname, encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            raise ValueError(f"Invalid scan checkpoint: {self.pathname}") from None
+
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported scan checkpoint version: {self.pathname}")
+        return state
+
+    def due(self):
+        """Returns True when the checkpoint interval has elapsed"""
+        return time.monotonic() - self.last_save >= self.interval
+
+    def save(self, state):
+        """Atomically replaces the checkpoint with the state"""
+
+        temp_pathname = self.pathname + '.tmp'
+        with open(temp_pathname, 'w', encoding='utf-8') as file:
+            json.dump(dict(state, version=CHECKPOINT_VERSION), file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_pathname, self.pathname)
+        self.last_save = time.monotonic()
+
+    def remove(self):
+        """Removes the checkpoint once the scan is complete"""
+        try:
+            os.remove(self.pathname)
+        except FileNotFoundError:
+            pass
+
+
+#-----------------------------------------------------------------------------
+# checkpointed_scan()
+#
+# Scans the tree into an output file, resuming from the checkpoint when one
+# exists.  Records are built by the enricher, and digests are appended when
+# a hasher is provided.  The scan always uses the serial walker, since its
+# pending directory stack is the whole traversal state; options that keep
+# state across directories (several workers, descriptor-relative walking
+# and dedup) are not supported.
+#
+# options holds the scan settings that are not otherwise visible here, such
+# as the filter expression, so a checkpoint is not resumed by a scan with
+# different settings.  Returns the number of files written by the scan,
+# including those written before it was resumed.
+#-----------------------------------------------------------------------------
+def checkpointed_scan(dirname, enricher, checkpoint, output_format, fields, output_pathname,
+                      hasher=None, file_filter=None, exclude=None, one_filesystem=False,
+                      exclude_fstypes=(), options=None, throttle=None):
+    """Scans the tree into a file, checkpointing so the scan can be resumed"""
+
+    root = os.path.abspath(dirname)
+    options = dict(options or {}, format=output_format, fields=list(fields),
+                   output=os.path.abspath(output_pathname), hashed=hasher is not None)
+
+    state = checkpoint.load()
+    if state is None:
+        pending_dirs = [dirname]
+        offset = None
+        file_count = 0
+    else:
+        if state['root'] != root or state['options'] != options:
+            raise ValueError(f"Scan checkpoint is for a different scan: {checkpoint.pathname}")
+        pending_dirs = state['pending_dirs']
+        offset = state['offset']
+        file_count = state['files']
+
+    file_filter = filters.all_of(enricher.file_filter, file_filter)
+    limits = walker.make_limits(dirname, one_filesystem, exclude_fstypes)
+
+    # Directory boundary for the next checkpoint: the number of files listed
+    # up to it and a copy of the directories still pending there
+    boundary = []
+
+    def frontier_files():
+        listed = file_count
+        for files in walker.scan_frontier(pending_dirs, file_filter, exclude, limits, throttle):
+            yield from files
+            listed += len(files)
+            if pending_dirs and not boundary and checkpoint.due():
+                boundary.append((listed, list(pending_dirs)))
+
+    # Digests are computed by one hasher pool for the whole scan, so they lag
+    # behind the walk, and the checkpoint is saved once the records written
+    # reach the boundary
+    if hasher is not None:
+        results = hasher.hash_files(frontier_files())
+    else:
+        results = ((pathname, file_stat, None) for pathname, file_stat in frontier_files())
+
+    with sinks.open_sink(output_format, fields, output_pathname, resume_offset=offset) as sink:
+        for pathname, file_stat, digest in results:
+            if boundary and boundary[0][0] == file_count:
+                _, boundary_dirs = boundary.pop()
+                checkpoint.save({'root': root, 'options': options, 'pending_dirs': boundary_dirs,
+                                 'offset': sink.sync(), 'files': file_count})
+            sink.write(enricher.record(pathname, file_stat, digest))
+            file_count += 1
+
+    checkpoint.remove()
+    return file_count
@@ -0,0 +1,97 @@
+#-----------------------------------------------------------------------------
+# columns.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Columnar, array-backed collector for scan results.  Each stat attribute is
+# kept in its own typed array, directory paths are stored once in a shared
+# table, and file names are packed into a single byte buffer, so a scan of
+# millions of files is held without a Python object per entry.
+#-----------------------------------------------------------------------------
+"""columns.py""" # for pylint
+
+import array
+import collections
+import os
+
+# Record returned when reading an entry back from the collector
+StatRecord = collections.namedtuple('StatRecord', 'path mode uid gid size mtime_ns')
+
+# Typed array code of each numeric column
+COLUMN_TYPES = {
+    'mode': 'I',
+    'uid': 'I',
+    'gid': 'I',
+    'size': 'q',
+    'mtime_ns': 'q',
+    'dir_index': 'I',
+}
+
+
+#-----------------------------------------------------------------------------
+# ColumnarCollector
+#-----------------------------------------------------------------------------
+class ColumnarCollector:
+    """Collects (pathname, stat) tuples into typed column arrays"""
+
+    def __init__(self):
+        self.columns = {name: array.array(code) for name, code in COLUMN_TYPES.items()}
+        self.dirs = []
+        self.dir_indexes = {}
+        self.names = bytearray()
+        self.name_offsets = array.array('Q', [0])
+
+    def __len__(self):
+        return len(self.name_offsets) - 1
+
+    def add(self, pathname, file_stat):
+        """Adds a single file"""
+
+        dirpath, name = os.path.split(pathname)
+        dir_index = self.dir_indexes.get(dirpath)
+        if dir_index is None:
+            dir_index = self.dir_indexes[dirpath] = len(self.dirs)
+            self.dirs.append(dirpath)
+
+        columns = self.columns
+        columns['mode'].append(file_stat.st_mode)
+        columns['uid'].append(file_stat.st_uid)
+        columns['gid'].append(file_stat.st_gid)
+        columns['size'].append(file_stat.st_size)
+        columns['mtime_ns'].append(file_stat.st_mtime_ns)
+        columns['dir_index'].append(dir_index)
+
+        self.names += os.fsencode(name)
+        self.name_offsets.append(len(self.names))
+
+    def extend(self, files):
+        """Adds every (pathname, stat) tuple from an iterable"""
+        for pathname, file_stat in files:
+            self.add(pathname, file_stat)
+
+    def column(self, name):
+        """Returns the typed array holding a column"""
+        return self.columns[name]
+
+    def path(self, position):
+        """Returns the pathname of an entry"""
+        start, end = self.name_offsets[position], self.name_offsets[position + 1]
+        name = os.fsdecode(bytes(self.names[start:end]))
+        return os.path.join(self.dirs[self.columns['dir_index'][position]], name)
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("collector index out of range")
+
+        columns = self.columns
+        return StatRecord(self.path(position), columns['mode'][position],
+                          columns['uid'][position], columns['gid'][position],
+                          columns['size'][position], columns['mtime_ns'][position])
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
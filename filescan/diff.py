@@ -0,0 +1,350 @@
+#-----------------------------------------------------------------------------
+# diff.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Streaming comparison of two scan outputs that may be far larger than
+# memory.  Each output is read in any of the sink formats, sorted by path
+# with an external merge sort, and the two sorted streams are merged to
+# report the added, removed and modified entries in path order.
+#
+# The external sort reads up to chunk_size records at a time, sorts them in
+# memory and spills them to an anonymous temporary run file.  The runs are
+# then merged with heapq.merge(), so memory holds one chunk while sorting
+# and one record per run while merging.
+#-----------------------------------------------------------------------------
+"""diff.py""" # for pylint
+
+import csv
+import heapq
+import io
+import itertools
+import json
+import re
+import struct
+import tempfile
+
+from filescan import enrich, index, sinks
+
+# Default number of records sorted in memory at a time
+CHUNK_SIZE = 500000
+
+# Buffer size of the temporary run files
+RUN_BUFFER_SIZE = 1024 * 1024
+
+# Separator of the values in a run file record, which never occurs in a path
+RUN_SEPARATOR = '\0'
+
+U32 = struct.Struct('<I')
+
+# A permissions field, as written by stat.filemode()
+FILEMODE_RE = re.compile(r'[-bcdlps?][-r][-w][-xsS][-r][-w][-xsS][-r][-w][-xtT]')
+
+# Field names of the text formats, which have no header.  Layouts with the
+# same number of fields are told apart by TEXT_FIELD_RES and tried in order.
+TEXT_LAYOUTS = (enrich.WindowsEnricher.base_fields,
+                enrich.WindowsEnricher.attribute_fields,
+                enrich.WindowsEnricher.base_fields + ('digest',),
+                enrich.PosixEnricher.fields,
+                enrich.WindowsEnricher.attribute_fields + ('digest',),
+                enrich.PosixEnricher.hashed_fields)
+
+# Values of the text fields that can tell layouts apart; other fields match
+# anything
+TEXT_FIELD_RES = {
+    'size': re.compile(r'\d+'),
+    'attributes': re.compile('[' + ''.join(letter for letter, _ in enrich.WINDOWS_ATTRIBUTES)
+                             + ']*'),
+    'digest': re.compile(r'[0-9a-f]*'),
+}
+
+# Text records read to choose between layouts that all match the first one
+TEXT_SNIFF_RECORDS = 1000
+
+# A field name of a CSV header
+FIELD_NAME_RE = re.compile(r'\w+')
+
+# Fields added to the entries reported by compare_scans()
+DIFF_PREFIX_FIELDS = ('change',)
+DIFF_SUFFIX_FIELDS = ('changed_fields',)
+
+
+#-----------------------------------------------------------------------------
+# detect_format()
+#
+# Guesses the sink format from the first bytes of a stream.  Only the binary
+# format has a signature, so read_scan() reads a guessed NDJSON or CSV
+# output as text when its first line does not parse.
+#-----------------------------------------------------------------------------
+def detect_format(stream):
+    """Returns the sink format of a buffered binary stream"""
+
+    head = stream.peek(len(sinks.BINARY_MAGIC))
+    if head.startswith(sinks.BINARY_MAGIC):
+        return 'binary'
+    if head.startswith(b'{'):
+        return 'ndjson'
+    if head.startswith(b'path,'):
+        return 'csv'
+    return 'text'
+
+
+#-----------------------------------------------------------------------------
+# split_text_line()
+#
+# The text format separates values with single spaces but does not quote
+# paths, so the path is everything before the last permissions field.
+#-----------------------------------------------------------------------------
+def split_text_line(line):
+    """Splits a text record into its path and the values that follow it"""
+
+    tokens = line.split(' ')
+    for position in range(len(tokens) - 1, 0, -1):
+        if FILEMODE_RE.fullmatch(tokens[position]):
+            return (' '.join(tokens[:position]),) + tuple(tokens[position:])
+    raise ValueError(f"Cannot parse text scan record: {line}")
+
+
+#-----------------------------------------------------------------------------
+# text_layout_matches()
+#-----------------------------------------------------------------------------
+def text_layout_matches(fields, record):
+    """Returns True if a text record can have the fields"""
+    return len(fields) == len(record) and all(
+        field not in TEXT_FIELD_RES or TEXT_FIELD_RES[field].fullmatch(value)
+        for field, value in zip(fields, record))
+
+
+#-----------------------------------------------------------------------------
+# read_text_records()
+#
+# Splits the text lines into records and names their fields after the
+# layout they match.  When several layouts match the first record, such as
+# an empty digest or attributes field, the following records are read until
+# one layout is left.  Records of an unknown layout get numbered fields.
+#-----------------------------------------------------------------------------
+def read_text_records(lines):
+    """Returns the field names and records of text scan lines"""
+
+    records = []
+    candidates = None
+    for line in lines:
+        records.append(split_text_line(line))
+        matching = [fields for fields in (TEXT_LAYOUTS if candidates is None else candidates)
+                    if text_layout_matches(fields, records[-1])]
+        candidates = matching if matching or candidates is None else candidates
+        if len(candidates) <= 1 or len(records) >= TEXT_SNIFF_RECORDS:
+            break
+
+    if not records:
+        return None, iter(())
+    if candidates:
+        fields = candidates[0]
+    else:
+        fields = ('path',) + tuple(f"field{i}" for i in range(1, len(records[0])))
+
+    def text_records():
+        yield from records
+        for line in lines:
+            yield split_text_line(line)
+
+    return fields, text_records()
+
+
+#-----------------------------------------------------------------------------
+# read_scan()
+#
+# Opens a scan output and returns its field names and an iterator of its
+# records.  Every value is returned as a string, so outputs written in
+# different formats compare equal.  An empty output, which has no header
+# or first record to name the fields, returns None for the fields.
+#
+# The format is detected unless output_format is given.  A detected NDJSON
+# or CSV output whose first line does not parse is read as text instead,
+# since a text listing can start with a path such as '{x}' or 'path,x'.
+#-----------------------------------------------------------------------------
+def read_scan(pathname, output_format=None):
+    """Returns the field names and records of a scan output file"""
+
+    stream = open(pathname, 'rb', buffering=RUN_BUFFER_SIZE)
+    detected = output_format is None
+    if detected:
+        output_format = detect_format(stream)
+
+    if output_format == 'binary':
+        records = sinks.read_binary_records(stream)
+        fields = next(records)
+        return fields, close_after((tuple(map(str, record)) for record in records), stream)
+
+    text = io.TextIOWrapper(stream, encoding='utf-8', errors='surrogateescape', newline='')
+    first = text.readline()
+    if not first:
+        text.close()
+        return None, iter(())
+
+    if output_format == 'csv':
+        fields = tuple(next(csv.reader([first]), ()))
+        if fields and all(FIELD_NAME_RE.fullmatch(field) for field in fields):
+            return fields, close_after((tuple(record) for record in csv.reader(text)), text)
+        if not detected:
+            text.close()
+            raise ValueError(f"Invalid CSV scan header in {pathname}")
+
+    if output_format == 'ndjson':
+        try:
+            values = json.loads(first)
+        except ValueError:
+            values = None
+        if isinstance(values, dict):
+            fields = tuple(values)
+
+            def records():
+                yield tuple(str(values[field]) for field in fields)
+                for line in text:
+                    record = json.loads(line)
+                    yield tuple(str(record[field]) for field in fields)
+
+            return fields, close_after(records(), text)
+        if not detected:
+            text.close()
+            raise ValueError(f"Invalid NDJSON scan record in {pathname}")
+
+    # The text format has no header, so the fields are named after its records
+    lines = (line.rstrip('\n') for line in itertools.chain([first], text))
+    fields, records = read_text_records(lines)
+    return fields, close_after(records, text)
+
+
+#-----------------------------------------------------------------------------
+# close_after()
+#-----------------------------------------------------------------------------
+def close_after(records, stream):
+    """Yields the records and then closes the stream"""
+    with stream:
+        yield from records
+
+
+#-----------------------------------------------------------------------------
+# write_run()
+#
+# Writes a sorted chunk to an anonymous temporary file.  Each record is a
+# u32 length followed by its values joined by NUL, in UTF-8 with the
+# undecodable path bytes preserved.
+#-----------------------------------------------------------------------------
+def write_run(records, temp_dir=None):
+    """Spills sorted records to a temporary run file"""
+
+    run = tempfile.TemporaryFile(dir=temp_dir, buffering=RUN_BUFFER_SIZE)
+    for record in records:
+        data = RUN_SEPARATOR.join(record).encode('utf-8', 'surrogateescape')
+        run.write(U32.pack(len(data)) + data)
+    run.seek(0)
+    return run
+
+
+#-----------------------------------------------------------------------------
+# read_run()
+#-----------------------------------------------------------------------------
+def read_run(run):
+    """Yields the records of a run file and then closes it"""
+
+    with run:
+        while True:
+            prefix = run.read(U32.size)
+            if not prefix:
+                return
+            data = run.read(U32.unpack(prefix)[0])
+            yield tuple(data.decode('utf-8', 'surrogateescape').split(RUN_SEPARATOR))
+
+
+#-----------------------------------------------------------------------------
+# external_sort()
+#
+# Sorts records of string values in bounded memory.  Input that fits in a
+# single chunk is sorted in memory without any temporary files.
+#-----------------------------------------------------------------------------
+def external_sort(records, chunk_size=CHUNK_SIZE, temp_dir=None):
+    """Yields the records in sorted order"""
+
+    runs = []
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            chunk.sort()
+            runs.append(write_run(chunk, temp_dir))
+            chunk = []
+    chunk.sort()
+
+    if not runs:
+        yield from chunk
+        return
+
+    if chunk:
+        runs.append(write_run(chunk, temp_dir))
+    del chunk
+    yield from heapq.merge(*(read_run(run) for run in runs))
+
+
+#-----------------------------------------------------------------------------
+# merge_diff()
+#
+# Merges two record streams sorted by path and yields (change, old, new)
+# for every path that differs, where old or new is None for an added or a
+# removed entry.
+#-----------------------------------------------------------------------------
+def merge_diff(old_records, new_records):
+    """Yields the differences between two sorted record streams"""
+
+    old = next(old_records, None)
+    new = next(new_records, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield index.REMOVED, old, None
+            old = next(old_records, None)
+        elif old is None or new[0] < old[0]:
+            yield index.ADDED, None, new
+            new = next(new_records, None)
+        else:
+            if old != new:
+                yield index.MODIFIED, old, new
+            old = next(old_records, None)
+            new = next(new_records, None)
+
+
+#-----------------------------------------------------------------------------
+# compare_scans()
+#
+# Compares two scan outputs and returns the fields of the entries it reports
+# and an iterator of them.  Each entry is the change type, the values of
+# the entry (from the new output, or from the old one when it was removed),
+# and the comma-separated names of the fields that changed.  Both outputs
+# must have the same fields, but may be written in different formats, which
+# are detected unless old_format or new_format is given.  An empty output
+# takes the fields of the other one.
+#-----------------------------------------------------------------------------
+def compare_scans(old_pathname, new_pathname, chunk_size=CHUNK_SIZE, temp_dir=None,
+                  old_format=None, new_format=None):
+    """Returns the fields and a stream of differences between two scan outputs"""
+
+    old_fields, old_records = read_scan(old_pathname, old_format)
+    new_fields, new_records = read_scan(new_pathname, new_format)
+    old_fields = old_fields or new_fields or ('path',)
+    new_fields = new_fields or old_fields
+    if old_fields != new_fields:
+        raise ValueError(f"Scan outputs have different fields: {', '.join(old_fields)} "
+                         f"and {', '.join(new_fields)}")
+
+    def entries():
+        old_sorted = external_sort(old_records, chunk_size, temp_dir)
+        new_sorted = external_sort(new_records, chunk_size, temp_dir)
+        for change, old, new in merge_diff(old_sorted, new_sorted):
+            changed = ''
+            if change == index.MODIFIED:
+                changed = ','.join(field for field, old_value, new_value
+                                   in zip(old_fields, old, new) if old_value != new_value)
+            yield (change,) + (new or old) + (changed,)
+
+    return DIFF_PREFIX_FIELDS + old_fields + DIFF_SUFFIX_FIELDS, entries()
@@ -0,0 +1,210 @@
+#-----------------------------------------------------------------------------
+# enrich.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Platform metadata stages for the file listers.  The walkers only produce
+# (pathname, lstat) tuples; an enricher turns each one into the record a
+# lister reports, and may also supply a filter that decides which entries
+# the platform lists at all.
+#-----------------------------------------------------------------------------
+"""enrich.py""" # for pylint
+
+import collections
+import os
+import stat
+
+try:
+    import grp
+    import pwd
+except ImportError:
+    grp = None
+    pwd = None
+
+# Cache of the owner and group names already resolved, keyed by uid and gid
+USER_NAMES = {}
+GROUP_NAMES = {}
+
+# Windows file attribute flags and the letters used to report them
+WINDOWS_ATTRIBUTES = (
+    ('R', 0x0001),   # FILE_ATTRIBUTE_READONLY
+    ('H', 0x0002),   # FILE_ATTRIBUTE_HIDDEN
+    ('S', 0x0004),   # FILE_ATTRIBUTE_SYSTEM
+    ('A', 0x0020),   # FILE_ATTRIBUTE_ARCHIVE
+    ('T', 0x0100),   # FILE_ATTRIBUTE_TEMPORARY
+    ('L', 0x0400),   # FILE_ATTRIBUTE_REPARSE_POINT
+    ('C', 0x0800),   # FILE_ATTRIBUTE_COMPRESSED
+    ('O', 0x1000),   # FILE_ATTRIBUTE_OFFLINE
+    ('E', 0x4000),   # FILE_ATTRIBUTE_ENCRYPTED
+)
+
+
+#-----------------------------------------------------------------------------
+# get_user_name()
+#
+# Looks up the user name for a uid only once per run.  If the uid has no
+# passwd entry, the numeric uid is returned so the scan can continue.
+#-----------------------------------------------------------------------------
+def get_user_name(uid):
+    """Returns the cached user name for the provided uid"""
+    try:
+        return USER_NAMES[uid]
+    except KeyError:
+        pass
+
+    try:
+        name = pwd.getpwuid(uid).pw_name
+    except (KeyError, AttributeError):
+        name = str(uid)
+
+    USER_NAMES[uid] = name
+    return name
+
+
+#-----------------------------------------------------------------------------
+# get_group_name()
+#
+# Looks up the group name for a gid only once per run.  If the gid has no
+# group entry, the numeric gid is returned so the scan can continue.
+#-----------------------------------------------------------------------------
+def get_group_name(gid):
+    """Returns the cached group name for the provided gid"""
+    try:
+        return GROUP_NAMES[gid]
+    except KeyError:
+        pass
+
+    try:
+        name = grp.getgrgid(gid).gr_name
+    except (KeyError, AttributeError):
+        name = str(gid)
+
+    GROUP_NAMES[gid] = name
+    return name
+
+
+#-----------------------------------------------------------------------------
+# load_name_tables()
+#
+# Loads the whole passwd and group databases into the name caches in one
+# pass.  This is faster than individual lookups when NSS is backed by LDAP
+# or sssd.  IDs that are not enumerated (for example, when sssd has
+# enumeration disabled) are still resolved on demand.  The first entry wins
+# when an ID appears more than once, which matches getpwuid() and getgrgid().
+#-----------------------------------------------------------------------------
+def load_name_tables():
+    """Preloads the user and group name caches"""
+
+    if pwd is None or grp is None:
+        return
+
+    for entry in pwd.getpwall():
+        USER_NAMES.setdefault(entry.pw_uid, entry.pw_name)
+
+    for entry in grp.getgrall():
+        GROUP_NAMES.setdefault(entry.gr_gid, entry.gr_name)
+
+
+#-----------------------------------------------------------------------------
+# PosixEnricher
+#
+# Reports the permissions, owner, group and size of each file.  Owner and
+# group names come from the shared name caches.
+#-----------------------------------------------------------------------------
+class PosixEnricher:
+    """POSIX owner and group metadata stage"""
+
+    fields = ('path', 'permissions', 'owner', 'group', 'size')
+    hashed_fields = fields + ('digest',)
+    record_type = collections.namedtuple('FileRecord', fields)
+    hashed_record_type = collections.namedtuple('HashedFileRecord', hashed_fields)
+
+    # Every entry the walker reports is listed
+    file_filter = None
+
+    def __init__(self, preload_names=False):
+        if preload_names:
+            load_name_tables()
+
+    def record(self, pathname, file_stat, digest=None):
+        """Builds the record for a file"""
+
+        permissions = stat.filemode(file_stat.st_mode)
+        owner_name = get_user_name(file_stat.st_uid)
+        group_name = get_group_name(file_stat.st_gid)
+
+        if digest is None:
+            return self.record_type(pathname, permissions, owner_name, group_name,
+                                    file_stat.st_size)
+        return self.hashed_record_type(pathname, permissions, owner_name, group_name,
+                                       file_stat.st_size, digest)
+
+
+#-----------------------------------------------------------------------------
+# is_windows_file()
+#
+# The Windows lister only lists files, the same as os.path.isfile().  The
+# lstat result from the walker already answers this for everything except
+# symbolic links, which are the only entries that need another stat.
+#-----------------------------------------------------------------------------
+def is_windows_file(pathname, name, file_stat):
+    """Returns True for regular files and symbolic links to regular files"""
+
+    if stat.S_ISREG(file_stat.st_mode):
+        return True
+    if stat.S_ISLNK(file_stat.st_mode):
+        return os.path.isfile(pathname)
+    return False
+
+
+#-----------------------------------------------------------------------------
+# format_windows_attributes()
+#-----------------------------------------------------------------------------
+def format_windows_attributes(file_stat):
+    """Returns the Windows attribute letters of a file, such as 'RHA'"""
+    attributes = getattr(file_stat, 'st_file_attributes', 0)
+    return ''.join(letter for letter, flag in WINDOWS_ATTRIBUTES if attributes & flag)
+
+
+#-----------------------------------------------------------------------------
+# WindowsEnricher
+#
+# Reports the permissions and size of each file, and optionally the Windows
+# file attributes.  Attributes are empty on other platforms, which keeps
+# this stage usable on Linux.
+#-----------------------------------------------------------------------------
+class WindowsEnricher:
+    """Windows file metadata stage"""
+
+    base_fields = ('path', 'permissions', 'size')
+    attribute_fields = base_fields + ('attributes',)
+    record_types = {
+        base_fields: collections.namedtuple('WindowsFileRecord', base_fields),
+        attribute_fields: collections.namedtuple('WindowsAttributeRecord', attribute_fields),
+        base_fields + ('digest',):
+            collections.namedtuple('WindowsHashedFileRecord', base_fields + ('digest',)),
+        attribute_fields + ('digest',):
+            collections.namedtuple('WindowsHashedAttributeRecord', attribute_fields + ('digest',)),
+    }
+
+    file_filter = staticmethod(is_windows_file)
+
+    def __init__(self, attributes=False):
+        self.attributes = attributes
+        self.fields = self.attribute_fields if attributes else self.base_fields
+        self.hashed_fields = self.fields + ('digest',)
+        self.record_type = self.record_types[self.fields]
+        self.hashed_record_type = self.record_types[self.hashed_fields]
+
+    def record(self, pathname, file_stat, digest=None):
+        """Builds the record for a file"""
+
+        values = [pathname, stat.filemode(file_stat.st_mode), file_stat.st_size]
+        if self.attributes:
+            values.append(format_windows_attributes(file_stat))
+
+        if digest is None:
+            return self.record_type(*values)
+        return self.hashed_record_type(*values, digest)
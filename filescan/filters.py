@@ -0,0 +1,357 @@
+#-----------------------------------------------------------------------------
+# filters.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Filter expressions and exclusion patterns for the file walkers.  Both are
+# compiled once into plain functions so they can be evaluated inside the
+# walker, before a file is reported and before any names are resolved.
+#
+# A filter expression is a list of terms combined with "and", "or", "not"
+# and parentheses.  Adjacent terms are joined with "and".  The terms are:
+#
+#     setuid, setgid, world-writable (symbolic links never match)
+#     owner=NAME, group=NAME       (a name or a numeric id)
+#     size>N, size>=N, size<N, size<=N, size=N, size=N..M
+#                                  (N accepts K, M, G and T suffixes)
+#     mtime>DATE, mtime>=DATE, mtime<DATE, mtime<=DATE, mtime=DATE,
+#     mtime=DATE..DATE             (DATE is YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)
+#     age>N, age<N, age=N..M      (N accepts s, m, h, d and w suffixes)
+#     name=GLOB, path=GLOB
+#
+# The comparisons of mtime take a DATE as the moment it starts, midnight
+# for a day.  With '=', a DATE is the whole period it names instead: a day
+# from midnight up to the next midnight, or a whole second for a time, and
+# a range runs from the start of its first DATE to the end of its last.
+#
+# For example:
+#
+#     "(setuid or setgid) and not owner=root"
+#     "world-writable size>1M age<7d"
+#-----------------------------------------------------------------------------
+"""filters.py""" # for pylint
+
+import datetime
+import fnmatch
+import re
+import stat
+import time
+
+try:
+    import grp
+    import pwd
+except ImportError:
+    grp = None
+    pwd = None
+
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+AGE_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+TOKEN_RE = re.compile(r'\(|\)|[^\s()]+')
+TERM_RE = re.compile(r'([a-z]+)(>=|<=|=|>|<)(.+)', flags=re.IGNORECASE)
+
+NS_PER_SECOND = 1000 * 1000 * 1000
+
+
+#-----------------------------------------------------------------------------
+# parse_size()
+#-----------------------------------------------------------------------------
+def parse_size(text):
+    """Parses a size such as 512, 10K or 1.5G into bytes"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([kmgt]?)b?', text.strip(), flags=re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Invalid size: {text}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+#-----------------------------------------------------------------------------
+# parse_age()
+#-----------------------------------------------------------------------------
+def parse_age(text):
+    """Parses an age such as 30m, 12h or 7d into nanoseconds"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smhdw]?)', text.strip(), flags=re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Invalid age: {text}")
+    return int(float(match.group(1)) * AGE_UNITS[match.group(2).lower() or 's'] * NS_PER_SECOND)
+
+
+#-----------------------------------------------------------------------------
+# parse_date()
+#-----------------------------------------------------------------------------
+def parse_date(text):
+    """Parses a local date or date and time into nanoseconds since the epoch"""
+    try:
+        moment = datetime.datetime.fromisoformat(text.strip())
+    except ValueError:
+        raise ValueError(f"Invalid date: {text}") from None
+    return timestamp_ns(moment)
+
+
+#-----------------------------------------------------------------------------
+# timestamp_ns()
+#
+# Converts a local or aware datetime to nanoseconds since the epoch.  The
+# whole seconds and the microseconds are converted separately, since a
+# float timestamp cannot hold nanoseconds exactly.
+#-----------------------------------------------------------------------------
+def timestamp_ns(moment):
+    """Returns the nanoseconds since the epoch of a datetime"""
+    seconds = int(moment.replace(microsecond=0).timestamp())
+    return seconds * NS_PER_SECOND + moment.microsecond * 1000
+
+
+#-----------------------------------------------------------------------------
+# parse_date_span()
+#
+# Returns the [start, end) nanoseconds covered by a date, which is its whole
+# day, or by a date and time, which is its whole second, or a microsecond
+# when the time has a fraction.
+#-----------------------------------------------------------------------------
+def parse_date_span(text):
+    """Parses a local date or date and time into the span of time it covers"""
+
+    start = parse_date(text)
+    try:
+        day = datetime.date.fromisoformat(text.strip())
+    except ValueError:
+        moment = datetime.datetime.fromisoformat(text.strip())
+        width = datetime.timedelta(microseconds=1 if moment.microsecond else 1000000)
+        return start, timestamp_ns(moment + width)
+
+    # The next midnight, which is not 24 hours later on a daylight saving change
+    next_day = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time())
+    return start, timestamp_ns(next_day)
+
+
+#-----------------------------------------------------------------------------
+# resolve_id()
+#-----------------------------------------------------------------------------
+def resolve_id(text, lookup, kind):
+    """Resolves a user or group name to its numeric id"""
+    if text.isdigit():
+        return int(text)
+    if lookup is None:
+        raise ValueError(f"Cannot resolve {kind} names on this platform: {text}")
+    try:
+        return lookup(text)
+    except KeyError:
+        raise ValueError(f"Unknown {kind}: {text}") from None
+
+
+#-----------------------------------------------------------------------------
+# compare()
+#
+# Builds a function comparing a value against the operand of a term.  The
+# '=' operator accepts either a single value or an inclusive LOW..HIGH range.
+#-----------------------------------------------------------------------------
+def compare(operator, operand, parse):
+    """Returns a comparison function for a term"""
+
+    if operator == '=' and '..' in operand:
+        low, high = (parse(part) for part in operand.split('..', 1))
+        return lambda value: low <= value <= high
+
+    limit = parse(operand)
+    return {
+        '>': lambda value: value > limit,
+        '>=': lambda value: value >= limit,
+        '<': lambda value: value < limit,
+        '<=': lambda value: value <= limit,
+        '=': lambda value: value == limit,
+    }[operator]
+
+
+#-----------------------------------------------------------------------------
+# compile_term()
+#
+# Compiles a single term into a function of (pathname, name, stat).
+#-----------------------------------------------------------------------------
+def compile_term(token):
+    """Compiles a single filter term"""
+
+    keyword = token.lower()
+    if keyword == 'setuid':
+        return lambda path, name, st: st.st_mode & stat.S_ISUID != 0
+    if keyword == 'setgid':
+        return lambda path, name, st: st.st_mode & stat.S_ISGID != 0
+    if keyword == 'world-writable':
+        # Symbolic link permissions are not used, so links never match
+        return lambda path, name, st: (st.st_mode & stat.S_IWOTH != 0 and
+                                       not stat.S_ISLNK(st.st_mode))
+
+    match = TERM_RE.fullmatch(token)
+    if match is None:
+        raise ValueError(f"Invalid filter term: {token}")
+    field, operator, operand = match.group(1).lower(), match.group(2), match.group(3)
+
+    if field in ('owner', 'group', 'name', 'path') and operator != '=':
+        raise ValueError(f"Only '=' is supported for {field}: {token}")
+
+    if field == 'owner':
+        uid = resolve_id(operand, pwd and (lambda text: pwd.getpwnam(text).pw_uid), 'user')
+        return lambda path, name, st: st.st_uid == uid
+    if field == 'group':
+        gid = resolve_id(operand, grp and (lambda text: grp.getgrnam(text).gr_gid), 'group')
+        return lambda path, name, st: st.st_gid == gid
+    if field == 'name':
+        pattern = re.compile(fnmatch.translate(operand))
+        return lambda path, name, st: pattern.match(name) is not None
+    if field == 'path':
+        pattern = re.compile(fnmatch.translate(operand))
+        return lambda path, name, st: pattern.match(path) is not None
+    if field == 'size':
+        test = compare(operator, operand, parse_size)
+        return lambda path, name, st: test(st.st_size)
+    if field == 'mtime':
+        if operator == '=':
+            # A date matches the whole day, and a range the whole of its last date
+            low, _, high = operand.partition('..')
+            start = parse_date_span(low)[0]
+            end = parse_date_span(high or low)[1]
+            return lambda path, name, st: start <= st.st_mtime_ns < end
+        test = compare(operator, operand, parse_date)
+        return lambda path, name, st: test(st.st_mtime_ns)
+    if field == 'age':
+        # The age is measured from when the filter was compiled
+        now = time.time_ns()
+        test = compare(operator, operand, parse_age)
+        return lambda path, name, st: test(now - st.st_mtime_ns)
+
+    raise ValueError(f"Unknown filter field: {field}")
+
+
+#-----------------------------------------------------------------------------
+# FilterParser
+#
+# Recursive descent parser for filter expressions.  Precedence from lowest
+# to highest is "or", "and" (explicit or implied), and "not".
+#-----------------------------------------------------------------------------
+class FilterParser:
+    """Parses a filter expression into a function"""
+
+    def __init__(self, expression):
+        self.tokens = TOKEN_RE.findall(expression)
+        self.position = 0
+
+    def peek(self):
+        """Returns the next token without consuming it"""
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def take(self):
+        """Consumes and returns the next token"""
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of filter expression")
+        self.position += 1
+        return token
+
+    def parse(self):
+        """Parses the whole expression"""
+        result = self.parse_or()
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected token in filter expression: {self.peek()}")
+        return result
+
+    def parse_or(self):
+        """Parses terms joined by 'or'"""
+        terms = [self.parse_and()]
+        while (self.peek() or '').lower() == 'or':
+            self.take()
+            terms.append(self.parse_and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda path, name, st: any(term(path, name, st) for term in terms)
+
+    def parse_and(self):
+        """Parses terms joined by 'and' or by juxtaposition"""
+        terms = [self.parse_not()]
+        while self.peek() is not None and self.peek() != ')' and self.peek().lower() != 'or':
+            if self.peek().lower() == 'and':
+                self.take()
+            terms.append(self.parse_not())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda path, name, st: all(term(path, name, st) for term in terms)
+
+    def parse_not(self):
+        """Parses a negated term, a parenthesized expression or a single term"""
+        token = self.take()
+        if token.lower() == 'not':
+            term = self.parse_not()
+            return lambda path, name, st: not term(path, name, st)
+        if token == '(':
+            result = self.parse_or()
+            if self.take() != ')':
+                raise ValueError("Missing ')' in filter expression")
+            return result
+        if token == ')' or token.lower() in ('and', 'or'):
+            raise ValueError(f"Unexpected token in filter expression: {token}")
+        return compile_term(token)
+
+
+#-----------------------------------------------------------------------------
+# compile_filter()
+#
+# Returns a function of (pathname, name, stat) that is True for the files
+# matching the expression, or None when there is no expression.  Raises
+# ValueError when the expression is invalid.
+#-----------------------------------------------------------------------------
+def compile_filter(expression):
+    """Compiles a filter expression"""
+
+    if expression is None or not expression.strip():
+        return None
+    return FilterParser(expression).parse()
+
+
+#-----------------------------------------------------------------------------
+# compile_excludes()
+#
+# Returns a function of (pathname, name) that is True for entries to skip,
+# or None when there are no patterns.  Patterns without a '/' are globs
+# matched against the entry name, and patterns with a '/' are globs matched
+# against the pathname as the walker reports it (which starts with the root
+# given to the walker).  A trailing '/' is ignored.
+#-----------------------------------------------------------------------------
+def compile_excludes(patterns):
+    """Compiles a list of exclusion patterns"""
+
+    name_patterns = []
+    path_patterns = []
+    for pattern in patterns or ():
+        if pattern != '/':
+            pattern = pattern.rstrip('/')
+        if '/' in pattern:
+            path_patterns.append(fnmatch.translate(pattern))
+        else:
+            name_patterns.append(fnmatch.translate(pattern))
+
+    if not name_patterns and not path_patterns:
+        return None
+
+    # Combine each group of globs into a single regex
+    never = re.compile(r'(?!)')
+    name_re = re.compile('|'.join(name_patterns)) if name_patterns else never
+    path_re = re.compile('|'.join(path_patterns)) if path_patterns else never
+    return lambda path, name: name_re.match(name) is not None or path_re.match(path) is not None
+
+
+#-----------------------------------------------------------------------------
+# all_of()
+#
+# Combines filter functions, skipping any that are None.  Returns None when
+# there is nothing to combine, so the walkers keep their fast path.
+#-----------------------------------------------------------------------------
+def all_of(*file_filters):
+    """Returns a filter that matches when every provided filter matches"""
+
+    active = [file_filter for file_filter in file_filters if file_filter is not None]
+    if not active:
+        return None
+    if len(active) == 1:
+        return active[0]
+    return lambda path, name, st: all(file_filter(path, name, st) for file_filter in active)
@@ -0,0 +1,190 @@
+#-----------------------------------------------------------------------------
+# hashing.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Content hashing for the file listers.  Files are hashed on a thread pool,
+# large files are read through mmap and smaller ones through a reusable
+# readinto() buffer, and digests are kept in a persistent cache keyed by
+# (device, inode, size, mtime_ns) so unchanged files are never read twice.
+#-----------------------------------------------------------------------------
+"""hashing.py""" # for pylint
+
+import collections
+import concurrent.futures
+import hashlib
+import mmap
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+# Files at least this large are hashed through mmap
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# Size of the per-thread readinto() buffer
+READ_BUFFER_SIZE = 1024 * 1024
+
+# Files modified this recently are not cached since a later write within the
+# same timestamp tick would not change the cache key
+RACY_WINDOW_NS = 2 * 1000 * 1000 * 1000
+
+THREAD_BUFFERS = threading.local()
+
+
+#-----------------------------------------------------------------------------
+# hash_file()
+#
+# Returns the hex digest of a file along with the fstat result taken after
+# the file was read, which callers use to detect files that changed while
+# they were being hashed.
+#-----------------------------------------------------------------------------
+def hash_file(pathname, algorithm='sha256'):
+    """Returns the hex digest and final stat result of a file"""
+
+    digest = hashlib.new(algorithm)
+    with open(pathname, 'rb', buffering=0) as file:
+        size = os.fstat(file.fileno()).st_size
+
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            # Each worker thread reuses its own buffer
+            buffer = getattr(THREAD_BUFFERS, 'buffer', None)
+            if buffer is None:
+                buffer = THREAD_BUFFERS.buffer = bytearray(READ_BUFFER_SIZE)
+            view = memoryview(buffer)
+
+            while True:
+                count = file.readinto(buffer)
+                if not count:
+                    break
+                digest.update(view[:count])
+
+        return digest.hexdigest(), os.fstat(file.fileno())
+
+
+#-----------------------------------------------------------------------------
+# HashCache
+#
+# Persistent SQLite cache of file digests.  An entry is only valid while the
+# device, inode, size and mtime of the file are unchanged.
+#-----------------------------------------------------------------------------
+class HashCache:
+    """Persistent cache of file digests keyed by stat attributes"""
+
+    def __init__(self, pathname):
+        self.conn = sqlite3.connect(pathname)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS digests (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                algorithm TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (dev, ino, algorithm)
+            ) WITHOUT ROWID''')
+
+    def close(self):
+        """Commits the new digests and closes the cache"""
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, file_stat, algorithm):
+        """Returns the cached digest for a file, or None"""
+        row = self.conn.execute("SELECT size, mtime_ns, digest FROM digests "
+                                "WHERE dev = ? AND ino = ? AND algorithm = ?",
+                                (file_stat.st_dev, file_stat.st_ino, algorithm)).fetchone()
+        if row is None or row[0] != file_stat.st_size or row[1] != file_stat.st_mtime_ns:
+            return None
+        return row[2]
+
+    def put(self, file_stat, algorithm, digest):
+        """Stores the digest for a file"""
+        self.conn.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)",
+                          (file_stat.st_dev, file_stat.st_ino, file_stat.st_size,
+                           file_stat.st_mtime_ns, algorithm, digest))
+
+
+#-----------------------------------------------------------------------------
+# FileHasher
+#
+# Hashes a stream of files on a thread pool.  Cache lookups and updates are
+# made on the calling thread, so the cache is never shared between threads,
+# and results are yielded in the same order as the input.  At most a few
+# files per worker are in flight at once.
+#-----------------------------------------------------------------------------
+class FileHasher:
+    """Hashes files on a thread pool using an optional digest cache"""
+
+    def __init__(self, algorithm='sha256', cache=None, workers=4):
+        hashlib.new(algorithm)  # Fail early on an unknown algorithm
+        self.algorithm = algorithm
+        self.cache = cache
+        self.workers = workers
+
+    def is_cacheable(self, old_stat, new_stat):
+        """Returns True if the file did not change while it was hashed"""
+        # A file replaced by a rename is a different inode, even with the
+        # same size and mtime
+        return (old_stat.st_dev == new_stat.st_dev and
+                old_stat.st_ino == new_stat.st_ino and
+                old_stat.st_size == new_stat.st_size and
+                old_stat.st_mtime_ns == new_stat.st_mtime_ns and
+                time.time_ns() - new_stat.st_mtime_ns > RACY_WINDOW_NS)
+
+    def hash_one(self, pathname):
+        """Hashes a single file, returning empty results if it cannot be read"""
+        try:
+            return hash_file(pathname, self.algorithm)
+        except OSError:
+            return '', None
+
+    #-------------------------------------------------------------------------
+    # hash_files()
+    #
+    # Takes (pathname, stat) tuples and yields (pathname, stat, digest)
+    # tuples.  Only regular files are hashed; other entries and files that
+    # cannot be read get an empty digest.
+    #-------------------------------------------------------------------------
+    def hash_files(self, files):
+        """Yields each file with its digest appended"""
+
+        in_flight = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for pathname, file_stat in files:
+                digest = ''
+                if stat.S_ISREG(file_stat.st_mode):
+                    if self.cache is not None:
+                        digest = self.cache.get(file_stat, self.algorithm)
+                    if not digest:
+                        digest = executor.submit(self.hash_one, pathname)
+                in_flight.append((pathname, file_stat, digest))
+
+                while len(in_flight) > self.workers * 4:
+                    yield self.finish(*in_flight.popleft())
+
+            while in_flight:
+                yield self.finish(*in_flight.popleft())
+
+    def finish(self, pathname, file_stat, digest):
+        """Waits for a pending digest and stores it in the cache"""
+
+        if isinstance(digest, concurrent.futures.Future):
+            digest, final_stat = digest.result()
+            if (digest and self.cache is not None and
+                    self.is_cacheable(file_stat, final_stat)):
+                self.cache.put(file_stat, self.algorithm, digest)
+
+        return pathname, file_stat, digest
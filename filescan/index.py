@@ -0,0 +1,240 @@
+#-----------------------------------------------------------------------------
+# index.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Persistent scan index for incremental rescans.  The index is a SQLite
+# database holding the inode, mtime, size, mode, uid and gid of every entry
+# seen by the last scan, keyed by path.  A rescan does not read the entries
+# of any directory whose inode and mtime are unchanged, and reports only the
+# files that were added, removed or modified.
+#-----------------------------------------------------------------------------
+"""index.py""" # for pylint
+
+import collections
+import os
+import sqlite3
+import stat
+
+# Change types reported by ScanIndex.rescan()
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+# Entry attributes compared to detect a modified file
+COMPARE_FIELDS = ('inode', 'mtime_ns', 'size', 'mode', 'uid', 'gid')
+
+# Paths are stored as bytes so that undecodable file names round trip
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    path BLOB PRIMARY KEY,
+    parent BLOB NOT NULL,
+    is_dir INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mode INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    gid INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+'''
+
+ENTRY_COLUMNS = 'path, is_dir, inode, mtime_ns, size, mode, uid, gid'
+
+IndexEntry = collections.namedtuple('IndexEntry', ENTRY_COLUMNS.replace(',', ''))
+
+
+#-----------------------------------------------------------------------------
+# make_entry()
+#-----------------------------------------------------------------------------
+def make_entry(pathname, is_dir, file_stat):
+    """Builds an index entry from a stat result"""
+    return IndexEntry(pathname, is_dir, file_stat.st_ino, file_stat.st_mtime_ns,
+                      file_stat.st_size, file_stat.st_mode, file_stat.st_uid,
+                      file_stat.st_gid)
+
+
+#-----------------------------------------------------------------------------
+# is_modified()
+#-----------------------------------------------------------------------------
+def is_modified(old_entry, new_entry):
+    """Returns True if the stat attributes of the entry have changed"""
+    return any(getattr(old_entry, field) != getattr(new_entry, field)
+               for field in COMPARE_FIELDS)
+
+
+#-----------------------------------------------------------------------------
+# read_directory()
+#
+# Reads a directory and returns a dictionary of pathname to (is_dir, stat).
+# Symbolic links to directories are skipped, the same as the file walkers.
+#-----------------------------------------------------------------------------
+def read_directory(dirpath):
+    """Reads the entries and stat results of a single directory"""
+
+    entries = {}
+    try:
+        with os.scandir(dirpath) as dir_entries:
+            for entry in dir_entries:
+                try:
+                    is_dir = entry.is_dir()
+                    if is_dir and entry.is_symlink():
+                        continue
+                    entries[entry.path] = (is_dir, entry.stat(follow_symlinks=False))
+                except OSError:
+                    continue
+
+    except OSError:
+        pass
+
+    return entries
+
+
+#-----------------------------------------------------------------------------
+# ScanIndex
+#-----------------------------------------------------------------------------
+class ScanIndex:
+    """On-disk index of the last scan"""
+
+    def __init__(self, pathname):
+        self.conn = sqlite3.connect(pathname)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Closes the index database"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def row_to_entry(self, row):
+        """Converts a database row to an index entry"""
+        return IndexEntry(os.fsdecode(row[0]), bool(row[1]), *row[2:])
+
+    def lookup(self, pathname):
+        """Returns the index entry for a pathname, or None"""
+        row = self.conn.execute(f"SELECT {ENTRY_COLUMNS} FROM entries WHERE path = ?",
+                                (os.fsencode(pathname),)).fetchone()
+        return None if row is None else self.row_to_entry(row)
+
+    def children(self, dirpath):
+        """Returns a dictionary of the indexed entries of a directory"""
+        rows = self.conn.execute(f"SELECT {ENTRY_COLUMNS} FROM entries WHERE parent = ?",
+                                 (os.fsencode(dirpath),))
+        return {entry.path: entry for entry in map(self.row_to_entry, rows)}
+
+    def store(self, entry):
+        """Inserts or replaces an index entry"""
+        path = os.fsencode(entry.path)
+        parent = os.fsencode(os.path.dirname(entry.path))
+        self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          (path, parent, int(entry.is_dir)) + tuple(entry[2:]))
+
+    def remove(self, entry):
+        """Removes an entry, and its subtree if it is a directory, and yields the removed files"""
+
+        path = os.fsencode(entry.path)
+        if entry.is_dir:
+            # Everything under the directory sorts between "dir/" and "dir0"
+            subtree = (path + b'/', path + b'0')
+            rows = self.conn.execute(f"SELECT {ENTRY_COLUMNS} FROM entries "
+                                     "WHERE path >= ? AND path < ? AND is_dir = 0", subtree)
+            for removed_entry in map(self.row_to_entry, rows.fetchall()):
+                yield REMOVED, removed_entry
+            self.conn.execute("DELETE FROM entries WHERE path >= ? AND path < ?", subtree)
+        else:
+            yield REMOVED, entry
+
+        self.conn.execute("DELETE FROM entries WHERE path = ?", (path,))
+
+    #-------------------------------------------------------------------------
+    # rescan()
+    #
+    # Walks the tree and yields a (change, IndexEntry) tuple for every file
+    # that was added, removed or modified since the last scan.  The first
+    # scan reports every file as added.
+    #
+    # When a directory's inode and mtime are unchanged, its entries are taken
+    # from the index instead of being read again.  Its files are still
+    # stat'ed to catch content changes, which do not update the directory
+    # mtime, unless quick=True, in which case they are assumed unchanged.
+    # Subdirectories are always stat'ed since their changes do not update
+    # the parent's mtime.
+    #
+    # The index is updated in a single transaction that is only committed
+    # when the rescan runs to completion.  A root that is missing or is not
+    # a directory yields nothing and leaves the index as it is, the same as
+    # the file walkers, which list nothing.  The root may be a symbolic link
+    # to a directory, which is followed.
+    #-------------------------------------------------------------------------
+    def rescan(self, dirname, quick=False):
+        """Yields the changes since the last scan and updates the index"""
+
+        root = os.path.abspath(dirname)
+        try:
+            root_stat = os.stat(root)
+        except OSError:
+            return
+        if not stat.S_ISDIR(root_stat.st_mode):
+            return
+        pending_dirs = [(root, root_stat)]
+
+        with self.conn:
+            while pending_dirs:
+                dirpath, dir_stat = pending_dirs.pop()
+                old_dir = self.lookup(dirpath)
+                old_children = self.children(dirpath)
+
+                if (old_dir is not None and old_dir.is_dir and
+                        old_dir.inode == dir_stat.st_ino and
+                        old_dir.mtime_ns == dir_stat.st_mtime_ns):
+
+                    # The directory is unchanged, so reuse the indexed entries
+                    current = {}
+                    for pathname, old_entry in old_children.items():
+                        if quick and not old_entry.is_dir:
+                            current[pathname] = None
+                            continue
+                        try:
+                            file_stat = os.lstat(pathname)
+                        except OSError:
+                            continue
+                        current[pathname] = (stat.S_ISDIR(file_stat.st_mode), file_stat)
+                else:
+                    current = read_directory(dirpath)
+
+                for pathname, item in current.items():
+                    old_entry = old_children.pop(pathname, None)
+                    if item is None:
+                        continue
+
+                    # An entry that changed type is a removal and an addition
+                    is_dir, file_stat = item
+                    if old_entry is not None and old_entry.is_dir != is_dir:
+                        yield from self.remove(old_entry)
+                        old_entry = None
+
+                    if is_dir:
+                        pending_dirs.append((pathname, file_stat))
+                        continue
+
+                    entry = make_entry(pathname, False, file_stat)
+                    if old_entry is None:
+                        yield ADDED, entry
+                    elif is_modified(old_entry, entry):
+                        yield MODIFIED, entry
+                    else:
+                        continue
+                    self.store(entry)
+
+                # Anything left in the index no longer exists
+                for old_entry in old_children.values():
+                    yield from self.remove(old_entry)
+
+                self.store(make_entry(dirpath, True, dir_stat))
@@ -0,0 +1,78 @@
+#-----------------------------------------------------------------------------
+# mounts.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Mount table helpers for keeping file scans out of pseudo and network
+# filesystems.  Mounts are matched by device number, so the walkers only
+# compare the st_dev of each directory and never need to match paths.
+#-----------------------------------------------------------------------------
+"""mounts.py""" # for pylint
+
+import collections
+import os
+
+MOUNTINFO_PATH = '/proc/self/mountinfo'
+
+# Kernel pseudo filesystems that hold no regular file data worth scanning
+PSEUDO_FSTYPES = frozenset([
+    'autofs', 'binfmt_misc', 'bpf', 'cgroup', 'cgroup2', 'configfs', 'debugfs',
+    'devpts', 'devtmpfs', 'efivarfs', 'fusectl', 'hugetlbfs', 'mqueue', 'nsfs',
+    'proc', 'pstore', 'rpc_pipefs', 'securityfs', 'selinuxfs', 'sysfs', 'tracefs',
+])
+
+MountEntry = collections.namedtuple('MountEntry', 'device mount_point fstype')
+
+
+#-----------------------------------------------------------------------------
+# unescape_mount_field()
+#
+# The mount table escapes space, tab, newline and backslash as octal.
+#-----------------------------------------------------------------------------
+def unescape_mount_field(field):
+    """Decodes the octal escapes of a mount table field"""
+    if '\\' not in field:
+        return field
+    raw = field.encode('utf-8', 'surrogateescape')
+    decoded = raw.decode('unicode_escape').encode('latin-1')
+    return os.fsdecode(decoded)
+
+
+#-----------------------------------------------------------------------------
+# read_mount_table()
+#
+# Returns a list of MountEntry tuples from /proc/self/mountinfo, or an empty
+# list when the mount table is not available.
+#-----------------------------------------------------------------------------
+def read_mount_table(pathname=MOUNTINFO_PATH):
+    """Reads the mount table"""
+
+    entries = []
+    try:
+        with open(pathname, encoding='utf-8', errors='surrogateescape') as file:
+            for line in file:
+                # The optional fields end with a '-' separator before the fstype
+                fields = line.split()
+                try:
+                    separator = fields.index('-', 6)
+                except ValueError:
+                    continue
+                major, minor = fields[2].split(':')
+                entries.append(MountEntry(os.makedev(int(major), int(minor)),
+                                          unescape_mount_field(fields[4]),
+                                          fields[separator + 1]))
+    except OSError:
+        pass
+
+    return entries
+
+
+#-----------------------------------------------------------------------------
+# excluded_devices()
+#-----------------------------------------------------------------------------
+def excluded_devices(fstypes, pathname=MOUNTINFO_PATH):
+    """Returns the set of device numbers mounted with any of the fstypes"""
+    fstypes = frozenset(fstypes)
+    return {entry.device for entry in read_mount_table(pathname) if entry.fstype in fstypes}
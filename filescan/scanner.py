@@ -0,0 +1,74 @@
+#-----------------------------------------------------------------------------
+# scanner.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Scanning pipeline shared by the file listers.  A scan walks the tree with
+# one of the walkers, optionally hashes the files, and passes each file to
+# the platform enricher to build its record.
+#-----------------------------------------------------------------------------
+"""scanner.py""" # for pylint
+
+from filescan import columns, filters, walker
+
+
+#-----------------------------------------------------------------------------
+# iter_records()
+#
+# Yields the enricher's record for every file under dirname.  The walk
+# options (workers, ordered, exclude, fd_relative, one_filesystem,
+# exclude_fstypes and dedup) are passed to walker.walk_files().  The
+# enricher's own filter is combined with file_filter, so both run inside
+# the walker.
+#-----------------------------------------------------------------------------
+def iter_records(dirname, enricher, hasher=None, file_filter=None, **walk_options):
+    """Yields a record for every file under the specified pathname"""
+
+    file_filter = filters.all_of(enricher.file_filter, file_filter)
+    file_iter = walker.walk_files(dirname, file_filter=file_filter, **walk_options)
+
+    # Append the content digest of each file when a hasher is provided
+    if hasher is not None:
+        for pathname, file_stat, digest in hasher.hash_files(file_iter):
+            yield enricher.record(pathname, file_stat, digest)
+        return
+
+    for pathname, file_stat in file_iter:
+        yield enricher.record(pathname, file_stat)
+
+
+#-----------------------------------------------------------------------------
+# collect_files()
+#
+# Scans the tree into a columnar collector holding the raw stat values.
+# Owner and group names are not resolved.  An enricher may be provided for
+# its file filter; its records are not built.
+#-----------------------------------------------------------------------------
+def collect_files(dirname, enricher=None, file_filter=None, **walk_options):
+    """Scans the tree into a ColumnarCollector"""
+
+    if enricher is not None:
+        file_filter = filters.all_of(enricher.file_filter, file_filter)
+
+    collector = columns.ColumnarCollector()
+    collector.extend(walker.walk_files(dirname, file_filter=file_filter, **walk_options))
+    return collector
+
+
+#-----------------------------------------------------------------------------
+# write_records()
+#
+# Writes each record to the sink, or prints it when no sink is provided.
+#-----------------------------------------------------------------------------
+def write_records(records, sink=None):
+    """Writes records to a sink or stdout"""
+
+    if sink is None:
+        for record in records:
+            print(" ".join(map(str, record)))
+        return
+
+    for record in records:
+        sink.write(record)
@@ -0,0 +1,303 @@
+#-----------------------------------------------------------------------------
+# sinks.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Buffered output sinks for the file listers.  Every sink writes through a
+# large buffer instead of issuing one write per file, and every format except
+# the legacy text format can be parsed when a path contains white space.
+#-----------------------------------------------------------------------------
+"""sinks.py""" # for pylint
+
+import csv
+import io
+import json
+import os
+import struct
+import sys
+
+# Default size of the output buffer
+BUFFER_SIZE = 1024 * 1024
+
+# Binary format header and value encodings
+BINARY_MAGIC = b'FSCN'
+BINARY_VERSION = 1
+BINARY_STR = ord('s')
+BINARY_INT = ord('i')
+
+U8 = struct.Struct('<B')
+U16 = struct.Struct('<H')
+U32 = struct.Struct('<I')
+I64 = struct.Struct('<q')
+
+
+#-----------------------------------------------------------------------------
+# open_output()
+#
+# Opens the output file as a binary stream with a large buffer.  When no
+# pathname is provided, the stdout file descriptor is wrapped instead so the
+# output is no longer line buffered when stdout is a TTY.  Closing the
+# wrapper flushes it but leaves stdout open.
+#
+# When resume_offset is provided, the existing file is truncated to that
+# offset and written from there instead of being replaced.
+#-----------------------------------------------------------------------------
+def open_output(pathname=None, buffer_size=BUFFER_SIZE, resume_offset=None):
+    """Opens a buffered binary output stream"""
+
+    if pathname is None or pathname == '-':
+        if resume_offset is not None:
+            raise ValueError("Cannot resume writing to stdout")
+
+        # Flush anything already written through sys.stdout (such as a prompt)
+        sys.stdout.flush()
+        return os.fdopen(sys.stdout.fileno(), 'wb', buffering=buffer_size, closefd=False)
+
+    if resume_offset is None:
+        return open(pathname, 'wb', buffering=buffer_size)
+
+    stream = open(pathname, 'r+b', buffering=buffer_size)
+    if stream.seek(0, os.SEEK_END) < resume_offset:
+        stream.close()
+        raise ValueError(f"Output file is shorter than the resume offset: {pathname}")
+    stream.seek(resume_offset)
+    stream.truncate()
+    return stream
+
+
+#-----------------------------------------------------------------------------
+# Sink
+#
+# Base class for the output sinks.  A sink is created with the list of field
+# names and receives one tuple of values per file, in field order.  With
+# header=False, the sink continues an existing output and does not write
+# its header again.
+#-----------------------------------------------------------------------------
+class Sink:
+    """Base class for the output sinks"""
+
+    def __init__(self, stream, fields, header=True):
+        self.stream = stream
+        self.fields = tuple(fields)
+        self.header = header
+
+    def write(self, record):
+        """Writes a single record"""
+        raise NotImplementedError
+
+    def sync(self):
+        """Flushes the output to stable storage and returns its offset"""
+        self.stream.flush()
+        os.fsync(self.stream.fileno())
+        return self.stream.tell()
+
+    def close(self):
+        """Flushes the sink and closes the underlying stream"""
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+#-----------------------------------------------------------------------------
+# TextSink
+#
+# Writes the records as space-separated text, the same as the original
+# print() output.  Paths that cannot be decoded are written back as their
+# original bytes.
+#-----------------------------------------------------------------------------
+class TextSink(Sink):
+    """Writes space-separated text records"""
+
+    def __init__(self, stream, fields, header=True):
+        super().__init__(stream, fields, header)
+        self.text = io.TextIOWrapper(stream, encoding='utf-8', errors='surrogateescape',
+                                     newline='\n', write_through=True)
+
+    def write(self, record):
+        self.text.write(' '.join(map(str, record)) + '\n')
+
+    def close(self):
+        self.text.detach()
+        super().close()
+
+
+#-----------------------------------------------------------------------------
+# NdjsonSink
+#
+# Writes one JSON object per line, keyed by the field names.  Non-ASCII
+# characters are escaped, so that the surrogates of paths that cannot be
+# decoded are written as \udcXX escapes and every line is valid JSON.
+#-----------------------------------------------------------------------------
+class NdjsonSink(TextSink):
+    """Writes newline-delimited JSON records"""
+
+    def __init__(self, stream, fields, header=True):
+        super().__init__(stream, fields, header)
+        self.encoder = json.JSONEncoder(ensure_ascii=True, check_circular=False)
+
+    def write(self, record):
+        self.text.write(self.encoder.encode(dict(zip(self.fields, record))) + '\n')
+
+
+#-----------------------------------------------------------------------------
+# CsvSink
+#
+# Writes RFC 4180 CSV with a header row of the field names.
+#-----------------------------------------------------------------------------
+class CsvSink(TextSink):
+    """Writes CSV records"""
+
+    def __init__(self, stream, fields, header=True):
+        super().__init__(stream, fields, header)
+        self.writer = csv.writer(self.text, lineterminator='\n')
+        if header:
+            self.writer.writerow(self.fields)
+
+    def write(self, record):
+        self.writer.writerow(record)
+
+
+#-----------------------------------------------------------------------------
+# BinarySink
+#
+# Writes a compact length-prefixed binary format.  The stream starts with a
+# header:
+#
+#     'FSCN' magic, u8 version, u16 field count, and then for each field
+#     a u8 type ('s' or 'i'), u16 name length and the UTF-8 name
+#
+# Each record follows as a u32 length and the encoded values.  Strings are
+# a u32 length and the UTF-8 bytes (undecodable path bytes are preserved),
+# and integers are signed 64-bit.  All values are little endian.  The field
+# types are taken from the first record.
+#-----------------------------------------------------------------------------
+class BinarySink(Sink):
+    """Writes length-prefixed binary records"""
+
+    def __init__(self, stream, fields, header=True):
+        super().__init__(stream, fields, header)
+        self.types = None
+
+    def write_header(self, record):
+        """Writes the header using the value types of the first record"""
+
+        self.types = tuple(BINARY_INT if isinstance(value, int) else BINARY_STR
+                           for value in record)
+        if not self.header:
+            return
+
+        header = [BINARY_MAGIC, U8.pack(BINARY_VERSION), U16.pack(len(self.fields))]
+        for field, value_type in zip(self.fields, self.types):
+            name = field.encode('utf-8')
+            header.append(U8.pack(value_type) + U16.pack(len(name)) + name)
+        self.stream.write(b''.join(header))
+
+    def write(self, record):
+        if self.types is None:
+            self.write_header(record)
+
+        parts = []
+        for value, value_type in zip(record, self.types):
+            if value_type == BINARY_INT:
+                parts.append(I64.pack(value))
+            else:
+                data = str(value).encode('utf-8', 'surrogateescape')
+                parts.append(U32.pack(len(data)))
+                parts.append(data)
+
+        body = b''.join(parts)
+        self.stream.write(U32.pack(len(body)) + body)
+
+    def close(self):
+        # An empty scan still gets a header so readers can recognize the stream
+        if self.types is None and self.header:
+            self.write_header(('',) * len(self.fields))
+        super().close()
+
+
+#-----------------------------------------------------------------------------
+# read_binary_records()
+#
+# Reads a stream written by BinarySink.  Yields the field names first and
+# then one tuple of values per record.
+#-----------------------------------------------------------------------------
+def read_binary_records(stream):
+    """Yields the field names and then the records of a binary stream"""
+
+    def read_exact(size):
+        data = stream.read(size)
+        if len(data) != size:
+            raise ValueError("Truncated scan record stream")
+        return data
+
+    if read_exact(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError("Not a binary scan record stream")
+
+    version = U8.unpack(read_exact(U8.size))[0]
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary scan record version {version}")
+
+    fields = []
+    types = []
+    for _ in range(U16.unpack(read_exact(U16.size))[0]):
+        types.append(U8.unpack(read_exact(U8.size))[0])
+        name_len = U16.unpack(read_exact(U16.size))[0]
+        fields.append(read_exact(name_len).decode('utf-8'))
+
+    yield tuple(fields)
+
+    while True:
+        prefix = stream.read(U32.size)
+        if not prefix:
+            break
+        if len(prefix) != U32.size:
+            raise ValueError("Truncated scan record stream")
+        body = read_exact(U32.unpack(prefix)[0])
+
+        values = []
+        offset = 0
+        for value_type in types:
+            if value_type == BINARY_INT:
+                values.append(I64.unpack_from(body, offset)[0])
+                offset += I64.size
+            else:
+                length = U32.unpack_from(body, offset)[0]
+                offset += U32.size
+                values.append(body[offset:offset + length].decode('utf-8', 'surrogateescape'))
+                offset += length
+
+        yield tuple(values)
+
+
+# Output formats supported by open_sink()
+SINK_FORMATS = {
+    'text': TextSink,
+    'ndjson': NdjsonSink,
+    'csv': CsvSink,
+    'binary': BinarySink,
+}
+
+
+#-----------------------------------------------------------------------------
+# open_sink()
+#
+# With resume_offset, the output file is truncated to the offset and the
+# sink continues it.  The header is only written when the offset is 0.
+#-----------------------------------------------------------------------------
+def open_sink(output_format, fields, pathname=None, buffer_size=BUFFER_SIZE,
+              resume_offset=None):
+    """Opens an output sink of the requested format"""
+
+    try:
+        sink_class = SINK_FORMATS[output_format]
+    except KeyError:
+        raise ValueError(f"Unknown output format: {output_format}") from None
+
+    stream = open_output(pathname, buffer_size, resume_offset)
+    return sink_class(stream, fields, header=not resume_offset)
@@ -0,0 +1,265 @@
+#-----------------------------------------------------------------------------
+# stattable.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Columnar stat table backed by NumPy arrays, with vectorized queries for
+# the questions usually asked after a scan: bytes per owner, the largest
+# directories, world-writable files and the age histogram.  NumPy is an
+# optional dependency and is only needed when a StatTable is used.
+#
+# Each file has a size, mode, uid, gid, mtime_ns and dir_index column.
+# dir_index points into the table of directory paths, and the file names
+# are packed into a single byte array, the same as ColumnarCollector.  The
+# directory table starts with the scan root and holds every directory
+# between it and the files, and dir_parent holds the index of the parent
+# of each directory (-1 for the root), so that subtree totals are computed
+# without parsing paths.
+#-----------------------------------------------------------------------------
+"""stattable.py""" # for pylint
+
+import itertools
+import os
+import stat
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# NumPy type of each column
+COLUMN_DTYPES = {
+    'size': 'int64',
+    'mode': 'uint32',
+    'uid': 'uint32',
+    'gid': 'uint32',
+    'mtime_ns': 'int64',
+    'dir_index': 'uint32',
+}
+
+# Arrays holding the directory and name tables
+TABLE_ARRAYS = ('dir_blob', 'dir_offsets', 'dir_parent', 'name_blob', 'name_offsets')
+
+# Default age histogram bucket edges, in days
+AGE_BUCKET_DAYS = (1, 7, 30, 90, 365)
+
+NS_PER_DAY = 86400 * 1000 * 1000 * 1000
+
+# File type bits of st_mode
+S_IFMT_MASK = 0o170000
+
+
+#-----------------------------------------------------------------------------
+# require_numpy()
+#-----------------------------------------------------------------------------
+def require_numpy():
+    """Raises ImportError when NumPy is not installed"""
+    if numpy is None:
+        raise ImportError("The stat table requires NumPy (pip install numpy)")
+
+
+#-----------------------------------------------------------------------------
+# pack_strings()
+#-----------------------------------------------------------------------------
+def pack_strings(strings):
+    """Packs strings into a byte array and an offsets array"""
+    encoded = [os.fsencode(string) for string in strings]
+    offsets = numpy.zeros(len(encoded) + 1, dtype='uint64')
+    numpy.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return numpy.frombuffer(b''.join(encoded), dtype='uint8'), offsets
+
+
+#-----------------------------------------------------------------------------
+# unpack_string()
+#-----------------------------------------------------------------------------
+def unpack_string(blob, offsets, position):
+    """Returns a string from a packed byte array"""
+    start, end = int(offsets[position]), int(offsets[position + 1])
+    return os.fsdecode(blob[start:end].tobytes())
+
+
+#-----------------------------------------------------------------------------
+# directory_tree()
+#
+# Puts the scan root first and appends the ancestors of the directories
+# that hold no files, so that every directory under the root has its parent
+# in the list.  The root is given as the walker joins it, and is matched in
+# the form os.path.split() returns for the files directly under it.
+# Directories outside the root have no parent.
+#-----------------------------------------------------------------------------
+def directory_tree(dirs, root):
+    """Returns the directories from the root, the position of each of dirs and the parents"""
+
+    root = os.path.dirname(os.path.join(root, ''))
+    tree = [root] + [dirpath for dirpath in dirs if dirpath != root]
+    positions = {dirpath: position for position, dirpath in enumerate(tree)}
+    parents = [-1]
+    for dirpath in itertools.islice(tree, 1, None):
+        parent = os.path.dirname(dirpath)
+        if len(dirpath) <= len(root) or parent == dirpath:
+            parents.append(-1)
+            continue
+        if parent not in positions:
+            positions[parent] = len(tree)
+            tree.append(parent)
+        parents.append(positions[parent])
+    return tree, [positions[dirpath] for dirpath in dirs], parents
+
+
+#-----------------------------------------------------------------------------
+# StatTable
+#-----------------------------------------------------------------------------
+class StatTable:
+    """NumPy column arrays of a scan with vectorized queries"""
+
+    def __init__(self, arrays):
+        require_numpy()
+        self.arrays = arrays
+        for name in COLUMN_DTYPES:
+            setattr(self, name, arrays[name])
+
+    def __len__(self):
+        return len(self.size)
+
+    #-------------------------------------------------------------------------
+    # Construction, saving and loading
+    #-------------------------------------------------------------------------
+    @classmethod
+    def from_collector(cls, collector, root):
+        """Builds a table from a ColumnarCollector of a scan of root"""
+
+        require_numpy()
+        arrays = {name: numpy.array(collector.column(name), dtype=dtype)
+                  for name, dtype in COLUMN_DTYPES.items()}
+        dirs, positions, parents = directory_tree(collector.dirs, root)
+        arrays['dir_index'] = numpy.array(positions, dtype='uint32')[arrays['dir_index']]
+        arrays['dir_blob'], arrays['dir_offsets'] = pack_strings(dirs)
+        arrays['dir_parent'] = numpy.array(parents, dtype='int64')
+        arrays['name_blob'] = numpy.frombuffer(bytes(collector.names), dtype='uint8')
+        arrays['name_offsets'] = numpy.array(collector.name_offsets, dtype='uint64')
+        return cls(arrays)
+
+    def save(self, pathname):
+        """Saves the table to an .npz file, or to a directory of .npy files"""
+
+        if pathname.endswith('.npz'):
+            numpy.savez(pathname, **self.arrays)
+            return
+
+        # One .npy file per array so that each one can be memory-mapped
+        os.makedirs(pathname, exist_ok=True)
+        for name, values in self.arrays.items():
+            numpy.save(os.path.join(pathname, f"{name}.npy"), values)
+
+    @classmethod
+    def load(cls, pathname, mmap=False):
+        """Loads a table saved by save(), memory-mapping a directory if requested"""
+
+        require_numpy()
+        if pathname.endswith('.npz'):
+            with numpy.load(pathname) as data:
+                return cls({name: data[name] for name in data.files})
+
+        mmap_mode = 'r' if mmap else None
+        return cls({name: numpy.load(os.path.join(pathname, f"{name}.npy"), mmap_mode=mmap_mode)
+                    for name in tuple(COLUMN_DTYPES) + TABLE_ARRAYS})
+
+    #-------------------------------------------------------------------------
+    # Paths
+    #-------------------------------------------------------------------------
+    @property
+    def root(self):
+        """Path of the scan root"""
+        return self.dir_path(0)
+
+    def dir_path(self, dir_index):
+        """Returns the path of a directory in the directory table"""
+        return unpack_string(self.arrays['dir_blob'], self.arrays['dir_offsets'], dir_index)
+
+    def dir_depths(self):
+        """Returns the number of ancestors of each directory in the directory table"""
+
+        parents = self.arrays['dir_parent']
+        depths = numpy.zeros(len(parents), dtype='int64')
+        ancestors = parents.copy()
+        while True:
+            has_ancestor = ancestors >= 0
+            if not has_ancestor.any():
+                return depths
+            depths += has_ancestor
+            ancestors[has_ancestor] = parents[ancestors[has_ancestor]]
+
+    def path(self, position):
+        """Returns the pathname of a file"""
+        name = unpack_string(self.arrays['name_blob'], self.arrays['name_offsets'], position)
+        return os.path.join(self.dir_path(int(self.dir_index[position])), name)
+
+    def paths(self, positions):
+        """Returns the pathnames of the files at the positions"""
+        return [self.path(int(position)) for position in positions]
+
+    #-------------------------------------------------------------------------
+    # Queries
+    #-------------------------------------------------------------------------
+    def bytes_per_owner(self):
+        """Returns a list of (uid, bytes) sorted from the largest total"""
+
+        uids, inverse = numpy.unique(self.uid, return_inverse=True)
+        totals = numpy.bincount(inverse, weights=self.size, minlength=len(uids))
+        order = numpy.argsort(totals)[::-1]
+        return [(int(uids[i]), int(totals[i])) for i in order]
+
+    def directory_totals(self, recursive=False):
+        """Returns a list of directory paths and an array of the bytes in each"""
+
+        dir_count = len(self.arrays['dir_offsets']) - 1
+        dirs = [self.dir_path(i) for i in range(dir_count)]
+        totals = numpy.bincount(self.dir_index, weights=self.size,
+                                minlength=dir_count).astype('int64')
+        if not recursive or dir_count == 0:
+            return dirs, totals
+
+        # Add the subtree totals into the parents one level at a time, from
+        # the deepest level up, so that each level is complete when it is added
+        parents = self.arrays['dir_parent']
+        depths = self.dir_depths()
+        order = numpy.argsort(depths, kind='stable')
+        starts = numpy.searchsorted(depths[order], numpy.arange(int(depths.max()) + 2))
+        for depth in range(int(depths.max()), 0, -1):
+            level = order[starts[depth]:starts[depth + 1]]
+            numpy.add.at(totals, parents[level], totals[level])
+        return dirs, totals
+
+    def largest_directories(self, count=10, recursive=False):
+        """Returns a list of (dirpath, bytes) for the largest directories"""
+
+        dirs, totals = self.directory_totals(recursive)
+        count = min(count, len(totals))
+        if count == 0:
+            return []
+        top = numpy.argpartition(totals, -count)[-count:]
+        top = top[numpy.argsort(totals[top])[::-1]]
+        return [(dirs[i], int(totals[i])) for i in top]
+
+    def world_writable(self):
+        """Returns the positions of world-writable files, excluding symbolic links"""
+
+        is_link = (self.mode & S_IFMT_MASK) == stat.S_IFLNK
+        return numpy.flatnonzero(((self.mode & stat.S_IWOTH) != 0) & ~is_link)
+
+    def age_histogram(self, bucket_days=AGE_BUCKET_DAYS, now_ns=None):
+        """Returns a list of (label, count) for file ages by modification time"""
+
+        if now_ns is None:
+            now_ns = time.time_ns()
+        edges = numpy.array(bucket_days, dtype='int64') * NS_PER_DAY
+        buckets = numpy.searchsorted(edges, now_ns - self.mtime_ns, side='right')
+        counts = numpy.bincount(buckets, minlength=len(edges) + 1)
+
+        labels = [f"<{bucket_days[0]}d"]
+        labels += [f"{low}-{high}d" for low, high in zip(bucket_days, bucket_days[1:])]
+        labels.append(f">={bucket_days[-1]}d")
+        return [(label, int(count)) for label, count in zip(labels, counts)]
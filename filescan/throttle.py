@@ -0,0 +1,178 @@
+#-----------------------------------------------------------------------------
+# throttle.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Pacing for scans on busy hosts.  The walkers report the number of
+# entries they stat'ed and the time it took after reading each directory,
+# and the Throttle sleeps as needed to hold the scan to a target rate of
+# stat operations per second.
+#
+# In adaptive mode, the Throttle also tracks the average latency of each
+# stat.  When it rises well above the lowest latency seen so far, the disk
+# is taken to be busy and the rate is halved; while latency stays low, the
+# rate grows back by a tenth per adjustment, up to the target.
+#
+# lower_priority() moves the whole process to the lowest CPU priority and
+# the idle I/O scheduling class, so the scan only uses the disk when no
+# other process is waiting for it.
+#-----------------------------------------------------------------------------
+"""throttle.py""" # for pylint
+
+import os
+import platform
+import subprocess
+import threading
+import time
+
+try:
+    import ctypes
+except ImportError:
+    ctypes = None
+
+# Seconds between rate adjustments in adaptive mode
+ADJUST_INTERVAL = 1.0
+
+# Weight of the newest sample in the average stat latency
+LATENCY_WEIGHT = 0.2
+
+# Adaptive rate used when no target is set and the first backoff happens
+# before any throughput was measured
+DEFAULT_RATE = 1000.0
+
+# ioprio_set() arguments for the idle I/O scheduling class
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+# ioprio_set() system call number by machine
+IOPRIO_SET_SYSCALLS = {
+    'x86_64': 251,
+    'i386': 289,
+    'i686': 289,
+    'aarch64': 30,
+    'armv7l': 314,
+    'ppc64le': 273,
+    'riscv64': 30,
+    's390x': 282,
+}
+
+
+#-----------------------------------------------------------------------------
+# Throttle
+#
+# Shared by all walker threads, so its state is guarded by a lock.  Sleeping
+# is done outside the lock.  max_rate is the target in stat operations per
+# second; without it, only adaptive mode slows the scan down, and the rate
+# it backs off to is derived from the measured throughput.
+#-----------------------------------------------------------------------------
+class Throttle:
+    """Paces a scan to a rate of stat operations"""
+
+    def __init__(self, max_rate=None, adaptive=False, latency_factor=2.0, min_rate=50.0):
+        self.max_rate = max_rate
+        self.adaptive = adaptive
+        self.latency_factor = latency_factor
+        self.min_rate = min_rate
+
+        self.rate = max_rate
+        self.latency = None
+        self.baseline = None
+        self.next_time = time.monotonic()
+        self.last_adjust = self.next_time
+        self.adjust_ops = 0
+        self.lock = threading.Lock()
+
+    def pace(self, ops, elapsed):
+        """Records a directory read and sleeps to hold the rate"""
+
+        if ops <= 0:
+            return
+
+        now = time.monotonic()
+        with self.lock:
+            if self.adaptive:
+                self.adjust(ops, elapsed, now)
+            if self.rate is None:
+                return
+
+            # Schedule from when the directory read started, so the time
+            # spent reading counts toward the interval
+            self.next_time = max(self.next_time, now - elapsed) + ops / self.rate
+            delay = self.next_time - now
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def adjust(self, ops, elapsed, now):
+        """Updates the stat latency and adapts the rate to it"""
+
+        sample = elapsed / ops
+        if self.latency is None:
+            self.latency = sample
+        else:
+            self.latency += LATENCY_WEIGHT * (sample - self.latency)
+        self.baseline = self.latency if self.baseline is None else min(self.baseline,
+                                                                       self.latency)
+        self.adjust_ops += ops
+
+        if now - self.last_adjust < ADJUST_INTERVAL:
+            return
+        throughput = self.adjust_ops / (now - self.last_adjust)
+        self.last_adjust = now
+        self.adjust_ops = 0
+
+        if self.latency > self.baseline * self.latency_factor:
+            # Back off from whichever is lower, the current rate or the throughput
+            current = throughput if self.rate is None else min(self.rate, throughput)
+            self.rate = max(self.min_rate, (current or DEFAULT_RATE) / 2)
+        elif self.rate is not None:
+            self.rate *= 1.1
+            if self.max_rate is not None:
+                self.rate = min(self.rate, self.max_rate)
+
+
+#-----------------------------------------------------------------------------
+# set_idle_io_priority()
+#
+# Moves the process to the idle I/O scheduling class with the ioprio_set()
+# system call, falling back to the ionice command.  Returns False if
+# neither is available.
+#-----------------------------------------------------------------------------
+def set_idle_io_priority():
+    """Lowers the I/O priority of the process to the idle class"""
+
+    number = IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if ctypes is not None and number is not None and os.name == 'posix':
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.syscall(number, IOPRIO_WHO_PROCESS, 0,
+                        IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) == 0:
+            return True
+
+    try:
+        subprocess.run(['ionice', '-c', '3', '-p', str(os.getpid())], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+#-----------------------------------------------------------------------------
+# lower_priority()
+#
+# Lowers the CPU and I/O priority of the scan.  On Linux both priorities
+# are per thread and inherited by new threads, so this must be called
+# before any walker or hashing threads are started.  Returns True if the
+# I/O priority was lowered.
+#-----------------------------------------------------------------------------
+def lower_priority():
+    """Runs the scan at the lowest CPU and I/O priority"""
+
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(19)
+        except OSError:
+            pass
+    return set_idle_io_priority()
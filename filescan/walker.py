@@ -0,0 +1,456 @@
+#-----------------------------------------------------------------------------
+# walker.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Directory walkers shared by the Linux and Windows file listers.  Every
+# walker yields a (pathname, lstat) tuple per file and takes the same
+# filter, exclusion and limit hooks, so the listers only differ in how
+# they enrich each file with platform metadata (see enrich.py).
+#-----------------------------------------------------------------------------
+"""walker.py""" # for pylint
+
+import concurrent.futures
+import os
+import queue
+import threading
+import time
+
+from filescan import mounts
+
+
+#-----------------------------------------------------------------------------
+# ScanLimits
+#
+# Filesystem boundary and duplicate directory checks shared by the walkers.
+# Every directory is checked before it is descended into:
+#
+#   - With one_filesystem, directories on a different device than the root
+#     are skipped, the same as find -xdev.
+#   - Directories on a device in excluded_devs (for example, the pseudo
+#     filesystems from the mount table) are skipped.
+#   - With dedup, a directory whose (st_dev, st_ino) was already visited is
+#     skipped, so bind mounts are only walked once.  With several workers,
+#     which of the paths is walked is not deterministic.
+#
+# The visited set is shared by the worker threads, so it is guarded by a
+# lock.  Hard-linked files are deduplicated separately by dedup_files().
+# Entries without an inode number (DirEntry stat results on Windows) are
+# never treated as duplicates.
+#-----------------------------------------------------------------------------
+class ScanLimits:
+    """Filesystem boundary and duplicate checks for the walkers"""
+
+    def __init__(self, dirname, one_filesystem=False, excluded_devs=(), dedup=False):
+        root_stat = os.stat(dirname)
+        self.root_dev = root_stat.st_dev if one_filesystem else None
+        self.excluded_devs = frozenset(excluded_devs)
+        self.visited = {(root_stat.st_dev, root_stat.st_ino)} if dedup else None
+        self.lock = threading.Lock()
+
+    def allow_dir(self, dir_stat):
+        """Returns True if the walker should descend into the directory"""
+
+        if self.root_dev is not None and dir_stat.st_dev != self.root_dev:
+            return False
+        if dir_stat.st_dev in self.excluded_devs:
+            return False
+        if self.visited is not None and dir_stat.st_ino:
+            key = (dir_stat.st_dev, dir_stat.st_ino)
+            with self.lock:
+                if key in self.visited:
+                    return False
+                self.visited.add(key)
+        return True
+
+
+#-----------------------------------------------------------------------------
+# make_limits()
+#
+# Returns the ScanLimits for the options, or None when no limits are needed
+# so the walkers skip the extra directory stat.
+#-----------------------------------------------------------------------------
+def make_limits(dirname, one_filesystem=False, exclude_fstypes=(), dedup=False):
+    """Builds the ScanLimits for the walker options"""
+
+    if not (one_filesystem or exclude_fstypes or dedup):
+        return None
+
+    excluded_devs = mounts.excluded_devices(exclude_fstypes) if exclude_fstypes else ()
+
+    # A root that cannot be stat'ed yields no files, the same as without limits
+    try:
+        return ScanLimits(dirname, one_filesystem, excluded_devs, dedup)
+    except OSError:
+        return None
+
+
+#-----------------------------------------------------------------------------
+# allow_subdir()
+#-----------------------------------------------------------------------------
+def allow_subdir(entry, limits):
+    """Checks a subdirectory entry against the scan limits"""
+
+    if limits is None:
+        return True
+    try:
+        return limits.allow_dir(entry.stat(follow_symlinks=False))
+    except OSError:
+        return False
+
+
+#-----------------------------------------------------------------------------
+# dedup_files()
+#
+# Drops every name of a hard-linked file after the first one.  Only files
+# with more than one link are remembered, so the set stays small.  This runs
+# on the consuming side of the walker, so the name that is reported is the
+# first one in output order.
+#-----------------------------------------------------------------------------
+def dedup_files(file_iter):
+    """Yields each (pathname, stat) once per inode"""
+
+    seen = set()
+    for pathname, file_stat in file_iter:
+        if file_stat.st_nlink > 1 and file_stat.st_ino:
+            key = (file_stat.st_dev, file_stat.st_ino)
+            if key in seen:
+                continue
+            seen.add(key)
+        yield pathname, file_stat
+
+
+#-----------------------------------------------------------------------------
+# scan_directory()
+#
+# Reads a single directory with os.scandir() and returns a list of
+# (pathname, stat) tuples for every non-directory entry along with the list
+# of subdirectories to descend into.  The stat result comes from the
+# DirEntry, which caches it, so each file is only resolved and stat'ed once.
+# Symbolic links to directories are neither followed nor listed, the same
+# as os.walk().
+#
+# Entries matching the exclude function are skipped before they are stat'ed,
+# so excluded subtrees are never opened.  Files that do not match the filter
+# function are dropped here, before any owner or group names are resolved.
+# When limits are provided, each subdirectory is stat'ed and checked against
+# them before it is descended into.  When a throttle is provided, it is told
+# how many entries were read and how long it took, and may sleep.
+#-----------------------------------------------------------------------------
+def scan_directory(dirpath, file_filter=None, exclude=None, limits=None, throttle=None):
+    """Returns the files and subdirectories of a single directory"""
+
+    files = []
+    subdirs = []
+    entry_count = 0
+    started = time.perf_counter()
+
+    # Skip directories that cannot be read, the same as os.walk()
+    try:
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                entry_count += 1
+                if exclude is not None and exclude(entry.path, entry.name):
+                    continue
+
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    # Only descend into real directories
+                    if not entry.is_symlink() and allow_subdir(entry, limits):
+                        subdirs.append(entry.path)
+                    continue
+
+                try:
+                    file_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if file_filter is None or file_filter(entry.path, entry.name, file_stat):
+                    files.append((entry.path, file_stat))
+
+    except OSError:
+        pass
+
+    if throttle is not None:
+        throttle.pace(entry_count + 1, time.perf_counter() - started)
+    return files, subdirs
+
+
+#-----------------------------------------------------------------------------
+# scan_files()
+#
+# Walks the directory tree and yields a (pathname, stat) tuple for every
+# file.  Directories are visited in the same top-down order as os.walk().
+#-----------------------------------------------------------------------------
+def scan_files(dirname, file_filter=None, exclude=None, limits=None, throttle=None):
+    """Yields the pathname and lstat result of every file under dirname"""
+
+    pending_dirs = [dirname]
+    while pending_dirs:
+        files, subdirs = scan_directory(pending_dirs.pop(), file_filter, exclude, limits,
+                                        throttle)
+        yield from files
+
+        # Push the subdirectories in reverse so they are popped in order
+        pending_dirs.extend(reversed(subdirs))
+
+
+#-----------------------------------------------------------------------------
+# scan_frontier()
+#
+# Walks the tree from a stack of pending directories in the same order as
+# scan_files(), yielding the list of files of each directory.  The stack is
+# updated in place, so between two batches it holds exactly the directories
+# whose files have not been yielded yet, which is what a checkpoint saves
+# to resume the scan later (see checkpoint.py).
+#-----------------------------------------------------------------------------
+def scan_frontier(pending_dirs, file_filter=None, exclude=None, limits=None, throttle=None):
+    """Yields the files of each directory, keeping the pending stack current"""
+
+    while pending_dirs:
+        files, subdirs = scan_directory(pending_dirs[-1], file_filter, exclude, limits,
+                                        throttle)
+        pending_dirs.pop()
+        pending_dirs.extend(reversed(subdirs))
+        yield files
+
+
+#-----------------------------------------------------------------------------
+# scan_files_parallel()
+#
+# Walks the directory tree with a pool of worker threads.  Every directory
+# that is discovered is placed on the pool's shared work queue, and idle
+# workers pull the next directory from it, so all workers stay busy while
+# others wait on slow network or FUSE round-trips.  Directory reads and
+# stat calls release the GIL, so the workers overlap their I/O.
+#
+# With ordered=False, the files of each directory are yielded as soon as the
+# directory is finished.  With ordered=True, the files are yielded in the
+# same order as scan_files(), while the workers keep reading ahead.
+#-----------------------------------------------------------------------------
+def scan_files_parallel(dirname, workers=8, ordered=False, file_filter=None, exclude=None,
+                        limits=None, throttle=None):
+    """Yields the pathname and lstat result of every file using threads"""
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(dirpath):
+            return executor.submit(scan_directory, dirpath, file_filter, exclude, limits,
+                                   throttle)
+
+        if ordered:
+            # Wait on the directories in top-down order, the same as scan_files()
+            pending_dirs = [submit(dirname)]
+            while pending_dirs:
+                files, subdirs = pending_dirs.pop().result()
+                yield from files
+
+                # Submit in order so the workers read ahead in traversal order
+                futures = [submit(subdir) for subdir in subdirs]
+                pending_dirs.extend(reversed(futures))
+
+        else:
+            # Completed directories are posted to a queue as the workers finish them
+            done_dirs = queue.Queue()
+            submit(dirname).add_done_callback(done_dirs.put)
+            outstanding = 1
+            while outstanding:
+                files, subdirs = done_dirs.get().result()
+                outstanding -= 1
+
+                for subdir in subdirs:
+                    submit(subdir).add_done_callback(done_dirs.put)
+                outstanding += len(subdirs)
+
+                yield from files
+
+
+#-----------------------------------------------------------------------------
+# read_directory_fd()
+#
+# Reads the directory open on dir_fd.  Entries are stat'ed relative to the
+# directory descriptor, so the kernel never resolves the full path again,
+# and pathnames are only built as strings for reporting.  Returns the files
+# and the names of the subdirectories to descend into, with the same
+# filtering as scan_directory().
+#-----------------------------------------------------------------------------
+def read_directory_fd(dirpath, dir_fd, file_filter=None, exclude=None, limits=None,
+                      throttle=None):
+    """Returns the files and subdirectory names of an open directory"""
+
+    files = []
+    subdirs = []
+    entry_count = 0
+    started = time.perf_counter()
+
+    try:
+        with os.scandir(dir_fd) as entries:
+            for entry in entries:
+                entry_count += 1
+                pathname = os.path.join(dirpath, entry.name)
+                if exclude is not None and exclude(pathname, entry.name):
+                    continue
+
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    # Only descend into real directories
+                    if not entry.is_symlink() and allow_subdir(entry, limits):
+                        subdirs.append(entry.name)
+                    continue
+
+                try:
+                    file_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+
+                if file_filter is None or file_filter(pathname, entry.name, file_stat):
+                    files.append((pathname, file_stat))
+
+    except OSError:
+        pass
+
+    if throttle is not None:
+        throttle.pace(entry_count + 1, time.perf_counter() - started)
+    return files, subdirs
+
+
+#-----------------------------------------------------------------------------
+# scan_files_fd()
+#
+# Walks the directory tree in the style of os.fwalk().  Each directory is
+# opened relative to its parent's descriptor with O_NOFOLLOW, so a
+# directory renamed or replaced by a symbolic link during the scan cannot
+# redirect the walk, and its entries are stat'ed relative to its own
+# descriptor.  Files are yielded in the same order as scan_files().
+#
+# A descriptor is only held for directories that still have subdirectories
+# left to visit, and at most max_fds are held at once.  When the limit is
+# reached, the descriptor of the shallowest directory is closed.  If it is
+# needed again, it is reopened by path and checked against the device and
+# inode recorded when it was first opened; the rest of that directory is
+# skipped if it no longer matches.
+#-----------------------------------------------------------------------------
+def scan_files_fd(dirname, file_filter=None, exclude=None, limits=None, max_fds=64,
+                  throttle=None):
+    """Yields the pathname and lstat result of every file using directory descriptors"""
+
+    open_flags = os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC
+    max_fds = max(max_fds, 2)
+
+    # Each frame is [pathname, fd or None, st_dev, st_ino, subdirectory names]
+    frames = []
+
+    def release_fd(keep):
+        # Close the shallowest descriptor that is not needed right now
+        for frame in frames:
+            if frame[1] is not None and frame is not keep:
+                os.close(frame[1])
+                frame[1] = None
+                return
+
+    def open_count():
+        return sum(1 for frame in frames if frame[1] is not None)
+
+    def frame_fd(frame):
+        if frame[1] is None:
+            if open_count() >= max_fds:
+                release_fd(frame)
+            try:
+                dir_fd = os.open(frame[0], open_flags)
+            except OSError:
+                return None
+            dir_stat = os.fstat(dir_fd)
+            if (dir_stat.st_dev, dir_stat.st_ino) != (frame[2], frame[3]):
+                os.close(dir_fd)
+                frame[4].clear()
+                return None
+            frame[1] = dir_fd
+        return frame[1]
+
+    def enter(dirpath, dir_fd):
+        files, subdirs = read_directory_fd(dirpath, dir_fd, file_filter, exclude, limits,
+                                           throttle)
+        if subdirs:
+            dir_stat = os.fstat(dir_fd)
+            subdirs.reverse()
+            frames.append([dirpath, dir_fd, dir_stat.st_dev, dir_stat.st_ino, subdirs])
+        else:
+            os.close(dir_fd)
+        return files
+
+    try:
+        # The root may itself be a symbolic link, which os.walk() also follows
+        try:
+            root_fd = os.open(dirname, open_flags)
+        except OSError:
+            return
+        yield from enter(dirname, root_fd)
+
+        while frames:
+            frame = frames[-1]
+            if not frame[4]:
+                if frame[1] is not None:
+                    os.close(frame[1])
+                frames.pop()
+                continue
+
+            name = frame[4].pop()
+            parent_fd = frame_fd(frame)
+            if parent_fd is None:
+                continue
+
+            if open_count() >= max_fds:
+                release_fd(frame)
+            try:
+                child_fd = os.open(name, open_flags | os.O_NOFOLLOW, dir_fd=parent_fd)
+            except OSError:
+                continue
+            yield from enter(os.path.join(frame[0], name), child_fd)
+
+    finally:
+        for frame in frames:
+            if frame[1] is not None:
+                os.close(frame[1])
+
+
+#-----------------------------------------------------------------------------
+# walk_files()
+#
+# Returns the serial walker, the threaded walker when more than one worker
+# is requested, or the descriptor-relative walker when fd_relative is set.
+# See ScanLimits for one_filesystem, exclude_fstypes and dedup, and
+# throttle.py for throttle.
+#-----------------------------------------------------------------------------
+def walk_files(dirname, workers=1, ordered=False, file_filter=None, exclude=None,
+               fd_relative=False, one_filesystem=False, exclude_fstypes=(), dedup=False,
+               throttle=None):
+    """Returns an iterator of (pathname, stat) tuples for the tree"""
+
+    limits = make_limits(dirname, one_filesystem, exclude_fstypes, dedup)
+
+    if fd_relative:
+        if workers > 1:
+            raise ValueError("The descriptor-relative walker does not support several workers")
+        if os.scandir not in os.supports_fd:
+            raise ValueError("The descriptor-relative walker is not supported on this platform")
+        file_iter = scan_files_fd(dirname, file_filter, exclude, limits, throttle=throttle)
+    elif workers > 1:
+        file_iter = scan_files_parallel(dirname, workers, ordered, file_filter, exclude, limits,
+                                        throttle)
+    else:
+        file_iter = scan_files(dirname, file_filter, exclude, limits, throttle)
+
+    # Report hard-linked files only once when deduplicating
+    if dedup:
+        file_iter = dedup_files(file_iter)
+    return file_iter
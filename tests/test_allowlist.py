@@ -0,0 +1,76 @@
+#-----------------------------------------------------------------------------
+# test_allowlist.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the application allowlist of manage_applications.py.
+#-----------------------------------------------------------------------------
+"""test_allowlist.py""" # for pylint
+
+import os
+import re
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Windows'))
+# pylint: disable=wrong-import-position
+import manage_applications
+from manage_applications import AppAllowList
+
+
+def test_substrings_are_case_insensitive():
+    """Literal entries match anywhere in the name, ignoring case"""
+
+    allowlist = AppAllowList(["Microsoft Edge", "Microsoft Visual C++", "7-Zip"])
+
+    assert allowlist.is_allowed("microsoft edge update")
+    assert allowlist.is_allowed("Microsoft Visual C++ 2015 Redistributable")
+    assert allowlist.is_allowed("7-ZIP 23.01 (x64)")
+    assert not allowlist.is_allowed("Microsoft Teams")
+    assert not allowlist.is_allowed("7Zip")
+
+
+def test_trie_pattern_matches_the_literals():
+    """The trie pattern matches exactly the names containing a literal"""
+
+    literals = ["ab", "abc", "abd", "b.c", "x"]
+    regex = re.compile(manage_applications.literal_trie_pattern(literals))
+
+    for name in ("ab", "zabd", "b.c", "axe"):
+        assert regex.search(name)
+    for name in ("a", "bc", "bzc", "B.C"):
+        assert not regex.search(name)
+
+
+def test_long_entry():
+    """An entry far longer than the recursion limit is matched"""
+
+    entry = "x" * (sys.getrecursionlimit() * 5)
+    allowlist = AppAllowList([entry, "Other"])
+
+    assert allowlist.is_allowed("Y" + entry.upper())
+    assert not allowlist.is_allowed(entry[1:])
+
+
+def test_deeply_branching_entries():
+    """Entries branching too deeply to nest fall back to an alternation"""
+
+    entries = ["a" * i + "b" for i in range(1, manage_applications.ALLOWLIST_TRIE_MAX_NESTING * 5)]
+    allowlist = AppAllowList(entries)
+
+    assert allowlist.is_allowed("z" + "a" * 300 + "b")
+    assert not allowlist.is_allowed("a" * 1000)
+
+
+def test_invalid_regular_expression(tmp_path):
+    """Invalid regular expressions are reported with their line"""
+
+    pathname = tmp_path / 'allowed_apps.txt'
+    pathname.write_text("# Allowed\n\nre:^Microsoft\nre:(unclosed\n", encoding='utf-8')
+
+    with pytest.raises(ValueError, match=r"allowed_apps\.txt:4: Invalid regular expression"):
+        AppAllowList.from_file(pathname)
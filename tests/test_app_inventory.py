@@ -0,0 +1,161 @@
+#-----------------------------------------------------------------------------
+# test_app_inventory.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the application inventory of manage_applications.py against an
+# in-memory registry filled with thousands of synthetic Uninstall subkeys.
+# The single-pass read must find the same applications as querying each
+# value separately, the way the inventory was read before.
+#-----------------------------------------------------------------------------
+"""test_app_inventory.py""" # for pylint
+
+import os
+import random
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Windows'))
+# pylint: disable=wrong-import-position
+import manage_applications
+from manage_applications import APPKEY1, APPKEY2
+from registry_backend import REG_DWORD, REG_EXPAND_SZ, MemoryRegistry
+
+MACHINE_APPS = 3000
+USERS = 10
+USER_APPS = 100
+
+
+#-----------------------------------------------------------------------------
+# add_apps()
+#
+# Adds synthetic Uninstall subkeys: MsiExec and unquoted Program Files
+# commands, subkeys without a display name or uninstall command, values
+# that are not strings, names in other cases and unrelated values.
+#-----------------------------------------------------------------------------
+def add_apps(registry, key_path, count, rng):
+    """Adds synthetic applications under an Uninstall key"""
+
+    registry.add_key(key_path)
+    for i in range(count):
+        guid = f"{{{rng.getrandbits(128):032X}}}"
+        values = {'DisplayVersion': f"1.{i}", 'Publisher': rng.choice(("Contoso", "Fabrikam")),
+                  'EstimatedSize': i, 'NoModify': 1}
+        if rng.random() < 0.6:
+            values['UninstallString'] = f"MsiExec.exe /X{guid}"
+        elif rng.random() < 0.9:
+            values['uninstallstring'] = (f"C:\\Program Files\\App {i}\\uninstall.exe", REG_EXPAND_SZ)
+            values['QuietUninstallString'] = f"C:\\Program Files\\App {i}\\uninstall.exe /S"
+        if rng.random() < 0.95:
+            values['DisplayName'] = f"Application {i % (count // 2)}"
+        if rng.random() < 0.02:
+            values['InstallDate'] = (20240101, REG_DWORD)
+        elif rng.random() < 0.8:
+            values['InstallDate'] = "20240101"
+        registry.add_key(f"{key_path}\\{guid}", values)
+
+
+@pytest.fixture(name='registry', scope='module')
+def fixture_registry():
+    """Synthetic registry with machine and per-user applications"""
+
+    rng = random.Random(1)
+    registry = MemoryRegistry()
+    add_apps(registry, f"HKEY_LOCAL_MACHINE\\{APPKEY1}", MACHINE_APPS, rng)
+    add_apps(registry, f"HKEY_LOCAL_MACHINE\\{APPKEY2}", MACHINE_APPS // 3, rng)
+    for i in range(USERS):
+        sid = f"S-1-5-21-1004336348-1177238915-682003330-{1001 + i}"
+        add_apps(registry, f"HKEY_USERS\\{sid}\\{APPKEY1}", USER_APPS, rng)
+    registry.add_key("HKEY_USERS\\S-1-5-18\\Software")
+    return registry
+
+
+#-----------------------------------------------------------------------------
+# legacy_read_apps()
+#
+# Reads the applications with one QueryValueEx per field, leaving the
+# fields that are missing or are not strings empty.
+#-----------------------------------------------------------------------------
+def legacy_read_apps(key, backend):
+    """Reads applications with one query per value"""
+
+    apps = []
+    for subkey_name in backend.subkey_names(key):
+        with backend.open_key(key, subkey_name) as subkey_key:
+            app = {}
+            for field, value_name in manage_applications.APP_VALUES.items():
+                data = manage_applications.reg_query_value(subkey_key, value_name, backend)
+                app[field] = data if isinstance(data, str) else ""
+        if app['Name'] != "" and app['Uninstall'] != "":
+            app['Uninstall'] = manage_applications.validate_command_pathname(app['Uninstall'])
+            app['QuietUninstall'] = manage_applications.validate_command_pathname(
+                app['QuietUninstall'])
+            apps.append(app)
+    return apps
+
+
+def legacy_inventory(registry):
+    """Reads the whole inventory with the legacy queries"""
+
+    machine_apps = []
+    for sub_key in (APPKEY1, APPKEY2):
+        with registry.open_key(registry.root('HKEY_LOCAL_MACHINE'), sub_key) as key:
+            machine_apps.extend(legacy_read_apps(key, registry))
+
+    user_apps = []
+    users_key = registry.root('HKEY_USERS')
+    for user_sid in registry.subkey_names(users_key):
+        for sub_key in (APPKEY1, APPKEY2):
+            try:
+                with registry.open_key(users_key, f"{user_sid}\\{sub_key}") as key:
+                    user_apps.extend(legacy_read_apps(key, registry))
+            except OSError:
+                pass
+
+    return manage_applications.merge_inventory(machine_apps, user_apps)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_inventory_matches_legacy_queries(registry, workers):
+    """The single-pass inventory finds the same applications as the legacy queries"""
+
+    expected = legacy_inventory(registry)
+    inventory = manage_applications.read_inventory(registry, workers)
+
+    assert len(expected) > MACHINE_APPS // 2
+    assert inventory == expected
+
+
+def test_single_pass_reads_each_subkey_once(registry):
+    """Each subkey is opened once and each of its values enumerated once"""
+
+    machine_key = registry.root('HKEY_LOCAL_MACHINE')
+    with registry.open_key(machine_key, APPKEY1) as key:
+        subkeys = list(key.subkeys.values())
+        registry.calls.clear()
+        manage_applications.read_apps_from_regkey(key, registry)
+
+    assert registry.calls == {
+        'QueryInfoKey': 1 + len(subkeys), 'EnumKey': len(subkeys), 'OpenKey': len(subkeys),
+        'EnumValue': sum(len(subkey.values) for subkey in subkeys)}
+
+
+def test_cached_inventory_matches(registry, tmp_path):
+    """The cached inventory matches, and a second run opens no subkeys"""
+
+    expected = manage_applications.read_inventory(registry)
+    pathname = str(tmp_path / 'inventory.json')
+
+    cache = manage_applications.InventoryCache(pathname).load()
+    assert manage_applications.read_inventory(registry, cache=cache) == expected
+    cache.save()
+
+    registry.calls.clear()
+    cache = manage_applications.InventoryCache(pathname).load()
+    assert manage_applications.read_inventory(registry, cache=cache) == expected
+    assert cache.read == 0
+    assert registry.calls['EnumValue'] == 0
@@ -0,0 +1,108 @@
+#-----------------------------------------------------------------------------
+# test_checkpoint.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the resumable scans in filescan/checkpoint.py.  A scan is
+# interrupted part way through, then resumed from its checkpoint, and the
+# output must be the same as an uninterrupted scan.
+#-----------------------------------------------------------------------------
+"""test_checkpoint.py""" # for pylint
+
+import concurrent.futures
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from filescan import checkpoint, enrich, hashing
+
+FIELDS = enrich.PosixEnricher.hashed_fields
+
+
+class Interrupted(Exception):
+    """Raised to stop a scan part way through"""
+
+
+#-----------------------------------------------------------------------------
+# InterruptingEnricher
+#
+# Enricher that stops the scan after a number of records, as if the scan
+# was killed.
+#-----------------------------------------------------------------------------
+class InterruptingEnricher(enrich.PosixEnricher):
+    """Enricher raising Interrupted after limit records"""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+
+    def record(self, pathname, file_stat, digest=None):
+        if self.limit == 0:
+            raise Interrupted
+        self.limit -= 1
+        return super().record(pathname, file_stat, digest)
+
+
+def make_tree(root):
+    """Generates a tree of directories with a few files each"""
+
+    for i in range(8):
+        dirpath = os.path.join(root, f"dir{i}", f"sub{i % 3}")
+        os.makedirs(dirpath)
+        for j in range(i % 4):
+            with open(os.path.join(dirpath, f"file{j}"), 'w', encoding='utf-8') as test_file:
+                test_file.write(f"{i} {j}")
+        if i % 2:
+            with open(os.path.join(root, f"dir{i}", 'top'), 'w', encoding='utf-8') as test_file:
+                test_file.write(str(i))
+
+
+def scan(root, output, checkpoint_pathname, enricher):
+    """Runs a hashed, checkpointed scan with a checkpoint after every directory"""
+    return checkpoint.checkpointed_scan(
+        str(root), enricher, checkpoint.ScanCheckpoint(str(checkpoint_pathname), 0), 'ndjson',
+        FIELDS, str(output), hashing.FileHasher('sha256', workers=2))
+
+
+@pytest.mark.parametrize('limit', [0, 1, 3, 7, 10])
+def test_resumed_scan_matches_full_scan(tmp_path, limit):
+    """A scan interrupted after limit files resumes without duplicates or gaps"""
+
+    root = tmp_path / 'tree'
+    make_tree(root)
+    expected = tmp_path / 'expected.ndjson'
+    file_count = scan(root, expected, tmp_path / 'expected.json', enrich.PosixEnricher())
+
+    output = tmp_path / 'output.ndjson'
+    checkpoint_pathname = tmp_path / 'checkpoint.json'
+    with pytest.raises(Interrupted):
+        scan(root, output, checkpoint_pathname, InterruptingEnricher(limit))
+
+    assert scan(root, output, checkpoint_pathname, enrich.PosixEnricher()) == file_count
+    assert output.read_text(encoding='utf-8') == expected.read_text(encoding='utf-8')
+    assert not checkpoint_pathname.exists()
+
+
+def test_one_hashing_pool_per_scan(tmp_path, monkeypatch):
+    """The files of every directory are hashed by the same thread pool"""
+
+    root = tmp_path / 'tree'
+    make_tree(root)
+    pools = []
+
+    class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+        """Thread pool recording its creation"""
+        def __init__(self, *args, **kwargs):
+            pools.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(concurrent.futures, 'ThreadPoolExecutor', CountingExecutor)
+    scan(root, tmp_path / 'output.ndjson', tmp_path / 'checkpoint.json', enrich.PosixEnricher())
+
+    assert len(pools) == 1
@@ -0,0 +1,118 @@
+#-----------------------------------------------------------------------------
+# test_diff.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of reading and comparing scan outputs in filescan/diff.py: the
+# format detection, the text layouts, which have no header, and the
+# comparison of outputs written in different formats.
+#-----------------------------------------------------------------------------
+"""test_diff.py""" # for pylint
+
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from filescan import diff, enrich, sinks
+
+DIGEST = 'a3' * 32
+
+# One record of each lister layout, by fields
+LAYOUT_RECORDS = {
+    enrich.WindowsEnricher.base_fields: ('C:\\a b\\file', '-rw-rw-rw-', 12),
+    enrich.WindowsEnricher.attribute_fields: ('C:\\file', '-r--r--r--', 12, 'RA'),
+    enrich.WindowsEnricher.base_fields + ('digest',): ('C:\\file', '-rw-rw-rw-', 12, DIGEST),
+    enrich.PosixEnricher.fields: ('/a b/file', '-rw-r--r--', 'root', 'wheel', 12),
+    enrich.WindowsEnricher.attribute_fields + ('digest',):
+        ('C:\\file', '-rw-rw-rw-', 12, 'HSA', DIGEST),
+    enrich.PosixEnricher.hashed_fields: ('/file', '-rw-r--r--', 'root', 'root', 12, DIGEST),
+}
+
+
+def write_scan(pathname, output_format, fields, records):
+    """Writes records to a scan output"""
+    with sinks.open_sink(output_format, fields, str(pathname)) as sink:
+        for record in records:
+            sink.write(record)
+
+
+def read_all(pathname, output_format=None):
+    """Reads the fields and records of a scan output"""
+    fields, records = diff.read_scan(str(pathname), output_format)
+    return fields, list(records)
+
+
+@pytest.mark.parametrize('fields', list(LAYOUT_RECORDS))
+def test_text_layouts_are_named(tmp_path, fields):
+    """Every text layout of the listers gets its own field names"""
+
+    pathname = tmp_path / 'scan.txt'
+    write_scan(pathname, 'text', fields, [LAYOUT_RECORDS[fields]])
+
+    assert read_all(pathname) == (fields, [tuple(map(str, LAYOUT_RECORDS[fields]))])
+
+
+def test_ambiguous_text_layout_reads_on(tmp_path):
+    """An empty attributes or digest field is settled by the next records"""
+
+    fields = enrich.WindowsEnricher.base_fields + ('digest',)
+    records = [('C:\\link', '-rw-rw-rw-', 0, '')] * 3 + [('C:\\file', '-rw-rw-rw-', 5, DIGEST)]
+    pathname = tmp_path / 'scan.txt'
+    write_scan(pathname, 'text', fields, records)
+
+    assert read_all(pathname) == (fields, [tuple(map(str, record)) for record in records])
+
+
+@pytest.mark.parametrize('first_path', ['{draft}.txt', 'path,old', '{"a": 1}'])
+def test_text_listing_that_looks_like_another_format(tmp_path, first_path):
+    """A text listing whose first path looks like NDJSON or CSV is read as text"""
+
+    fields = enrich.PosixEnricher.fields
+    records = [(first_path, '-rw-r--r--', 'root', 'root', 1),
+               ('/b', '-rw-r--r--', 'root', 'root', 2)]
+    pathname = tmp_path / 'scan.txt'
+    write_scan(pathname, 'text', fields, records)
+
+    assert read_all(pathname) == (fields, [tuple(map(str, record)) for record in records])
+
+
+def test_format_override(tmp_path):
+    """An explicit format is not detected, and must parse"""
+
+    fields = enrich.PosixEnricher.fields
+    record = ('path,old', '-rw-r--r--', 'root', 'root', 1)
+    pathname = tmp_path / 'scan.txt'
+    write_scan(pathname, 'text', fields, [record])
+
+    assert read_all(pathname, 'text') == (fields, [tuple(map(str, record))])
+    with pytest.raises(ValueError, match="CSV"):
+        read_all(pathname, 'csv')
+
+
+@pytest.mark.parametrize('old_format, new_format', [('text', 'ndjson'), ('csv', 'binary'),
+                                                    ('ndjson', 'text')])
+def test_compare_scans_across_formats(tmp_path, old_format, new_format):
+    """Outputs in different formats compare by value"""
+
+    fields = enrich.WindowsEnricher.attribute_fields
+    old = [('C:\\a', '-rw-rw-rw-', 1, 'A'), ('C:\\b', '-rw-rw-rw-', 2, ''),
+           ('C:\\c', '-rw-rw-rw-', 3, 'H')]
+    new = [('C:\\a', '-rw-rw-rw-', 1, 'A'), ('C:\\b', '-r--r--r--', 2, 'R'),
+           ('C:\\d', '-rw-rw-rw-', 4, '')]
+    write_scan(tmp_path / 'old', old_format, fields, old)
+    write_scan(tmp_path / 'new', new_format, fields, new)
+
+    diff_fields, entries = diff.compare_scans(str(tmp_path / 'old'), str(tmp_path / 'new'),
+                                              chunk_size=2, temp_dir=str(tmp_path))
+
+    assert diff_fields == diff.DIFF_PREFIX_FIELDS + fields + diff.DIFF_SUFFIX_FIELDS
+    assert [(entry[0], entry[1], entry[-1]) for entry in entries] == [
+        ('modified', 'C:\\b', 'permissions,attributes'),
+        ('removed', 'C:\\c', ''),
+        ('added', 'C:\\d', '')]
@@ -0,0 +1,80 @@
+#-----------------------------------------------------------------------------
+# test_filters.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the filter expressions in filescan/filters.py, evaluated against
+# synthetic stat results.
+#-----------------------------------------------------------------------------
+"""test_filters.py""" # for pylint
+
+import datetime
+import os
+import sys
+import types
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from filescan import filters
+
+
+def local_ns(*args):
+    """Returns the nanoseconds since the epoch of a local date and time"""
+    return filters.timestamp_ns(datetime.datetime(*args))
+
+
+def matches(expression, mtime_ns):
+    """Evaluates a filter against a file with the modification time"""
+    file_stat = types.SimpleNamespace(st_mode=0o100644, st_size=0, st_uid=0, st_gid=0,
+                                      st_mtime_ns=mtime_ns)
+    return filters.compile_filter(expression)('/tmp/file', 'file', file_stat)
+
+
+@pytest.mark.parametrize('mtime_ns, expected', [
+    (local_ns(2024, 4, 30, 23, 59, 59, 999999), False),
+    (local_ns(2024, 5, 1), True),
+    (local_ns(2024, 5, 1, 12, 30), True),
+    (local_ns(2024, 5, 1, 23, 59, 59, 999999) + 999, True),
+    (local_ns(2024, 5, 2), False),
+])
+def test_mtime_equals_date_covers_the_day(mtime_ns, expected):
+    """mtime=DATE matches from midnight up to the next midnight"""
+    assert matches('mtime=2024-05-01', mtime_ns) is expected
+
+
+def test_mtime_equals_time_covers_the_second():
+    """mtime=DATETIME matches its whole second"""
+
+    assert matches('mtime=2024-05-01T10:00:00', local_ns(2024, 5, 1, 10, 0, 0, 500000))
+    assert not matches('mtime=2024-05-01T10:00:00', local_ns(2024, 5, 1, 10, 0, 1))
+
+
+def test_mtime_range_covers_its_last_day():
+    """mtime=DATE..DATE runs to the end of the last date"""
+
+    assert matches('mtime=2024-05-01..2024-05-31', local_ns(2024, 5, 31, 18))
+    assert not matches('mtime=2024-05-01..2024-05-31', local_ns(2024, 6, 1))
+    assert not matches('mtime=2024-05-01..2024-05-31', local_ns(2024, 4, 30, 18))
+
+
+def test_mtime_comparisons_start_at_midnight():
+    """The other comparisons take a date as its midnight"""
+
+    assert matches('mtime>2024-05-01', local_ns(2024, 5, 1, 0, 0, 1))
+    assert matches('mtime>=2024-05-01', local_ns(2024, 5, 1))
+    assert not matches('mtime<2024-05-01', local_ns(2024, 5, 1))
+    assert matches('mtime<2024-05-01', local_ns(2024, 4, 30, 23))
+
+
+def test_invalid_date():
+    """Dates that cannot be parsed are rejected"""
+
+    with pytest.raises(ValueError, match="Invalid date"):
+        filters.compile_filter('mtime=2024-13-01')
+    with pytest.raises(ValueError, match="Invalid date"):
+        filters.compile_filter('mtime=2024-05-01..soon')
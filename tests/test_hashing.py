@@ -0,0 +1,70 @@
+#-----------------------------------------------------------------------------
+# test_hashing.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the content hashing and digest cache in filescan/hashing.py.
+#-----------------------------------------------------------------------------
+"""test_hashing.py""" # for pylint
+
+import hashlib
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from filescan import hashing
+
+# Modification time well outside the racy window, in nanoseconds
+OLD_MTIME_NS = 1_700_000_000 * 1_000_000_000
+
+
+def write_file(pathname, data):
+    """Writes a file with an old modification time"""
+    with open(pathname, 'wb') as test_file:
+        test_file.write(data)
+    os.utime(pathname, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+
+
+def hash_with_cache(tmp_path, pathname):
+    """Hashes one file through a digest cache and returns the digest and the cached digest"""
+
+    file_stat = os.lstat(pathname)
+    with hashing.HashCache(str(tmp_path / 'digests.db')) as cache:
+        hasher = hashing.FileHasher('sha256', cache, workers=1)
+        [(_, _, digest)] = hasher.hash_files([(str(pathname), file_stat)])
+        return digest, cache.get(file_stat, 'sha256')
+
+
+def test_unchanged_file_is_cached(tmp_path):
+    """The digest of a file that did not change is cached under its stat"""
+
+    pathname = tmp_path / 'file'
+    write_file(pathname, b'contents')
+    digest, cached = hash_with_cache(tmp_path, pathname)
+
+    assert digest == hashlib.sha256(b'contents').hexdigest()
+    assert cached == digest
+
+
+def test_file_replaced_while_hashing_is_not_cached(tmp_path, monkeypatch):
+    """A file renamed over the original, with the same size and mtime, is not cached"""
+
+    pathname = tmp_path / 'file'
+    replacement = tmp_path / 'replacement'
+    write_file(pathname, b'original')
+    write_file(replacement, b'replaced')
+    real_hash_file = hashing.hash_file
+
+    def replacing_hash_file(hashed_pathname, algorithm='sha256'):
+        os.replace(replacement, hashed_pathname)
+        return real_hash_file(hashed_pathname, algorithm)
+
+    monkeypatch.setattr(hashing, 'hash_file', replacing_hash_file)
+    digest, cached = hash_with_cache(tmp_path, pathname)
+
+    assert digest == hashlib.sha256(b'replaced').hexdigest()
+    assert cached is None
@@ -0,0 +1,76 @@
+#-----------------------------------------------------------------------------
+# test_index.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the incremental --index mode of list_linux_files.py.
+#-----------------------------------------------------------------------------
+"""test_index.py""" # for pylint
+
+import json
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'Linux'))
+# pylint: disable=wrong-import-position
+import list_linux_files
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="lists POSIX files")
+
+
+@pytest.fixture(name='tree')
+def fixture_tree(tmp_path, monkeypatch):
+    """Generated tree, listed from the temporary directory by a relative path"""
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join('tree', 'sub'))
+    for name in ('a.txt', os.path.join('sub', 'b.txt')):
+        with open(os.path.join('tree', name), 'w', encoding='utf-8') as test_file:
+            test_file.write(name)
+    return 'tree'
+
+
+def run_lister(*args):
+    """Runs the lister with NDJSON output and returns its records"""
+
+    list_linux_files.main(list(args) + ['--format', 'ndjson', '-o', 'listing.ndjson'])
+    with open('listing.ndjson', encoding='utf-8') as listing:
+        return [json.loads(line) for line in listing]
+
+
+def test_changes_are_listed_like_the_full_listing(tree):
+    """Index paths are listed under the pathname given, the same as the full listing"""
+
+    listed = {record['path'] for record in run_lister(tree)}
+    changes = run_lister(tree, '--index', 'scan.db')
+
+    assert {record['path'] for record in changes} == listed
+    assert {record['change'] for record in changes} == {'added'}
+    assert os.path.join(tree, 'sub', 'b.txt') in listed
+
+    os.remove(os.path.join(tree, 'a.txt'))
+    with open(os.path.join(tree, 'c.txt'), 'w', encoding='utf-8') as test_file:
+        test_file.write('c')
+    changes = run_lister(tree + os.sep, '--index', 'scan.db')
+
+    assert sorted((record['change'], record['path']) for record in changes) == [
+        ('added', os.path.join(tree, 'c.txt')), ('removed', os.path.join(tree, 'a.txt'))]
+
+
+def test_missing_root_lists_nothing(tree):
+    """A missing root lists nothing and leaves the index as it is"""
+
+    run_lister(tree, '--index', 'scan.db')
+    os.rename(tree, 'moved')
+
+    assert not run_lister(tree, '--index', 'scan.db')
+    assert not run_lister(tree)
+
+    os.rename('moved', tree)
+    assert not run_lister(tree, '--index', 'scan.db')
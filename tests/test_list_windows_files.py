@@ -0,0 +1,71 @@
+#-----------------------------------------------------------------------------
+# test_list_windows_files.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the command line of list_windows_files.py.  The listing runs on
+# any platform, so it is checked against a generated tree.
+#-----------------------------------------------------------------------------
+"""test_list_windows_files.py""" # for pylint
+
+import csv
+import json
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Windows'))
+# pylint: disable=wrong-import-position
+import list_windows_files
+
+
+def make_tree(root):
+    """Generates a small test tree and returns the sizes of its files"""
+
+    sizes = {}
+    for name in ('a.txt', 'b c.txt', os.path.join('sub', 'd.txt')):
+        pathname = root / name
+        pathname.parent.mkdir(exist_ok=True)
+        pathname.write_bytes(b'x' * len(name))
+        sizes[str(pathname)] = len(name)
+    return sizes
+
+
+def test_ndjson_output(tmp_path):
+    """--format and --output write a machine-readable listing"""
+
+    sizes = make_tree(tmp_path / 'tree')
+    output = tmp_path / 'listing.ndjson'
+    list_windows_files.main([str(tmp_path / 'tree'), '--format', 'ndjson', '-o', str(output)])
+
+    with open(output, encoding='utf-8') as listing:
+        records = [json.loads(line) for line in listing]
+    assert {record['path']: record['size'] for record in records} == sizes
+    assert set(records[0]) == set(list_windows_files.FIELDS)
+
+
+def test_csv_output_with_digest(tmp_path):
+    """The digest column is added when hashing"""
+
+    sizes = make_tree(tmp_path / 'tree')
+    output = tmp_path / 'listing.csv'
+    list_windows_files.main([str(tmp_path / 'tree'), '--format', 'csv', '-o', str(output),
+                             '--hash', 'sha256', '-j', '2', '--ordered'])
+
+    with open(output, encoding='utf-8', newline='') as listing:
+        rows = list(csv.DictReader(listing))
+    assert {row['path'] for row in rows} == set(sizes)
+    assert all(len(row['digest']) == 64 for row in rows)
+
+
+def test_pathname_is_prompted_for(tmp_path, monkeypatch, capfd):
+    """Without a pathname on the command line, the pathname is prompted for"""
+
+    sizes = make_tree(tmp_path / 'tree')
+    monkeypatch.setattr('builtins.input', lambda prompt: str(tmp_path / 'tree'))
+    list_windows_files.main([])
+
+    lines = capfd.readouterr().out.splitlines()
+    assert len(lines) == len(sizes)
@@ -0,0 +1,139 @@
+#-----------------------------------------------------------------------------
+# test_policy.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the registry policy of manage_policy.py, written to an in-memory
+# registry so that they run on any platform and the registry calls can be
+# counted.
+#-----------------------------------------------------------------------------
+"""test_policy.py""" # for pylint
+
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Windows'))
+# pylint: disable=wrong-import-position
+import manage_policy
+from registry_backend import MemoryRegistry
+
+# Distinct keys and settings of the built-in policy
+POLICY_KEYS = 18
+POLICY_SETTINGS = 45
+
+
+@pytest.fixture(name='plan')
+def fixture_plan():
+    """Built-in registry policy plan"""
+    return manage_policy.registry_policy_plan()
+
+
+def test_policy_plan(plan):
+    """The built-in policy parses into its distinct settings and keys"""
+
+    assert len(plan) == POLICY_SETTINGS
+    assert len(plan.groups) == POLICY_KEYS
+    assert plan.duplicates == len(manage_policy.REG) - POLICY_SETTINGS
+
+
+def test_winreg_engine_opens_each_key_once(plan, capsys):
+    """The winreg engine creates each key once and sets each value once"""
+
+    backend = MemoryRegistry()
+    manage_policy.set_registry_policy_settings('winreg', backend=backend)
+
+    assert backend.calls == {'CreateKeyEx': POLICY_KEYS, 'SetValueEx': POLICY_SETTINGS}
+    assert capsys.readouterr().out.count("RegSuccess ") == POLICY_SETTINGS
+
+    for setting in plan:
+        with backend.open_key(backend.root(setting.hive), setting.key) as key:
+            assert backend.query_value(key, setting.name) == (setting.value, setting.type)
+
+
+def test_applied_policy_has_no_drift(plan, capsys):
+    """After the policy is written, the registry complies with it"""
+
+    backend = MemoryRegistry()
+    assert len(manage_policy.find_registry_drift(plan, backend)) == POLICY_SETTINGS
+
+    manage_policy.set_registry_policy_settings('winreg', backend=backend)
+    backend.calls.clear()
+    capsys.readouterr()
+
+    assert not manage_policy.find_registry_drift(plan, backend)
+    assert backend.calls['OpenKey'] == POLICY_KEYS
+    assert 'SetValueEx' not in backend.calls
+
+
+#-----------------------------------------------------------------------------
+# Converge
+#-----------------------------------------------------------------------------
+def compliant_registry(plan):
+    """In-memory registry holding the policy, with compliant firewall profiles"""
+
+    backend = MemoryRegistry()
+    for profile in manage_policy.FIREWALL_PROFILES:
+        backend.add_key(f"HKEY_LOCAL_MACHINE\\{manage_policy.FIREWALL_KEY}\\{profile}",
+                        {name: desired for name, (desired, _) in
+                         manage_policy.FIREWALL_DEFAULTS.items()})
+    manage_policy.apply_registry_settings(plan, backend)
+    return backend
+
+
+@pytest.mark.parametrize('engine', manage_policy.ENGINES)
+def test_converge_writes_drift_with_engine(plan, engine, monkeypatch, capsys):
+    """Converge writes only the drifted settings, with the engine asked for"""
+
+    backend = compliant_registry(plan)
+    drifted = plan.settings[:3]
+    for setting in drifted:
+        with backend.open_key(backend.root(setting.hive), setting.key) as key:
+            del key.values[setting.name.lower()]
+    capsys.readouterr()
+
+    written = []
+    monkeypatch.setattr(manage_policy, 'apply_registry_settings',
+                        lambda settings, backend=None: written.append(('winreg', list(settings))))
+    monkeypatch.setattr(manage_policy, 'import_registry_settings',
+                        lambda settings: written.append(('reg-file', list(settings))))
+    monkeypatch.setattr(manage_policy.subprocess, 'run',
+                        lambda command, **kwargs: written.append(('reg-add', command)))
+
+    drift_count = manage_policy.check_policy(converge=True, backend=backend,
+                                             password_policy=manage_policy.PASSWORD_POLICY,
+                                             plan=plan, engine=engine)
+
+    assert drift_count == len(drifted)
+    if engine == 'reg-add':
+        assert written == [('reg-add', "reg add " + manage_policy.format_reg_command(setting))
+                           for setting in drifted]
+    else:
+        assert written == [(engine, drifted)]
+
+
+def test_compliant_system_writes_nothing(plan, monkeypatch, capsys):
+    """Converge on a compliant system only reads"""
+
+    backend = compliant_registry(plan)
+    backend.calls.clear()
+    monkeypatch.setattr(manage_policy.subprocess, 'run', None)
+
+    assert manage_policy.check_policy(converge=True, backend=backend,
+                                      password_policy=manage_policy.PASSWORD_POLICY,
+                                      plan=plan, engine='reg-add') == 0
+    assert 'SetValueEx' not in backend.calls
+    assert "complies with the policy" in capsys.readouterr().out
+
+
+def test_engine_is_rejected_with_check():
+    """--engine has nothing to write with --mode check"""
+
+    with pytest.raises(SystemExit):
+        manage_policy.parse_args(['--mode', 'check', '--engine', 'reg-add'])
+    assert manage_policy.parse_args(['--mode', 'check']).engine == 'winreg'
+    assert manage_policy.parse_args(['--mode', 'converge', '--engine', 'reg-file']).engine == 'reg-file'
@@ -0,0 +1,64 @@
+#-----------------------------------------------------------------------------
+# test_sinks.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the output sinks in filescan/sinks.py with paths that cannot be
+# decoded, which the file system returns with surrogate escapes.
+#-----------------------------------------------------------------------------
+"""test_sinks.py""" # for pylint
+
+import json
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from filescan import diff, sinks
+
+FIELDS = ('path', 'permissions', 'size')
+
+# Latin-1 file name, which is not valid UTF-8, and a name that is
+UNDECODABLE_NAME = b'caf\xe9'
+UNICODE_NAME = 'café ☃'
+
+
+@pytest.fixture(name='names')
+def fixture_names(tmp_path):
+    """Names of files listed from a directory, including an undecodable one"""
+
+    os.mkdir(tmp_path / 'tree')
+    for name in (os.fsencode(UNICODE_NAME), UNDECODABLE_NAME):
+        with open(os.path.join(os.fsencode(tmp_path / 'tree'), name), 'wb'):
+            pass
+    return sorted(os.listdir(tmp_path / 'tree'))
+
+
+def test_ndjson_lines_are_valid_json(tmp_path, names):
+    """Every NDJSON line is ASCII and valid JSON, and gives back the listed path"""
+
+    pathname = tmp_path / 'scan.ndjson'
+    with sinks.open_sink('ndjson', FIELDS, str(pathname)) as sink:
+        for name in names:
+            sink.write((name, '-rw-r--r--', 0))
+
+    lines = pathname.read_bytes().decode('ascii').splitlines()
+    assert [json.loads(line)['path'] for line in lines] == names
+
+
+@pytest.mark.parametrize('output_format', sorted(sinks.SINK_FORMATS))
+def test_undecodable_paths_read_back(tmp_path, names, output_format):
+    """Every format reads the listed paths back unchanged"""
+
+    pathname = tmp_path / 'scan'
+    with sinks.open_sink(output_format, FIELDS, str(pathname)) as sink:
+        for name in names:
+            sink.write((name, '-rw-r--r--', 0))
+
+    _, records = diff.read_scan(str(pathname))
+    assert [record[0] for record in records] == names
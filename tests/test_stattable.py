@@ -0,0 +1,100 @@
+#-----------------------------------------------------------------------------
+# test_stattable.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the directory totals of filescan/stattable.py, built from
+# synthetic stat results.  Skipped when NumPy is not installed.
+#-----------------------------------------------------------------------------
+"""test_stattable.py""" # for pylint
+
+import os
+import random
+import sys
+import types
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+# pylint: disable=wrong-import-position
+from filescan import columns, stattable
+
+pytest.importorskip('numpy')
+
+ROOT = '/srv/data'
+
+
+def make_table(sizes, root=ROOT):
+    """Builds a table from a dict of pathname to file size"""
+
+    collector = columns.ColumnarCollector()
+    for pathname, size in sizes.items():
+        collector.add(pathname, types.SimpleNamespace(st_mode=0o100644, st_uid=0, st_gid=0,
+                                                      st_size=size, st_mtime_ns=0))
+    return stattable.StatTable.from_collector(collector, root)
+
+
+def expected_totals(sizes, root=ROOT):
+    """Sums the file sizes into every directory from the root down"""
+
+    totals = {}
+    for pathname, size in sizes.items():
+        dirpath = os.path.dirname(pathname)
+        while True:
+            totals[dirpath] = totals.get(dirpath, 0) + size
+            if dirpath == root:
+                break
+            dirpath = os.path.dirname(dirpath)
+    return totals
+
+
+def recursive_totals(table):
+    """Returns the recursive directory totals as a dict"""
+    dirs, totals = table.directory_totals(recursive=True)
+    return dict(zip(dirs, totals.tolist()))
+
+
+def test_files_in_one_subdirectory():
+    """The root is the scan root, not the deepest common directory"""
+
+    sizes = {f"{ROOT}/only/deep/file{i}": i for i in range(1, 5)}
+    table = make_table(sizes)
+
+    assert table.root == ROOT
+    assert recursive_totals(table) == {ROOT: 10, f"{ROOT}/only": 10, f"{ROOT}/only/deep": 10}
+    assert (ROOT, 10) in table.largest_directories(3, recursive=True)
+
+
+def test_random_tree_matches_path_walk():
+    """The level-by-level roll-up matches adding each file into every ancestor"""
+
+    rng = random.Random(1)
+    sizes = {}
+    for i in range(2000):
+        parts = [f"d{rng.randrange(4)}" for _ in range(rng.randrange(8))]
+        sizes[os.path.join(ROOT, *parts, f"file{i}")] = rng.randrange(1 << 40)
+
+    assert recursive_totals(make_table(sizes)) == expected_totals(sizes)
+
+
+def test_root_with_trailing_separator():
+    """A root given with a trailing separator is matched to the paths under it"""
+
+    sizes = {f"{ROOT}/file": 3, f"{ROOT}/sub/file": 4}
+    assert recursive_totals(make_table(sizes, ROOT + '/')) == {ROOT: 7, f"{ROOT}/sub": 4}
+
+
+@pytest.mark.parametrize('name, mmap', [('table.npz', False), ('table', True)])
+def test_saved_table_keeps_the_tree(tmp_path, name, mmap):
+    """The directory parents are saved and loaded with the table"""
+
+    sizes = {f"{ROOT}/a/b/file": 5, f"{ROOT}/c/file": 6}
+    pathname = str(tmp_path / name)
+    make_table(sizes).save(pathname)
+    table = stattable.StatTable.load(pathname, mmap)
+
+    assert table.root == ROOT
+    assert recursive_totals(table) == expected_totals(sizes)
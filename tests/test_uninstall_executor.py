@@ -0,0 +1,176 @@
+#-----------------------------------------------------------------------------
+# test_uninstall_executor.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Tests of the non-interactive uninstall executor with the FakeRunner, so
+# they run on any platform without starting processes.
+#-----------------------------------------------------------------------------
+"""test_uninstall_executor.py""" # for pylint
+
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIR, 'Windows'))
+# pylint: disable=wrong-import-position
+import uninstall_executor
+from uninstall_executor import FakeRunner, run_uninstalls
+
+# Seconds a fake uninstaller takes, long enough for the others to start
+SECONDS = 0.05
+
+
+#-----------------------------------------------------------------------------
+# app_command() / msiexec_command()
+#-----------------------------------------------------------------------------
+def app_command(i):
+    """Returns the command of an uninstall.exe uninstaller"""
+    return f'"C:\\Program Files\\App {i}\\uninstall.exe" /S'
+
+def msiexec_command(i):
+    """Returns the command of a Windows Installer uninstaller"""
+    return f"MsiExec.exe /X{{00000000-0000-0000-0000-{i:012X}}} /qn /norestart"
+
+
+def statuses(results):
+    """Maps the job names to the status of their results"""
+    return {result.name: result.status for result in results}
+
+
+#-----------------------------------------------------------------------------
+# Concurrency
+#-----------------------------------------------------------------------------
+@pytest.mark.parametrize('concurrency', [1, 3, 8])
+def test_concurrency_limit_is_respected(concurrency):
+    """No more than concurrency uninstallers run at the same time"""
+
+    jobs = [(f"App {i}", app_command(i)) for i in range(12)]
+    runner = FakeRunner(default=SECONDS)
+    results = run_uninstalls(jobs, runner, concurrency, timeout=5)
+
+    assert runner.max_running == concurrency
+    assert len(runner.commands) == len(jobs)
+    assert set(statuses(results).values()) == {uninstall_executor.SUCCEEDED}
+
+
+def test_msiexec_runs_one_at_a_time():
+    """MsiExec uninstallers take turns while the others run alongside"""
+
+    jobs = [(f"Msi {i}", msiexec_command(i)) for i in range(4)]
+    jobs += [(f"App {i}", app_command(i)) for i in range(4)]
+    runner = FakeRunner(default=SECONDS)
+    results = run_uninstalls(jobs, runner, concurrency=4, timeout=5)
+
+    assert runner.max_msiexec_running == 1
+    assert runner.max_running > 1
+    assert set(statuses(results).values()) == {uninstall_executor.SUCCEEDED}
+
+
+def test_msiexec_detection():
+    """MsiExec commands are recognized with or without a path and quotes"""
+
+    assert uninstall_executor.is_msiexec_command("MsiExec.exe /X{1234} /qn")
+    assert uninstall_executor.is_msiexec_command(' "C:\\Windows\\System32\\msiexec.exe" /x {1234}')
+    assert uninstall_executor.is_msiexec_command("msiexec /x {1234}")
+    assert not uninstall_executor.is_msiexec_command(app_command(1))
+    assert not uninstall_executor.is_msiexec_command("msiexecutor.exe /S")
+
+
+def test_invalid_concurrency():
+    """A concurrency below 1 is rejected"""
+
+    with pytest.raises(ValueError):
+        run_uninstalls([("App", app_command(1))], FakeRunner(), concurrency=0)
+
+
+#-----------------------------------------------------------------------------
+# Results
+#-----------------------------------------------------------------------------
+def test_hung_uninstaller_times_out():
+    """An uninstaller that never finishes is stopped without holding up the others"""
+
+    jobs = [("Hung", app_command(0)), ("App", app_command(1))]
+    runner = FakeRunner({app_command(0): (0, None)}, default=SECONDS)
+    results = run_uninstalls(jobs, runner, concurrency=1, timeout=0.2)
+
+    assert statuses(results) == {"Hung": uninstall_executor.TIMED_OUT,
+                                 "App": uninstall_executor.SUCCEEDED}
+    assert results[0].returncode is None
+    assert runner.running == 0
+
+
+def test_uninstaller_that_cannot_start():
+    """An uninstaller that cannot be started is reported as not started"""
+
+    jobs = [("Missing", app_command(0)), ("App", app_command(1))]
+    runner = FakeRunner({app_command(0): (0, FileNotFoundError("uninstall.exe"))})
+    results = run_uninstalls(jobs, runner, timeout=5)
+
+    assert statuses(results) == {"Missing": uninstall_executor.NOT_STARTED,
+                                 "App": uninstall_executor.SUCCEEDED}
+    assert runner.commands == [app_command(1)]
+
+
+def test_exit_codes():
+    """Reboot exit codes succeed and other exit codes fail"""
+
+    jobs = [(f"App {i}", app_command(i)) for i in range(4)]
+    outcomes = {app_command(0): (0, 0), app_command(1): (0, 3010),
+                app_command(2): (0, 1641), app_command(3): (0, 1603)}
+    results = run_uninstalls(jobs, FakeRunner(outcomes), timeout=5)
+
+    assert [result.status for result in results] == [uninstall_executor.SUCCEEDED] * 3 + [
+        uninstall_executor.FAILED]
+    assert results[3].returncode == 1603
+
+
+def test_results_follow_job_order():
+    """Results are returned in the order of the jobs and reported as they finish"""
+
+    jobs = [(f"App {i}", app_command(i)) for i in range(5)]
+    outcomes = {app_command(i): (SECONDS * (5 - i), 0) for i in range(5)}
+    reported = []
+    results = run_uninstalls(jobs, FakeRunner(outcomes), concurrency=5, timeout=5,
+                             report=reported.append)
+
+    assert [result.name for result in results] == [name for name, _ in jobs]
+    assert [result.name for result in reported] == [name for name, _ in reversed(jobs)]
+
+
+#-----------------------------------------------------------------------------
+# Deduplication
+#-----------------------------------------------------------------------------
+def test_repeated_commands_run_once():
+    """An application installed for several users is uninstalled once"""
+
+    command = msiexec_command(1)
+    jobs = [("App (user 1)", command), ("App (user 2)", "  " + command.lower()),
+            ("App (machine)", command.upper() + " "), ("Other", app_command(2))]
+    runner = FakeRunner()
+    results = run_uninstalls(jobs, runner, timeout=5)
+
+    assert [result.name for result in results] == ["App (user 1)", "Other"]
+    assert runner.commands == [command, app_command(2)]
+
+
+#-----------------------------------------------------------------------------
+# Summary
+#-----------------------------------------------------------------------------
+def test_format_summary():
+    """The summary counts each status and lists the unsuccessful uninstalls"""
+
+    results = [
+        uninstall_executor.UninstallResult("A", "a", uninstall_executor.SUCCEEDED, 0, 1.0),
+        uninstall_executor.UninstallResult("B", "b", uninstall_executor.FAILED, 1603, 1.0),
+        uninstall_executor.UninstallResult("C", "c", uninstall_executor.TIMED_OUT, None, 1.0),
+    ]
+    lines = uninstall_executor.format_summary(results, 2.0)
+
+    assert lines[0] == ("Uninstalled 1 of 3 applications: 1 succeeded, 1 failed, 1 timed out, "
+                        "0 not started in 2.0 seconds")
+    assert lines[1:] == ["  failed (exit code 1603): B", "  timed out: C"]
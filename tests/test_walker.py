@@ -0,0 +1,216 @@
+#-----------------------------------------------------------------------------
+# test_walker.py
+#
+# Copyright (c) 2024 Daniel M. Teal
+#
+# License: MIT License
+#
+# Syscall-count regression tests for the scandir-based walkers.  A tree is
+# generated in a temporary directory and scanned with os.scandir() wrapped
+# so that every stat of a directory entry is counted, along with every
+# os.stat() and os.lstat() by pathname.  Each file must cost at most one
+# stat, taken from its DirEntry, and no file may be stat'ed again by
+# pathname.
+#-----------------------------------------------------------------------------
+"""test_walker.py""" # for pylint
+
+import collections
+import itertools
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'Linux'))
+# pylint: disable=wrong-import-position
+import list_linux_files
+from filescan import enrich, scanner
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="counts POSIX stat calls")
+
+# Shape of the generated tree
+TREE_DEPTH = 3
+TREE_FANOUT = 3
+FILES_PER_DIR = 5
+
+
+#-----------------------------------------------------------------------------
+# make_tree()
+#
+# Generates a tree of directories and files, with a symbolic link to a file,
+# a symbolic link to a directory, a dangling link and a hard link.  Returns
+# the number of entries the walkers list: links to directories are neither
+# listed nor followed, the same as os.walk().
+#-----------------------------------------------------------------------------
+def make_tree(root):
+    """Generates a test tree and returns the number of files in it"""
+
+    count = 0
+    pending = [(str(root), 0)]
+    while pending:
+        dirpath, depth = pending.pop()
+        for i in range(FILES_PER_DIR):
+            with open(os.path.join(dirpath, f"file {i}.txt"), 'w', encoding='utf-8') as test_file:
+                test_file.write("x" * i)
+            count += 1
+        if depth < TREE_DEPTH:
+            for i in range(TREE_FANOUT):
+                subdir = os.path.join(dirpath, f"dir{i}")
+                os.mkdir(subdir)
+                pending.append((subdir, depth + 1))
+
+    os.symlink(os.path.join(root, 'file 0.txt'), os.path.join(root, 'file link'))
+    os.symlink(os.path.join(root, 'dir0'), os.path.join(root, 'dir link'))
+    os.symlink(os.path.join(root, 'missing'), os.path.join(root, 'dangling link'))
+    os.link(os.path.join(root, 'file 1.txt'), os.path.join(root, 'hard link'))
+    return count + 3
+
+
+#-----------------------------------------------------------------------------
+# CountingEntry
+#
+# Wraps a DirEntry and counts the calls to its stat() method.  The first
+# call is an lstat() system call and later calls return the cached result,
+# so counting the calls is an upper bound of the system calls.
+#-----------------------------------------------------------------------------
+class CountingEntry:
+    """DirEntry counting its stat() calls"""
+
+    def __init__(self, entry, number, counts):
+        self.entry = entry
+        self.number = number
+        self.counts = counts
+
+    def __getattr__(self, name):
+        return getattr(self.entry, name)
+
+    def __fspath__(self):
+        return os.fspath(self.entry)
+
+    def stat(self, *, follow_symlinks=True):
+        """Counts the stat and returns the DirEntry's result"""
+        self.counts[self.number] += 1
+        return self.entry.stat(follow_symlinks=follow_symlinks)
+
+
+#-----------------------------------------------------------------------------
+# SyscallCounter
+#
+# Replaces os.scandir(), os.stat() and os.lstat() with counting versions.
+# entry_stats holds the stat() calls of each directory entry, and
+# path_stats the os.stat() and os.lstat() calls of each pathname.
+#-----------------------------------------------------------------------------
+class SyscallCounter:
+    """Counts the stat calls made while scanning"""
+
+    def __init__(self, monkeypatch):
+        self.entry_stats = collections.Counter()
+        self.path_stats = collections.Counter()
+        self.numbers = itertools.count(1)
+
+        real_scandir = os.scandir
+        real_stat = os.stat
+        real_lstat = os.lstat
+        counter = self
+
+        class CountingScandir:
+            """os.scandir() iterator yielding CountingEntry objects"""
+
+            def __init__(self, path='.'):
+                self.iterator = real_scandir(path)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, exc_type, exc_value, traceback):
+                self.iterator.close()
+
+            def __iter__(self):
+                for entry in self.iterator:
+                    yield CountingEntry(entry, next(counter.numbers), counter.entry_stats)
+
+            def close(self):
+                """Closes the iterator"""
+                self.iterator.close()
+
+        def counting_stat(path, *args, **kwargs):
+            counter.path_stats[os.fspath(path) if not isinstance(path, int) else path] += 1
+            return real_stat(path, *args, **kwargs)
+
+        def counting_lstat(path, *args, **kwargs):
+            counter.path_stats[os.fspath(path)] += 1
+            return real_lstat(path, *args, **kwargs)
+
+        monkeypatch.setattr(os, 'scandir', CountingScandir)
+        monkeypatch.setattr(os, 'supports_fd', os.supports_fd | {CountingScandir})
+        monkeypatch.setattr(os, 'stat', counting_stat)
+        monkeypatch.setattr(os, 'lstat', counting_lstat)
+
+    def assert_one_stat_per_entry(self, root, listed_files):
+        """Checks the counts against the files of the tree"""
+
+        # The entries are numbered from 1 as the workers scan them
+        entries = next(self.numbers) - 1
+        assert listed_files <= entries
+        assert max(self.entry_stats.values()) <= 1
+
+        # Only the root is stat'ed by pathname, to set up the walk
+        assert set(self.path_stats) <= {str(root)}
+        assert sum(self.path_stats.values()) <= 1
+
+
+@pytest.fixture(name='tree')
+def fixture_tree(tmp_path):
+    """Generated tree and its file count"""
+    root = tmp_path / 'tree'
+    root.mkdir()
+    return root, make_tree(root)
+
+
+#-----------------------------------------------------------------------------
+# Walker modes
+#-----------------------------------------------------------------------------
+@pytest.mark.parametrize('walk_options', [
+    {},
+    {'workers': 4},
+    {'workers': 4, 'ordered': True},
+    {'fd_relative': True},
+], ids=['serial', 'parallel', 'parallel-ordered', 'fd-relative'])
+def test_records_cost_one_stat_per_file(tree, monkeypatch, walk_options):
+    """Each listed file costs at most one stat"""
+
+    root, file_count = tree
+    counter = SyscallCounter(monkeypatch)
+    records = list(scanner.iter_records(str(root), enrich.PosixEnricher(), **walk_options))
+
+    assert len(records) == file_count
+    counter.assert_one_stat_per_entry(root, len(records))
+
+
+def test_command_line_costs_one_stat_per_file(tree, tmp_path, monkeypatch):
+    """The Linux lister costs at most one stat per file from end to end"""
+
+    root, file_count = tree
+    output = tmp_path / 'listing.ndjson'
+    counter = SyscallCounter(monkeypatch)
+    list_linux_files.main([str(root), '--format', 'ndjson', '-o', str(output)])
+
+    with open(output, encoding='utf-8') as listing:
+        listed_files = sum(1 for _ in listing)
+    assert listed_files == file_count
+    counter.assert_one_stat_per_entry(root, listed_files)
+
+
+def test_directory_symlinks_are_not_followed(tree, monkeypatch):
+    """Links to directories are neither listed nor followed"""
+
+    root, _ = tree
+    SyscallCounter(monkeypatch)
+    paths = [record.path for record in scanner.iter_records(str(root), enrich.PosixEnricher())]
+    dir_link = os.path.join(str(root), 'dir link')
+
+    assert os.path.join(str(root), 'file link') in paths
+    assert os.path.join(str(root), 'dangling link') in paths
+    assert not any(path == dir_link or path.startswith(dir_link + os.sep) for path in paths)